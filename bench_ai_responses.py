@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк разбора ответов AI API (utils/ai_responses.py).
+
+Читает корпус сырых ответов (JSON lines с полями endpoint и body, тот же формат,
+что пишет бот при заданном AI_RESPONSE_RECORD_PATH), разбирает каждый ответ
+много раз и выводит для каждого endpoint среднее время разбора и долю ответов,
+не соответствующих схеме.
+
+Использование: python bench_ai_responses.py [корпус.jsonl ...] [--iterations N]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+# Добавляем текущую директорию в путь импорта
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils import ai_responses
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "ai_responses.jsonl")
+
+def load_corpus(paths):
+    corpus = []
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    entry = json.loads(line)
+                    if entry.get("endpoint") in ai_responses.SCHEMAS:
+                        corpus.append((entry["endpoint"], entry.get("body") or ""))
+    return corpus
+
+def run(corpus, iterations):
+    # endpoint -> [ответов, не по схеме, суммарное время]
+    stats = {}
+    for endpoint, body in corpus:
+        _, ok = ai_responses.parse(endpoint, body)
+        started = time.perf_counter()
+        for _ in range(iterations):
+            ai_responses.parse(endpoint, body)
+        elapsed = time.perf_counter() - started
+        entry = stats.setdefault(endpoint, [0, 0, 0.0])
+        entry[0] += 1
+        entry[1] += 0 if ok else 1
+        entry[2] += elapsed / iterations
+
+    print(f"{'endpoint':<26} {'responses':>9} {'failed':>7} {'us/parse':>9}")
+    for endpoint, (count, failed, total) in sorted(stats.items()):
+        print(f"{endpoint:<26} {count:>9} {failed / count:>7.1%} {total / count * 1e6:>9.1f}")
+    count = sum(entry[0] for entry in stats.values())
+    failed = sum(entry[1] for entry in stats.values())
+    total = sum(entry[2] for entry in stats.values())
+    print(f"{'total':<26} {count:>9} {failed / count:>7.1%} {total / count * 1e6:>9.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark AI response parsing")
+    parser.add_argument("corpus", nargs="*", default=[DEFAULT_CORPUS])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    # Ответы не по схеме ожидаемы в корпусе, предупреждения о них не нужны;
+    # бенчмарк не должен дописывать ответы в файл записи
+    logging.disable(logging.WARNING)
+    ai_responses.AI_RESPONSE_RECORD_PATH = ""
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        print("Корпус пуст")
+        sys.exit(1)
+    run(corpus, args.iterations)
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import os
 import sys
@@ -8,14 +9,23 @@ from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandle
 # Добавляем текущую директорию в путь импорта
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-import database as db
-from config import CandidateStates, CANDIDATE_BOT_TOKEN, RECRUITER_BOT_TOKEN
+import database
+import database_async as db
+from config import CandidateStates, CANDIDATE_BOT_TOKEN
 from handlers.candidate_handlers import (
     send_main_menu, handle_message, handle_test_answer,
     handle_where_to_start, start_stopwords_test, handle_stopword_answer,
     next_stopword_question, begin_stopwords_test
 )
 from handlers.button_handlers import button_click
+from utils import ai_client, materials, notifier, sentence_pool, timers, verification_cache
+from utils.sentence_pool import STOPWORD_POOL_REFILL_INTERVAL
+from utils.verification_cache import VERIFICATION_CACHE_PURGE_INTERVAL
+from utils.notifier import NOTIFY_DISPATCH_INTERVAL
+from utils.helpers import start_stopwords_refresh
+from utils.metrics import METRICS_LOG_INTERVAL, log_metrics, log_metrics_job
+from utils.persistence import PostgresPersistence
+from utils.rate_limiter import OutboundRateLimiter
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -32,7 +42,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     # Сохраняем информацию о пользователе
-    db.register_user(
+    await db.register_user(
         user_id, 
         update.effective_user.username,
         update.effective_user.first_name,
@@ -40,13 +50,13 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     
     # Проверяем, существует ли пользователь в базе данных
-    if not db.user_exists(user_id):
+    if not await db.user_exists(user_id):
         # Создаем нового пользователя, если его нет
-        db.create_user(user_id, update.effective_user.username)
+        await db.create_user(user_id, update.effective_user.username)
         
         # Разблокируем первые два этапа по умолчанию
-        db.unlock_stage(user_id, "about_company")
-        db.unlock_stage(user_id, "primary_file")
+        await db.unlock_stage(user_id, "about_company")
+        await db.unlock_stage(user_id, "primary_file")
     
     # Читаем и отправляем приветственное сообщение
     from utils.helpers import load_text_content
@@ -56,133 +66,48 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Отправляем главное меню
     return await send_main_menu(update, context)
 
-async def handle_interview_request(user_id, preferred_day, preferred_time):
-    """Handle a new interview request and notify the recruiter"""
-    # Save the interview request
-    request_id = db.save_interview_request(user_id, preferred_day, preferred_time)
-    
-    # Get user info for notification
-    user_info = db.get_user_info_with_interview_details(user_id, preferred_day, preferred_time)
-    
-    if user_info and request_id:
-        # Create recruiter bot instance to send notification
-        try:
-            from telegram import Bot
-            recruiter_bot = Bot(token=RECRUITER_BOT_TOKEN)
-            
-            # Get display info
-            display_name = user_info.get('display_name', f"Пользователь {user_id}")
-            username_display = f" (@{user_info['username']})" if user_info.get('username') else ""
-            
-            # Format notification message
-            notification = (
-                f"📣 *Новый запрос на собеседование!*\n\n"
-                f"👤 Кандидат: {display_name}{username_display}\n"
-                f"📅 Предпочтительный день: {user_info['preferred_day']}\n"
-                f"⏰ Предпочтительное время: {user_info['preferred_time']}\n\n"
-                f"Используйте меню 'Запросы на собеседование' для управления."
-            )
-            
-            # Get all recruiters and send notification to each
-            recruiters = db.get_all_recruiters()
-            
-            if recruiters:
-                for recruiter in recruiters:
-                    try:
-                        await recruiter_bot.send_message(
-                            chat_id=recruiter['user_id'],
-                            text=notification,
-                            parse_mode='Markdown'
-                        )
-                        logger.info(f"Interview request notification sent to recruiter {recruiter['user_id']} for user {user_id}")
-                    except Exception as e:
-                        logger.error(f"Error sending notification to recruiter {recruiter['user_id']}: {e}")
-            else:
-                logger.warning("No recruiters found, could not send notification")
-                
-        except Exception as e:
-            logger.error(f"Error sending interview notification: {e}")
-    
-    return request_id
-
-async def handle_test_feedback(user_id, submission_id, status, feedback):
-    """Handle test feedback from recruiter and notify the candidate"""
-    # This function is imported and called from recruiter_bot.py
-    # after a test submission is reviewed
-    
-    from telegram import Bot
-    
-    try:
-        # Create a bot instance
-        bot = Bot(token=CANDIDATE_BOT_TOKEN)
-        
-        # Decide on message based on status
-        if status == "approved":
-            message = (
-                "🎉 *Ваше тестовое задание одобрено!*\n\n"
-                f"Отзыв рекрутера: {feedback}\n\n"
-                "Продолжайте работу с ботом для дальнейших шагов."
-            )
-        else:
-            message = (
-                "❗ *Ваше тестовое задание нуждается в доработке*\n\n"
-                f"Отзыв рекрутера: {feedback}\n\n"
-                "Ознакомьтесь с комментариями и повторите попытку."
-            )
-        
-        # Send the message to the candidate
-        await bot.send_message(
-            chat_id=user_id,
-            text=message,
-            parse_mode='Markdown'
-        )
-        
-        return True
-    except Exception as e:
-        logger.error(f"Error sending test feedback to user {user_id}: {e}")
-        return False
+async def post_init(application):
+    """Open long-lived clients once the application has started"""
+    await ai_client.start()
+    # Уведомления кандидатам из этого процесса отправляются через бота приложения
+    notifier.register(notifier.CANDIDATE, application.bot)
+    # Словарь стоп-слов загружается заранее, чтобы первый кандидат не ждал Google Sheets
+    await asyncio.to_thread(start_stopwords_refresh)
+    # Пул предложений для теста стоп-слов пополняется в фоне
+    application.job_queue.run_repeating(
+        sentence_pool.refill_pool_job, interval=STOPWORD_POOL_REFILL_INTERVAL, first=10
+    )
+    # Удаление давно не использованных результатов AI-проверок
+    application.job_queue.run_repeating(
+        verification_cache.purge_job, interval=VERIFICATION_CACHE_PURGE_INTERVAL, first=60
+    )
+    # Отправка уведомлений из исходящей очереди и повтор неудачных
+    application.job_queue.run_repeating(
+        notifier.dispatch_job, interval=NOTIFY_DISPATCH_INTERVAL, first=NOTIFY_DISPATCH_INTERVAL
+    )
+    if METRICS_LOG_INTERVAL > 0:
+        application.job_queue.run_repeating(log_metrics_job, interval=METRICS_LOG_INTERVAL, first=METRICS_LOG_INTERVAL)
 
-async def handle_interview_response(user_id, request_id, status, response):
-    """Handle interview response from recruiter and notify the candidate"""
-    # This function is imported and called from recruiter_bot.py
-    # after an interview request is processed
-    
-    from telegram import Bot
-    
-    try:
-        # Create a bot instance
-        bot = Bot(token=CANDIDATE_BOT_TOKEN)
-        
-        # Decide on message based on status
-        if status == "approved":
-            message = (
-                "✅ *Ваш запрос на собеседование подтвержден!*\n\n"
-                f"Детали: {response}\n\n"
-                "Хорошей подготовки к собеседованию!"
-            )
-        else:
-            message = (
-                "❌ *Ваш запрос на собеседование требует корректировки*\n\n"
-                f"Ответ рекрутера: {response}\n\n"
-                "Пожалуйста, следуйте инструкциям выше."
-            )
-        
-        # Send the message to the candidate
-        await bot.send_message(
-            chat_id=user_id,
-            text=message,
-            parse_mode='Markdown'
-        )
-        
-        return True
-    except Exception as e:
-        logger.error(f"Error sending interview response to user {user_id}: {e}")
-        return False
+async def post_shutdown(application):
+    """Close long-lived clients when the application stops"""
+    log_metrics()
+    await timers.stop()
+    await notifier.close()
+    await ai_client.close()
+    await db.close()
 
 def main():
     """Start the bot."""
     # Создание экземпляра бота
-    application = ApplicationBuilder().token(CANDIDATE_BOT_TOKEN).build()
+    application = (
+        ApplicationBuilder()
+        .token(CANDIDATE_BOT_TOKEN)
+        .rate_limiter(OutboundRateLimiter())
+        .persistence(PostgresPersistence("candidate"))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
     # Добавление обработчиков
     application.add_handler(CommandHandler("start", start))
@@ -219,5 +144,7 @@ def main():
 
 if __name__ == '__main__':
     logger.info("Бот запущен!")
-    db.init_db()
+    database.init_db()
+    database.start_progress_listener()
+    materials.start_watcher()
     main()
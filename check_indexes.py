@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Проверка индексов: горячие запросы бота не должны делать Seq Scan.
+
+Скрипт создает временную схему, применяет к ней миграции, заполняет таблицы
+синтетическими данными (по умолчанию 1 000 000 заявок на тесты и интервью),
+выполняет EXPLAIN для запросов из database.py и удаляет схему.
+Рабочие таблицы не затрагиваются.
+
+Использование: python check_indexes.py [количество_строк]
+"""
+import os
+import sys
+
+import psycopg2
+
+# Добавляем текущую директорию в путь импорта
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD, BOT_PREFIX
+import migrations
+
+SCHEMA = f"{BOT_PREFIX}index_check_{os.getpid()}"
+
+# (название, проверяемая таблица, запрос, параметры) - запросы совпадают с database.py
+HOT_QUERIES = [
+    (
+        'get_test_result',
+        f'{BOT_PREFIX}test_submissions',
+        f'SELECT status, feedback FROM {BOT_PREFIX}test_submissions WHERE user_id = %s AND test_type = %s ORDER BY submission_date DESC LIMIT 1',
+        (42, 'logic_test'),
+    ),
+    (
+        'get_pending_submissions',
+        f'{BOT_PREFIX}test_submissions',
+        f'''SELECT ts.id, ts.user_id, u.first_name, u.last_name, ts.test_type, ts.submission_data
+           FROM {BOT_PREFIX}test_submissions ts
+           JOIN {BOT_PREFIX}users u ON ts.user_id = u.user_id
+           WHERE ts.status = 'pending'
+           ORDER BY ts.submission_date DESC''',
+        (),
+    ),
+    (
+        'get_interview_status',
+        f'{BOT_PREFIX}interview_requests',
+        f'''SELECT status, recruiter_response, preferred_day, preferred_time
+           FROM {BOT_PREFIX}interview_requests
+           WHERE user_id = %s
+           ORDER BY request_date DESC LIMIT 1''',
+        (42,),
+    ),
+    (
+        'save_interview_request',
+        f'{BOT_PREFIX}interview_requests',
+        f'SELECT id FROM {BOT_PREFIX}interview_requests WHERE user_id = %s AND status = %s',
+        (42, 'pending'),
+    ),
+    (
+        'get_pending_interview_requests',
+        f'{BOT_PREFIX}interview_requests',
+        f'''SELECT ir.id, ir.user_id, u.first_name, u.last_name, ir.preferred_day, ir.preferred_time
+           FROM {BOT_PREFIX}interview_requests ir
+           JOIN {BOT_PREFIX}users u ON ir.user_id = u.user_id
+           WHERE ir.status = 'pending'
+           ORDER BY ir.request_date DESC''',
+        (),
+    ),
+    (
+        'get_developer_messages',
+        f'{BOT_PREFIX}developer_messages',
+        f'SELECT id, user_id, user_name, message, timestamp FROM {BOT_PREFIX}developer_messages WHERE status = %s ORDER BY timestamp DESC',
+        ('unread',),
+    ),
+]
+
+def seed(cursor, rows):
+    """Fill the tables with synthetic data resembling production proportions"""
+    users = max(rows // 10, 1)
+    cursor.execute(f'''
+        INSERT INTO {BOT_PREFIX}users (user_id, username, first_name, last_name)
+        SELECT g, 'user' || g, 'First' || g, 'Last' || g
+        FROM generate_series(1, %s) g
+    ''', (users,))
+    # Ожидающих проверки заявок немного (~0.1%), остальные уже рассмотрены
+    cursor.execute(f'''
+        INSERT INTO {BOT_PREFIX}test_submissions (user_id, test_type, submission_data, status, submission_date)
+        SELECT 1 + g %% %s,
+               (ARRAY['primary_test', 'logic_test', 'stopwords_test'])[1 + g %% 3],
+               '{{}}',
+               CASE WHEN g %% 1000 = 0 THEN 'pending' WHEN g %% 2 = 0 THEN 'approved' ELSE 'rejected' END,
+               now() - g * interval '1 second'
+        FROM generate_series(1, %s) g
+    ''', (users, rows))
+    cursor.execute(f'''
+        INSERT INTO {BOT_PREFIX}interview_requests (user_id, preferred_day, preferred_time, status, request_date)
+        SELECT 1 + g %% %s, 'Monday', '10:00',
+               CASE WHEN g %% 1000 = 0 THEN 'pending' ELSE 'approved' END,
+               now() - g * interval '1 second'
+        FROM generate_series(1, %s) g
+    ''', (users, rows))
+    cursor.execute(f'''
+        INSERT INTO {BOT_PREFIX}developer_messages (user_id, user_name, message, timestamp, status)
+        SELECT 1 + g %% %s, 'user' || g, 'message', now() - g * interval '1 second',
+               CASE WHEN g %% 1000 = 0 THEN 'unread' ELSE 'read' END
+        FROM generate_series(1, %s) g
+    ''', (users, rows // 10))
+
+def seq_scans(plan, relation):
+    """Collect Seq Scan nodes on the given relation from an EXPLAIN (FORMAT JSON) plan"""
+    found = []
+    if plan.get('Node Type') == 'Seq Scan' and plan.get('Relation Name') == relation:
+        found.append(plan)
+    for child in plan.get('Plans', []):
+        found.extend(seq_scans(child, relation))
+    return found
+
+def check_indexes(rows):
+    """Run the check and return True if no hot query scans its table sequentially"""
+    conn = psycopg2.connect(
+        host=DB_HOST,
+        port=DB_PORT,
+        database=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD
+    )
+    cursor = conn.cursor()
+    ok = True
+    try:
+        cursor.execute(f'CREATE SCHEMA {SCHEMA}')
+        cursor.execute(f'SET search_path TO {SCHEMA}')
+        conn.commit()
+
+        migrations.apply_migrations(conn)
+
+        print(f"Seeding {rows} rows into schema {SCHEMA}...")
+        seed(cursor, rows)
+        conn.commit()
+
+        # Свежая статистика нужна, чтобы планировщик видел реальные размеры таблиц
+        for table in ('users', 'test_submissions', 'interview_requests', 'developer_messages'):
+            cursor.execute(f'ANALYZE {BOT_PREFIX}{table}')
+        conn.commit()
+
+        for name, relation, query, params in HOT_QUERIES:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {query}', params)
+            plan = cursor.fetchone()[0][0]['Plan']
+            scans = seq_scans(plan, relation)
+            if scans:
+                ok = False
+                print(f"FAIL {name}: Seq Scan on {relation}")
+            else:
+                print(f"OK   {name}")
+    finally:
+        conn.rollback()
+        cursor.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        conn.commit()
+        conn.close()
+
+    return ok
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    if not check_indexes(rows):
+        sys.exit(1)
+    print("All hot queries use indexes")
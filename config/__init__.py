@@ -100,3 +100,18 @@ BOT_PREFIX = os.getenv("BOT_PREFIX", "naim_bot_")
 # Проверка наличия необходимых переменных для подключения к PostgreSQL
 if not all([DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD]):
     raise ValueError(f"PostgreSQL connection parameters not set in {'postgres.develop.env' if MODE == 'develop' else 'postgres.env'}")
+
+# Настройки пула соединений PostgreSQL
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Сколько секунд ждать свободное соединение из пула
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Соединение, простоявшее без дела дольше этого времени (в секундах), проверяется через SELECT 1
+DB_POOL_HEALTHCHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTHCHECK_INTERVAL", "30"))
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+
+# Кэш прогресса пользователей (открытые этапы и результаты тестов)
+PROGRESS_CACHE_TTL = float(os.getenv("PROGRESS_CACHE_TTL", "300"))
+PROGRESS_CACHE_SIZE = int(os.getenv("PROGRESS_CACHE_SIZE", "2048"))
+# Инвалидация кэша между процессами ботов через LISTEN/NOTIFY
+PROGRESS_CACHE_NOTIFY = os.getenv("PROGRESS_CACHE_NOTIFY", "true").lower() in ("1", "true", "yes")
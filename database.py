@@ -1,25 +1,202 @@
 import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2.extras import execute_values
 import json
 import sys
 import os
+import select
+import threading
+import time
 
 # Добавляем текущую директорию в путь импорта
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # Импортируем из пакета config
-from config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD, BOT_PREFIX, MODE
+from config import (
+    DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD, BOT_PREFIX, MODE,
+    DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT, DB_POOL_HEALTHCHECK_INTERVAL, DB_CONNECT_TIMEOUT,
+    PROGRESS_CACHE_TTL, PROGRESS_CACHE_SIZE, PROGRESS_CACHE_NOTIFY
+)
+import migrations
+from utils.cache import TTLCache
+
+# Пул соединений общий для всего процесса и создается при первом обращении
+_pool = None
+_pool_lock = threading.Lock()
+# ThreadedConnectionPool не ждет освобождения соединения, поэтому ограничиваем число выдач семафором
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+# Время последнего возврата соединения в пул (по id соединения)
+_last_used = {}
+
+# Этапы, доступные новому пользователю сразу после регистрации
+DEFAULT_STAGES = ['about_company', 'primary_file']
+
+# Кэш прогресса: user_id -> (открытые этапы, результаты тестов)
+_progress_cache = TTLCache(PROGRESS_CACHE_SIZE, PROGRESS_CACHE_TTL)
+# Канал LISTEN/NOTIFY, через который процессы ботов сообщают друг другу об изменении прогресса
+PROGRESS_CHANNEL = f"{BOT_PREFIX}progress_changed"
+_listener_thread = None
+_listener_stop = threading.Event()
+
+def _get_pool():
+    """Create the process-wide connection pool on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                print(f"Connecting to database in {MODE} mode")
+                print(f"DB Info: {DB_HOST}:{DB_PORT}/{DB_NAME} (prefix: {BOT_PREFIX}, pool: {DB_POOL_MIN}-{DB_POOL_MAX})")
+                _pool = pg_pool.ThreadedConnectionPool(
+                    DB_POOL_MIN,
+                    DB_POOL_MAX,
+                    host=DB_HOST,
+                    port=DB_PORT,
+                    database=DB_NAME,
+                    user=DB_USER,
+                    password=DB_PASSWORD,
+                    connect_timeout=DB_CONNECT_TIMEOUT
+                )
+    return _pool
+
+def _is_healthy(conn):
+    """Check a pooled connection that has been idle for a while"""
+    if conn.closed:
+        return False
+    last_used = _last_used.get(id(conn))
+    # Только что открытое соединение проверять не нужно
+    if last_used is None or time.monotonic() - last_used < DB_POOL_HEALTHCHECK_INTERVAL:
+        return True
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1')
+        cursor.close()
+        conn.rollback()
+        return True
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        return False
+
+def _acquire():
+    """Take a live connection from the pool, replacing broken ones"""
+    if not _pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+        raise pg_pool.PoolError(f"No free database connection within {DB_POOL_TIMEOUT} seconds")
+    try:
+        pool = _get_pool()
+        # Пробуем несколько раз: после перезапуска PostgreSQL все соединения в пуле могут оказаться мертвыми
+        for _ in range(DB_POOL_MAX + 1):
+            conn = pool.getconn()
+            if _is_healthy(conn):
+                return conn
+            print("Discarding broken database connection")
+            _last_used.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+        raise psycopg2.OperationalError("Could not obtain a healthy database connection")
+    except BaseException:
+        _pool_slots.release()
+        raise
+
+def _release(conn):
+    """Return a connection to the pool; broken connections are closed"""
+    try:
+        broken = conn.closed or conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN
+        if broken:
+            _last_used.pop(id(conn), None)
+        else:
+            _last_used[id(conn)] = time.monotonic()
+        _get_pool().putconn(conn, close=broken)
+    finally:
+        _pool_slots.release()
+
+class PooledConnection:
+    """Connection borrowed from the pool: close() returns it to the pool instead of closing it"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            _release(conn)
 
 def get_connection():
-    """Get a connection to the PostgreSQL database"""
-    print(f"Connecting to database in {MODE} mode")
-    print(f"DB Info: {DB_HOST}:{DB_PORT}/{DB_NAME} (prefix: {BOT_PREFIX})")
-    return psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
+    """Get a connection to the PostgreSQL database from the process-wide pool"""
+    return PooledConnection(_acquire())
+
+def close_pool():
+    """Close all pooled connections (used on shutdown)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _last_used.clear()
+
+def _notify_progress_changed(cursor, user_id):
+    """Queue a progress-change notification for other processes (sent on commit)"""
+    if PROGRESS_CACHE_NOTIFY:
+        cursor.execute('SELECT pg_notify(%s, %s)', (PROGRESS_CHANNEL, f'{os.getpid()}:{user_id}'))
+
+def _listen_for_progress_changes():
+    """Invalidate cached progress when another process changes it"""
+    own_pid = str(os.getpid())
+    while not _listener_stop.is_set():
+        conn = None
+        try:
+            conn = psycopg2.connect(
+                host=DB_HOST,
+                port=DB_PORT,
+                database=DB_NAME,
+                user=DB_USER,
+                password=DB_PASSWORD,
+                connect_timeout=DB_CONNECT_TIMEOUT
+            )
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            conn.cursor().execute(f'LISTEN {PROGRESS_CHANNEL}')
+            # Пока слушатель не был подключен, уведомления могли быть потеряны
+            _progress_cache.clear()
+            
+            while not _listener_stop.is_set():
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    pid, _, user_id = notify.payload.partition(':')
+                    # Свой процесс уже сбросил кэш сразу после коммита
+                    if pid != own_pid:
+                        _progress_cache.invalidate(int(user_id))
+        except (psycopg2.Error, OSError, ValueError) as e:
+            print(f"Progress cache listener error: {e}")
+            _listener_stop.wait(5)
+        finally:
+            if conn is not None:
+                conn.close()
+
+def start_progress_listener():
+    """Start the background LISTEN thread that keeps the progress cache coherent across bots"""
+    global _listener_thread
+    if not PROGRESS_CACHE_NOTIFY or _listener_thread is not None:
+        return
+    _listener_stop.clear()
+    _listener_thread = threading.Thread(target=_listen_for_progress_changes, name="progress-listener", daemon=True)
+    _listener_thread.start()
+
+def stop_progress_listener():
+    """Stop the LISTEN thread started by start_progress_listener()"""
+    global _listener_thread
+    _listener_stop.set()
+    if _listener_thread is not None:
+        _listener_thread.join(timeout=5)
+        _listener_thread = None
 
 def init_database():
     """Initialize the database tables if they don't exist"""
@@ -29,695 +206,979 @@ def init_database():
 
 def reset_database():
     """Reset the database by dropping all tables and recreating them"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Drop all tables if they exist
-    cursor.execute(f"DROP TABLE IF EXISTS {BOT_PREFIX}developer_messages")
-    cursor.execute(f"DROP TABLE IF EXISTS {BOT_PREFIX}interview_requests")
-    cursor.execute(f"DROP TABLE IF EXISTS {BOT_PREFIX}test_submissions")
-    cursor.execute(f"DROP TABLE IF EXISTS {BOT_PREFIX}users")
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Drop all tables if they exist (tables added by later migrations first, then the base tables)
+        cursor.execute(f"DROP TABLE IF EXISTS {BOT_PREFIX}schema_migrations")
+        cursor.execute(f"DROP TABLE IF EXISTS {BOT_PREFIX}persisted_conversations")
+        cursor.execute(f"DROP TABLE IF EXISTS {BOT_PREFIX}persisted_user_data")
+        cursor.execute(f"DROP TABLE IF EXISTS {BOT_PREFIX}notification_deliveries")
+        cursor.execute(f"DROP TABLE IF EXISTS {BOT_PREFIX}ai_verification_cache")
+        cursor.execute(f"DROP TABLE IF EXISTS {BOT_PREFIX}stopword_sentences")
+        cursor.execute(f"DROP TABLE IF EXISTS {BOT_PREFIX}snapshots")
+        cursor.execute(f"DROP TABLE IF EXISTS {BOT_PREFIX}media_cache")
+        cursor.execute(f"DROP TABLE IF EXISTS {BOT_PREFIX}user_test_results")
+        cursor.execute(f"DROP TABLE IF EXISTS {BOT_PREFIX}user_stages")
+        cursor.execute(f"DROP TABLE IF EXISTS {BOT_PREFIX}developer_messages")
+        cursor.execute(f"DROP TABLE IF EXISTS {BOT_PREFIX}interview_requests")
+        cursor.execute(f"DROP TABLE IF EXISTS {BOT_PREFIX}test_submissions")
+        cursor.execute(f"DROP TABLE IF EXISTS {BOT_PREFIX}users")
+        
+        conn.commit()
     
-    conn.commit()
-    conn.close()
+    _progress_cache.clear()
     
     # Reinitialize the database
     init_db()
     print("Database has been reset successfully.")
 
 def init_db():
-    """Initialize the database with required tables"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Create users table to track progress
-    cursor.execute(f'''
-    CREATE TABLE IF NOT EXISTS {BOT_PREFIX}users (
-        user_id BIGINT PRIMARY KEY,
-        username TEXT,
-        first_name TEXT,
-        last_name TEXT,
-        unlocked_stages TEXT,
-        current_test_results TEXT,
-        registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # Create recruiters table
-    cursor.execute(f'''
-    CREATE TABLE IF NOT EXISTS {BOT_PREFIX}recruiters (
-        user_id BIGINT PRIMARY KEY,
-        username TEXT,
-        first_name TEXT,
-        last_name TEXT,
-        registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # Create table for test submissions
-    cursor.execute(f'''
-    CREATE TABLE IF NOT EXISTS {BOT_PREFIX}test_submissions (
-        id SERIAL PRIMARY KEY,
-        user_id BIGINT,
-        test_type TEXT,
-        submission_data TEXT,
-        status TEXT DEFAULT 'pending',
-        feedback TEXT,
-        submission_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES {BOT_PREFIX}users(user_id)
-    )
-    ''')
-    
-    # Create table for interview scheduling
-    cursor.execute(f'''
-    CREATE TABLE IF NOT EXISTS {BOT_PREFIX}interview_requests (
-        id SERIAL PRIMARY KEY,
-        user_id BIGINT,
-        preferred_day TEXT,
-        preferred_time TEXT,
-        status TEXT DEFAULT 'pending',
-        recruiter_response TEXT,
-        request_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES {BOT_PREFIX}users(user_id)
-    )
-    ''')
-    
-    # Create table for developer messages
-    cursor.execute(f'''
-    CREATE TABLE IF NOT EXISTS {BOT_PREFIX}developer_messages (
-        id SERIAL PRIMARY KEY,
-        user_id BIGINT,
-        user_name TEXT,
-        message TEXT,
-        timestamp TIMESTAMP,
-        status TEXT DEFAULT 'unread',
-        FOREIGN KEY (user_id) REFERENCES {BOT_PREFIX}users(user_id)
+    """Initialize the database by applying pending schema migrations"""
+    with get_connection() as conn:
+        migrations.apply_migrations(conn)
+
+def _insert_default_stages(cursor, user_id):
+    """Unlock the initial stages for a new or reset user"""
+    cursor.execute(
+        f'''INSERT INTO {BOT_PREFIX}user_stages (user_id, stage)
+           SELECT u.user_id, s.stage
+           FROM {BOT_PREFIX}users u CROSS JOIN unnest(%s::text[]) AS s(stage)
+           WHERE u.user_id = %s
+           ON CONFLICT DO NOTHING''',
+        (DEFAULT_STAGES, user_id)
     )
-    ''')
-    
-    conn.commit()
-    conn.close()
 
 def register_user(user_id, username, first_name, last_name):
     """Register a new user or update existing user information"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Check if user exists
-    cursor.execute(f'SELECT user_id FROM {BOT_PREFIX}users WHERE user_id = %s', (user_id,))
-    user = cursor.fetchone()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Check if user exists
+        cursor.execute(f'SELECT user_id FROM {BOT_PREFIX}users WHERE user_id = %s', (user_id,))
+        user = cursor.fetchone()
+        
+        if not user:
+            cursor.execute(
+                f'INSERT INTO {BOT_PREFIX}users (user_id, username, first_name, last_name) VALUES (%s, %s, %s, %s)',
+                (user_id, username, first_name, last_name)
+            )
+            
+            # Initial unlocked stages - only first two options are unlocked
+            _insert_default_stages(cursor, user_id)
+            _notify_progress_changed(cursor, user_id)
+        else:
+            cursor.execute(
+                f'UPDATE {BOT_PREFIX}users SET username = %s, first_name = %s, last_name = %s WHERE user_id = %s',
+                (username, first_name, last_name, user_id)
+            )
+        
+        conn.commit()
     
     if not user:
-        # Initial unlocked stages - only first two options are unlocked
-        unlocked_stages = json.dumps([
-            'about_company',
-            'primary_file'
-        ])
+        _progress_cache.invalidate(user_id)
+
+def _get_progress(user_id):
+    """Load a user's unlocked stages and test results, from the cache when possible"""
+    progress = _progress_cache.get(user_id)
+    if progress is not None:
+        return progress
+    
+    version = _progress_cache.version(user_id)
+    with get_connection() as conn:
+        cursor = conn.cursor()
         
+        # Этапы и результаты читаются одним запросом
         cursor.execute(
-            f'INSERT INTO {BOT_PREFIX}users (user_id, username, first_name, last_name, unlocked_stages) VALUES (%s, %s, %s, %s, %s)',
-            (user_id, username, first_name, last_name, unlocked_stages)
-        )
-    else:
-        cursor.execute(
-            f'UPDATE {BOT_PREFIX}users SET username = %s, first_name = %s, last_name = %s WHERE user_id = %s',
-            (username, first_name, last_name, user_id)
+            f'''SELECT
+                   (SELECT COALESCE(array_agg(stage ORDER BY unlocked_at, stage), ARRAY[]::text[])
+                    FROM {BOT_PREFIX}user_stages WHERE user_id = %(user_id)s),
+                   (SELECT COALESCE(json_object_agg(test_name, passed ORDER BY updated_at, test_name), '{{}}'::json)
+                    FROM {BOT_PREFIX}user_test_results WHERE user_id = %(user_id)s)''',
+            {'user_id': user_id}
         )
+        
+        stages, test_results = cursor.fetchone()
     
-    conn.commit()
-    conn.close()
+    progress = (tuple(stages), test_results)
+    _progress_cache.set(user_id, progress, version)
+    return progress
 
 def get_user_unlocked_stages(user_id):
     """Get the list of unlocked stages for a user"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(f'SELECT unlocked_stages FROM {BOT_PREFIX}users WHERE user_id = %s', (user_id,))
-    result = cursor.fetchone()
-    conn.close()
-    
-    if result and result[0]:
-        return json.loads(result[0])
-    return []
+    return list(_get_progress(user_id)[0])
 
 def get_user_test_results(user_id):
     """Get the test results for a user"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(f'SELECT current_test_results FROM {BOT_PREFIX}users WHERE user_id = %s', (user_id,))
-    result = cursor.fetchone()
-    conn.close()
-    
-    if result and result[0]:
-        try:
-            return json.loads(result[0])
-        except json.JSONDecodeError:
-            return {}  # Default empty test results
-    else:
-        return {}  # Default empty test results
+    return dict(_get_progress(user_id)[1])
 
 def unlock_stage(user_id, stage_name):
     """Unlock a new stage for the user"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Get current unlocked stages
-    cursor.execute(f'SELECT unlocked_stages FROM {BOT_PREFIX}users WHERE user_id = %s', (user_id,))
-    result = cursor.fetchone()
-    
-    if result and result[0]:
-        unlocked_stages = json.loads(result[0])
-        if stage_name not in unlocked_stages:
-            unlocked_stages.append(stage_name)
-            
-            cursor.execute(
-                f'UPDATE {BOT_PREFIX}users SET unlocked_stages = %s WHERE user_id = %s',
-                (json.dumps(unlocked_stages), user_id)
-            )
-            conn.commit()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Single atomic statement: no read-modify-write race with concurrent updates
+        cursor.execute(
+            f'''INSERT INTO {BOT_PREFIX}user_stages (user_id, stage)
+               SELECT user_id, %s FROM {BOT_PREFIX}users WHERE user_id = %s
+               ON CONFLICT DO NOTHING''',
+            (stage_name, user_id)
+        )
+        _notify_progress_changed(cursor, user_id)
+        
+        conn.commit()
     
-    conn.close()
+    _progress_cache.invalidate(user_id)
 
 def save_test_submission(user_id, test_type, submission_data):
     """Save a test submission and return the submission ID"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        f'INSERT INTO {BOT_PREFIX}test_submissions (user_id, test_type, submission_data) VALUES (%s, %s, %s) RETURNING id',
-        (user_id, test_type, json.dumps(submission_data))
-    )
-    
-    # Get the last inserted ID
-    submission_id = cursor.fetchone()[0]
-    
-    conn.commit()
-    conn.close()
-    
-    return submission_id
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'INSERT INTO {BOT_PREFIX}test_submissions (user_id, test_type, submission_data) VALUES (%s, %s, %s) RETURNING id',
+            (user_id, test_type, json.dumps(submission_data))
+        )
+        
+        # Get the last inserted ID
+        submission_id = cursor.fetchone()[0]
+        
+        conn.commit()
+        
+        return submission_id
 
 def update_test_result(user_id, test_name, passed):
     """Update a user's test result"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Get current test results
-    cursor.execute(f'SELECT current_test_results FROM {BOT_PREFIX}users WHERE user_id = %s', (user_id,))
-    result = cursor.fetchone()
-    
-    if result:
-        try:
-            test_results = json.loads(result[0]) if result[0] else {}
-        except json.JSONDecodeError:
-            test_results = {}
-    else:
-        test_results = {}
-    
-    # Update the test result
-    test_results[test_name] = passed
-    
-    # Save back to database
-    cursor.execute(
-        f'UPDATE {BOT_PREFIX}users SET current_test_results = %s WHERE user_id = %s',
-        (json.dumps(test_results), user_id)
-    )
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Upsert the result in one statement so concurrent writers cannot lose each other's updates
+        cursor.execute(
+            f'''INSERT INTO {BOT_PREFIX}user_test_results (user_id, test_name, passed)
+               SELECT user_id, %s, %s FROM {BOT_PREFIX}users WHERE user_id = %s
+               ON CONFLICT (user_id, test_name)
+               DO UPDATE SET passed = EXCLUDED.passed, updated_at = CURRENT_TIMESTAMP''',
+            (test_name, bool(passed), user_id)
+        )
+        _notify_progress_changed(cursor, user_id)
+        
+        conn.commit()
     
-    conn.commit()
-    conn.close()
+    _progress_cache.invalidate(user_id)
 
-def update_test_submission(submission_id, status, feedback):
-    """Update a test submission with recruiter feedback"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        f'UPDATE {BOT_PREFIX}test_submissions SET status = %s, feedback = %s WHERE id = %s',
-        (status, feedback, submission_id)
-    )
-    
-    # Get the user_id and test_type for this submission
-    cursor.execute(f'SELECT user_id, test_type FROM {BOT_PREFIX}test_submissions WHERE id = %s', (submission_id,))
-    result = cursor.fetchone()
-    
-    conn.commit()
-    conn.close()
-    
-    if result:
-        return {'user_id': result[0], 'test_type': result[1], 'status': status}
-    return None
+def update_test_submission(submission_id, status, feedback, notification=None):
+    """Update a test submission with recruiter feedback
+
+    notification ({'bot', 'text', 'parse_mode'}) is added to the outbox for the
+    candidate in the same transaction, so the update and the message are never split.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'UPDATE {BOT_PREFIX}test_submissions SET status = %s, feedback = %s WHERE id = %s',
+            (status, feedback, submission_id)
+        )
+        
+        # Get the user_id and test_type for this submission
+        cursor.execute(f'SELECT user_id, test_type FROM {BOT_PREFIX}test_submissions WHERE id = %s', (submission_id,))
+        result = cursor.fetchone()
+        
+        if result and notification:
+            _insert_deliveries(
+                cursor, notification['bot'], 'test_feedback', submission_id, [result[0]],
+                notification['text'], notification.get('parse_mode'), 0
+            )
+        
+        conn.commit()
+        
+        if result:
+            return {'user_id': result[0], 'test_type': result[1], 'status': status}
+        return None
 
 def get_pending_submissions():
     """Get all pending test submissions"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        f'''SELECT ts.id, ts.user_id, u.first_name, u.last_name, ts.test_type, ts.submission_data 
-           FROM {BOT_PREFIX}test_submissions ts 
-           JOIN {BOT_PREFIX}users u ON ts.user_id = u.user_id 
-           WHERE ts.status = 'pending' 
-           ORDER BY ts.submission_date DESC'''
-    )
-    
-    submissions = []
-    for row in cursor.fetchall():
-        submissions.append({
-            'id': row[0],
-            'user_id': row[1],
-            'candidate_name': f"{row[2] or ''} {row[3] or ''}".strip(),
-            'test_type': row[4],
-            'submission_data': json.loads(row[5]) if row[5] else {}
-        })
-    
-    conn.close()
-    return submissions
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'''SELECT ts.id, ts.user_id, u.first_name, u.last_name, ts.test_type, ts.submission_data 
+               FROM {BOT_PREFIX}test_submissions ts 
+               JOIN {BOT_PREFIX}users u ON ts.user_id = u.user_id 
+               WHERE ts.status = 'pending' 
+               ORDER BY ts.submission_date DESC'''
+        )
+        
+        submissions = []
+        for row in cursor.fetchall():
+            submissions.append({
+                'id': row[0],
+                'user_id': row[1],
+                'candidate_name': f"{row[2] or ''} {row[3] or ''}".strip(),
+                'test_type': row[4],
+                'submission_data': json.loads(row[5]) if row[5] else {}
+            })
+        
+        return submissions
 
 def save_interview_request(user_id, preferred_day, preferred_time):
     """Save an interview request from a candidate"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Check if there's an existing pending request
-    cursor.execute(f'SELECT id FROM {BOT_PREFIX}interview_requests WHERE user_id = %s AND status = %s', (user_id, 'pending'))
-    existing = cursor.fetchone()
-    
-    if existing:
-        # Update existing request
-        cursor.execute(
-            f'UPDATE {BOT_PREFIX}interview_requests SET preferred_day = %s, preferred_time = %s, request_date = CURRENT_TIMESTAMP WHERE id = %s',
-            (preferred_day, preferred_time, existing[0])
-        )
-        request_id = existing[0]
-    else:
-        # Create new request
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Check if there's an existing pending request
+        cursor.execute(f'SELECT id FROM {BOT_PREFIX}interview_requests WHERE user_id = %s AND status = %s', (user_id, 'pending'))
+        existing = cursor.fetchone()
+        
+        if existing:
+            # Update existing request
+            cursor.execute(
+                f'UPDATE {BOT_PREFIX}interview_requests SET preferred_day = %s, preferred_time = %s, request_date = CURRENT_TIMESTAMP WHERE id = %s',
+                (preferred_day, preferred_time, existing[0])
+            )
+            request_id = existing[0]
+        else:
+            # Create new request
+            cursor.execute(
+                f'INSERT INTO {BOT_PREFIX}interview_requests (user_id, preferred_day, preferred_time) VALUES (%s, %s, %s) RETURNING id',
+                (user_id, preferred_day, preferred_time)
+            )
+            request_id = cursor.fetchone()[0]
+        
+        conn.commit()
+        
+        return request_id
+
+def update_interview_request(request_id, status, recruiter_response, notification=None):
+    """Update an interview request with recruiter feedback
+
+    notification is added to the outbox for the candidate in the same transaction.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
         cursor.execute(
-            f'INSERT INTO {BOT_PREFIX}interview_requests (user_id, preferred_day, preferred_time) VALUES (%s, %s, %s) RETURNING id',
-            (user_id, preferred_day, preferred_time)
+            f'UPDATE {BOT_PREFIX}interview_requests SET status = %s, recruiter_response = %s WHERE id = %s',
+            (status, recruiter_response, request_id)
         )
-        request_id = cursor.fetchone()[0]
-    
-    conn.commit()
-    conn.close()
-    
-    return request_id
-
-def update_interview_request(request_id, status, recruiter_response):
-    """Update an interview request with recruiter feedback"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        f'UPDATE {BOT_PREFIX}interview_requests SET status = %s, recruiter_response = %s WHERE id = %s',
-        (status, recruiter_response, request_id)
-    )
-    
-    # Get the user_id for this request
-    cursor.execute(f'SELECT user_id FROM {BOT_PREFIX}interview_requests WHERE id = %s', (request_id,))
-    result = cursor.fetchone()
-    
-    conn.commit()
-    conn.close()
-    
-    if result:
-        return {'user_id': result[0], 'status': status}
-    return None
+        
+        # Get the user_id for this request
+        cursor.execute(f'SELECT user_id FROM {BOT_PREFIX}interview_requests WHERE id = %s', (request_id,))
+        result = cursor.fetchone()
+        
+        if result and notification:
+            _insert_deliveries(
+                cursor, notification['bot'], 'interview_response', request_id, [result[0]],
+                notification['text'], notification.get('parse_mode'), 0
+            )
+        
+        conn.commit()
+        
+        if result:
+            return {'user_id': result[0], 'status': status}
+        return None
 
 def get_pending_interview_requests():
     """Get all pending interview requests"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        f'''SELECT ir.id, ir.user_id, u.first_name, u.last_name, ir.preferred_day, ir.preferred_time 
-           FROM {BOT_PREFIX}interview_requests ir 
-           JOIN {BOT_PREFIX}users u ON ir.user_id = u.user_id 
-           WHERE ir.status = 'pending' 
-           ORDER BY ir.request_date DESC'''
-    )
-    
-    requests = []
-    for row in cursor.fetchall():
-        requests.append({
-            'id': row[0],
-            'user_id': row[1],
-            'candidate_name': f"{row[2] or ''} {row[3] or ''}".strip(),
-            'preferred_day': row[4],
-            'preferred_time': row[5]
-        })
-    
-    conn.close()
-    return requests
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'''SELECT ir.id, ir.user_id, u.first_name, u.last_name, ir.preferred_day, ir.preferred_time 
+               FROM {BOT_PREFIX}interview_requests ir 
+               JOIN {BOT_PREFIX}users u ON ir.user_id = u.user_id 
+               WHERE ir.status = 'pending' 
+               ORDER BY ir.request_date DESC'''
+        )
+        
+        requests = []
+        for row in cursor.fetchall():
+            requests.append({
+                'id': row[0],
+                'user_id': row[1],
+                'candidate_name': f"{row[2] or ''} {row[3] or ''}".strip(),
+                'preferred_day': row[4],
+                'preferred_time': row[5]
+            })
+        
+        return requests
 
 def get_test_result(user_id, test_type):
     """Get the result of a specific test for a user"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        f'SELECT status, feedback FROM {BOT_PREFIX}test_submissions WHERE user_id = %s AND test_type = %s ORDER BY submission_date DESC LIMIT 1',
-        (user_id, test_type)
-    )
-    
-    result = cursor.fetchone()
-    conn.close()
-    
-    if result:
-        return {'status': result[0], 'feedback': result[1]}
-    return None
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'SELECT status, feedback FROM {BOT_PREFIX}test_submissions WHERE user_id = %s AND test_type = %s ORDER BY submission_date DESC LIMIT 1',
+            (user_id, test_type)
+        )
+        
+        result = cursor.fetchone()
+        
+        if result:
+            return {'status': result[0], 'feedback': result[1]}
+        return None
 
 def get_interview_status(user_id):
     """Get the status of a user's interview request"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        f'''SELECT status, recruiter_response, preferred_day, preferred_time 
-           FROM {BOT_PREFIX}interview_requests 
-           WHERE user_id = %s 
-           ORDER BY request_date DESC LIMIT 1''',
-        (user_id,)
-    )
-    
-    result = cursor.fetchone()
-    conn.close()
-    
-    if result:
-        return {
-            'status': result[0],
-            'response': result[1],
-            'preferred_day': result[2],
-            'preferred_time': result[3]
-        }
-    return None
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'''SELECT status, recruiter_response, preferred_day, preferred_time 
+               FROM {BOT_PREFIX}interview_requests 
+               WHERE user_id = %s 
+               ORDER BY request_date DESC LIMIT 1''',
+            (user_id,)
+        )
+        
+        result = cursor.fetchone()
+        
+        if result:
+            return {
+                'status': result[0],
+                'response': result[1],
+                'preferred_day': result[2],
+                'preferred_time': result[3]
+            }
+        return None
 
 def user_exists(user_id):
     """Check if a user exists in the database"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(f'SELECT user_id FROM {BOT_PREFIX}users WHERE user_id = %s', (user_id,))
-    result = cursor.fetchone()
-    conn.close()
-    
-    return result is not None
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(f'SELECT user_id FROM {BOT_PREFIX}users WHERE user_id = %s', (user_id,))
+        result = cursor.fetchone()
+        
+        return result is not None
 
 def create_user(user_id, username):
     """Create a new user in the database with minimal information"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Initial unlocked stages - only first two options are unlocked
-    unlocked_stages = json.dumps([
-        'about_company',
-        'primary_file'
-    ])
-    
-    cursor.execute(
-        f'INSERT INTO {BOT_PREFIX}users (user_id, username, unlocked_stages) VALUES (%s, %s, %s)',
-        (user_id, username, unlocked_stages)
-    )
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'INSERT INTO {BOT_PREFIX}users (user_id, username) VALUES (%s, %s)',
+            (user_id, username)
+        )
+        
+        # Initial unlocked stages - only first two options are unlocked
+        _insert_default_stages(cursor, user_id)
+        _notify_progress_changed(cursor, user_id)
+        
+        conn.commit()
     
-    conn.commit()
-    conn.close()
+    _progress_cache.invalidate(user_id)
 
 def get_metrics():
-    """Get recruitment metrics from the database"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Get total number of candidates
-    cursor.execute(f'SELECT COUNT(*) FROM {BOT_PREFIX}users')
-    total_candidates = cursor.fetchone()[0]
-    
-    # Get number of candidates who completed the primary test
-    cursor.execute(f'''
-        SELECT COUNT(DISTINCT user_id) 
-        FROM {BOT_PREFIX}test_submissions 
-        WHERE test_type = 'primary_test'
-    ''')
-    primary_completions = cursor.fetchone()[0]
-    
-    # Get number of candidates who completed the logic test
-    cursor.execute(f'''
-        SELECT COUNT(DISTINCT user_id) 
-        FROM {BOT_PREFIX}test_submissions 
-        WHERE test_type = 'logic_test'
-    ''')
-    logic_completions = cursor.fetchone()[0]
-    
-    # Get number of candidates who requested an interview
-    cursor.execute(f'SELECT COUNT(DISTINCT user_id) FROM {BOT_PREFIX}interview_requests')
-    interview_requests = cursor.fetchone()[0]
-    
-    # Get number of approved interviews
-    cursor.execute(f'''
-        SELECT COUNT(DISTINCT user_id) 
-        FROM {BOT_PREFIX}interview_requests 
-        WHERE status = 'approved'
-    ''')
-    approved_interviews = cursor.fetchone()[0]
-    
-    # Get test pass rates based on test_submissions table
-    cursor.execute(f'''
-        SELECT test_type, status, COUNT(*) 
-        FROM {BOT_PREFIX}test_submissions 
-        GROUP BY test_type, status
-    ''')
-    
-    test_stats = {}
-    for row in cursor.fetchall():
-        test_type, status, count = row
-        if test_type not in test_stats:
-            test_stats[test_type] = {'passed': 0, 'failed': 0, 'pending': 0, 'total_submitted': 0}
-        
-        if status == 'approved':
-            test_stats[test_type]['passed'] += count
-        elif status == 'rejected':
-            test_stats[test_type]['failed'] += count
-        elif status == 'pending':
-            test_stats[test_type]['pending'] += count
-            
-        test_stats[test_type]['total_submitted'] += count
-    
-    # Also get test results from current_test_results field in users table
-    cursor.execute(f'SELECT current_test_results FROM {BOT_PREFIX}users WHERE current_test_results IS NOT NULL')
-    user_test_results = cursor.fetchall()
-    
-    # Process user test results
-    for result_row in user_test_results:
-        if result_row[0]:
-            try:
-                test_results = json.loads(result_row[0])
-                for test_name, passed in test_results.items():
-                    # Convert legacy test names if needed
-                    if test_name == 'primary_test':
-                        test_type = 'primary_test'
-                    elif test_name == 'where_to_start_test':
-                        test_type = 'stopwords_test'
-                    elif test_name == 'logic_test_result':
-                        test_type = 'logic_test'
-                    else:
-                        test_type = test_name
-                        
-                    if test_type not in test_stats:
-                        test_stats[test_type] = {'passed': 0, 'failed': 0, 'pending': 0, 'total_submitted': 1}
-                    else:
-                        test_stats[test_type]['total_submitted'] += 1
-                        
-                    if passed:
-                        test_stats[test_type]['passed'] += 1
-                    else:
-                        test_stats[test_type]['failed'] += 1
-            except json.JSONDecodeError:
-                pass  # Skip invalid JSON
-    
-    conn.close()
-    
-    return {
-        'total_candidates': total_candidates,
-        'primary_test_completions': primary_completions,
-        'logic_test_completions': logic_completions,
-        'interview_requests': interview_requests,
-        'approved_interviews': approved_interviews,
-        'test_stats': test_stats
-    }
+    """Get recruitment metrics from the database in a single aggregated query"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Все счетчики и статистика по тестам считаются на стороне PostgreSQL за один запрос.
+        # Статистика по тестам складывается из заявок (test_submissions) и результатов
+        # пользователей (user_test_results) со старыми именами тестов, приведенными к новым.
+        cursor.execute(f'''
+            WITH submission_stats AS (
+                SELECT test_type,
+                       COUNT(*) FILTER (WHERE status = 'approved') AS passed,
+                       COUNT(*) FILTER (WHERE status = 'rejected') AS failed,
+                       COUNT(*) FILTER (WHERE status = 'pending') AS pending,
+                       COUNT(*) AS total_submitted,
+                       COUNT(DISTINCT user_id) AS users
+                FROM {BOT_PREFIX}test_submissions
+                GROUP BY test_type
+            ),
+            result_stats AS (
+                SELECT CASE test_name
+                           WHEN 'where_to_start_test' THEN 'stopwords_test'
+                           WHEN 'logic_test_result' THEN 'logic_test'
+                           ELSE test_name
+                       END AS test_type,
+                       COUNT(*) FILTER (WHERE passed) AS passed,
+                       COUNT(*) FILTER (WHERE NOT passed) AS failed,
+                       0 AS pending,
+                       COUNT(*) AS total_submitted
+                FROM {BOT_PREFIX}user_test_results
+                GROUP BY 1
+            ),
+            test_stats AS (
+                SELECT test_type,
+                       SUM(passed) AS passed,
+                       SUM(failed) AS failed,
+                       SUM(pending) AS pending,
+                       SUM(total_submitted) AS total_submitted
+                FROM (
+                    SELECT test_type, passed, failed, pending, total_submitted FROM submission_stats
+                    UNION ALL
+                    SELECT test_type, passed, failed, pending, total_submitted FROM result_stats
+                ) combined
+                GROUP BY test_type
+            ),
+            interview_stats AS (
+                SELECT COUNT(DISTINCT user_id) AS requests,
+                       COUNT(DISTINCT user_id) FILTER (WHERE status = 'approved') AS approved
+                FROM {BOT_PREFIX}interview_requests
+            )
+            SELECT
+                (SELECT COUNT(*) FROM {BOT_PREFIX}users),
+                (SELECT COALESCE(SUM(users), 0) FROM submission_stats WHERE test_type = 'primary_test'),
+                (SELECT COALESCE(SUM(users), 0) FROM submission_stats WHERE test_type = 'logic_test'),
+                interview_stats.requests,
+                interview_stats.approved,
+                (SELECT COALESCE(
+                    json_object_agg(
+                        test_type,
+                        json_build_object(
+                            'passed', passed,
+                            'failed', failed,
+                            'pending', pending,
+                            'total_submitted', total_submitted
+                        )
+                        ORDER BY test_type
+                    ),
+                    '{{}}'::json
+                 ) FROM test_stats)
+            FROM interview_stats
+        ''')
+        
+        (total_candidates, primary_completions, logic_completions,
+         interview_requests, approved_interviews, test_stats) = cursor.fetchone()
+        
+        return {
+            'total_candidates': total_candidates,
+            'primary_test_completions': int(primary_completions),
+            'logic_test_completions': int(logic_completions),
+            'interview_requests': interview_requests,
+            'approved_interviews': approved_interviews,
+            'test_stats': test_stats
+        }
 
 def get_user_info(user_id):
     """Get user information from the database"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(f'SELECT username, first_name, last_name FROM {BOT_PREFIX}users WHERE user_id = %s', (user_id,))
-    result = cursor.fetchone()
-    conn.close()
-    
-    if result:
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(f'SELECT username, first_name, last_name FROM {BOT_PREFIX}users WHERE user_id = %s', (user_id,))
+        result = cursor.fetchone()
+        
+        if result:
+            return {
+                'username': result[0],
+                'first_name': result[1],
+                'last_name': result[2]
+            }
+        
         return {
-            'username': result[0],
-            'first_name': result[1],
-            'last_name': result[2]
+            'username': None,
+            'first_name': None,
+            'last_name': None
         }
-    
-    return {
-        'username': None,
-        'first_name': None,
-        'last_name': None
-    }
 
 def send_developer_message(user_id, user_name, message):
     """Save a message from a user to the developers"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        f'INSERT INTO {BOT_PREFIX}developer_messages (user_id, user_name, message, timestamp) VALUES (%s, %s, %s, CURRENT_TIMESTAMP)',
-        (user_id, user_name, message)
-    )
-    
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'INSERT INTO {BOT_PREFIX}developer_messages (user_id, user_name, message, timestamp) VALUES (%s, %s, %s, CURRENT_TIMESTAMP)',
+            (user_id, user_name, message)
+        )
+        
+        conn.commit()
 
 def get_developer_messages():
     """Get all unread messages for developers"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        f'SELECT id, user_id, user_name, message, timestamp FROM {BOT_PREFIX}developer_messages WHERE status = %s ORDER BY timestamp DESC',
-        ('unread',)
-    )
-    
-    messages = []
-    for row in cursor.fetchall():
-        messages.append({
-            'id': row[0],
-            'user_id': row[1],
-            'user_name': row[2],
-            'message': row[3],
-            'timestamp': row[4]
-        })
-    
-    conn.close()
-    return messages
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'SELECT id, user_id, user_name, message, timestamp FROM {BOT_PREFIX}developer_messages WHERE status = %s ORDER BY timestamp DESC',
+            ('unread',)
+        )
+        
+        messages = []
+        for row in cursor.fetchall():
+            messages.append({
+                'id': row[0],
+                'user_id': row[1],
+                'user_name': row[2],
+                'message': row[3],
+                'timestamp': row[4]
+            })
+        
+        return messages
 
 def mark_message_read(message_id):
     """Mark a developer message as read"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        f'UPDATE {BOT_PREFIX}developer_messages SET status = %s WHERE id = %s',
-        ('read', message_id)
-    )
-    
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'UPDATE {BOT_PREFIX}developer_messages SET status = %s WHERE id = %s',
+            ('read', message_id)
+        )
+        
+        conn.commit()
 
 def register_recruiter(user_id, username, first_name, last_name):
     """Register a new recruiter or update existing recruiter information"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Check if recruiter exists
-    cursor.execute(f'SELECT user_id FROM {BOT_PREFIX}recruiters WHERE user_id = %s', (user_id,))
-    user = cursor.fetchone()
-    
-    if not user:
-        cursor.execute(
-            f'INSERT INTO {BOT_PREFIX}recruiters (user_id, username, first_name, last_name) VALUES (%s, %s, %s, %s)',
-            (user_id, username, first_name, last_name)
-        )
-    else:
-        cursor.execute(
-            f'UPDATE {BOT_PREFIX}recruiters SET username = %s, first_name = %s, last_name = %s WHERE user_id = %s',
-            (username, first_name, last_name, user_id)
-        )
-    
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Check if recruiter exists
+        cursor.execute(f'SELECT user_id FROM {BOT_PREFIX}recruiters WHERE user_id = %s', (user_id,))
+        user = cursor.fetchone()
+        
+        if not user:
+            cursor.execute(
+                f'INSERT INTO {BOT_PREFIX}recruiters (user_id, username, first_name, last_name) VALUES (%s, %s, %s, %s)',
+                (user_id, username, first_name, last_name)
+            )
+        else:
+            cursor.execute(
+                f'UPDATE {BOT_PREFIX}recruiters SET username = %s, first_name = %s, last_name = %s WHERE user_id = %s',
+                (username, first_name, last_name, user_id)
+            )
+        
+        conn.commit()
 
 def get_all_recruiters():
     """Get all recruiters from the database"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(f'SELECT user_id, username, first_name, last_name FROM {BOT_PREFIX}recruiters')
-    
-    recruiters = []
-    for row in cursor.fetchall():
-        recruiters.append({
-            'user_id': row[0],
-            'username': row[1],
-            'first_name': row[2],
-            'last_name': row[3]
-        })
-    
-    conn.close()
-    return recruiters
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(f'SELECT user_id, username, first_name, last_name FROM {BOT_PREFIX}recruiters')
+        
+        recruiters = []
+        for row in cursor.fetchall():
+            recruiters.append({
+                'user_id': row[0],
+                'username': row[1],
+                'first_name': row[2],
+                'last_name': row[3]
+            })
+        
+        return recruiters
 
 def get_user_info_with_interview_details(user_id, preferred_day, preferred_time):
     """Get user information and interview details for notifications"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(f'SELECT username, first_name, last_name FROM {BOT_PREFIX}users WHERE user_id = %s', (user_id,))
-    result = cursor.fetchone()
-    conn.close()
-    
-    user_info = {}
-    
-    if result:
-        username, first_name, last_name = result
-        display_name = f"{first_name or ''} {last_name or ''}".strip()
-        
-        # If no name, use username or default
-        if not display_name and username:
-            display_name = username
-        elif not display_name:
-            display_name = f"Пользователь {user_id}"
-        
-        user_info = {
-            'username': username,
-            'first_name': first_name,
-            'last_name': last_name,
-            'display_name': display_name,
-            'preferred_day': preferred_day,
-            'preferred_time': preferred_time
-        }
-    
-    return user_info
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(f'SELECT username, first_name, last_name FROM {BOT_PREFIX}users WHERE user_id = %s', (user_id,))
+        result = cursor.fetchone()
+        
+        user_info = {}
+        
+        if result:
+            username, first_name, last_name = result
+            display_name = f"{first_name or ''} {last_name or ''}".strip()
+            
+            # If no name, use username or default
+            if not display_name and username:
+                display_name = username
+            elif not display_name:
+                display_name = f"Пользователь {user_id}"
+            
+            user_info = {
+                'username': username,
+                'first_name': first_name,
+                'last_name': last_name,
+                'display_name': display_name,
+                'preferred_day': preferred_day,
+                'preferred_time': preferred_time
+            }
+        
+        return user_info
 
 def reset_user_progress(user_id):
     """Reset all progress for a user to the initial state"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Reset unlocked stages to default (only about_company and primary_file)
-    default_stages = json.dumps([
-        'about_company',
-        'primary_file'
-    ])
-    
-    # Reset user's unlocked stages and test results
-    cursor.execute(
-        f'UPDATE {BOT_PREFIX}users SET unlocked_stages = %s, current_test_results = NULL WHERE user_id = %s',
-        (default_stages, user_id)
-    )
-    
-    # Mark all test submissions as invalidated
-    cursor.execute(
-        f'UPDATE {BOT_PREFIX}test_submissions SET status = %s WHERE user_id = %s',
-        ('invalidated', user_id)
-    )
-    
-    # Cancel all pending interview requests
-    cursor.execute(
-        f'UPDATE {BOT_PREFIX}interview_requests SET status = %s, recruiter_response = %s WHERE user_id = %s AND status = %s',
-        ('cancelled', 'Автоматическая отмена: пользователь сбросил прогресс', user_id, 'pending')
-    )
-    
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Reset user's unlocked stages to default (only about_company and primary_file) and test results
+        cursor.execute(f'DELETE FROM {BOT_PREFIX}user_stages WHERE user_id = %s', (user_id,))
+        cursor.execute(f'DELETE FROM {BOT_PREFIX}user_test_results WHERE user_id = %s', (user_id,))
+        _insert_default_stages(cursor, user_id)
+        _notify_progress_changed(cursor, user_id)
+        
+        # Mark all test submissions as invalidated
+        cursor.execute(
+            f'UPDATE {BOT_PREFIX}test_submissions SET status = %s WHERE user_id = %s',
+            ('invalidated', user_id)
+        )
+        
+        # Cancel all pending interview requests
+        cursor.execute(
+            f'UPDATE {BOT_PREFIX}interview_requests SET status = %s, recruiter_response = %s WHERE user_id = %s AND status = %s',
+            ('cancelled', 'Автоматическая отмена: пользователь сбросил прогресс', user_id, 'pending')
+        )
+        
+        conn.commit()
     
+    _progress_cache.invalidate(user_id)
     return True
+
+def get_media_file_id(bot_id, content_hash):
+    """Get the Telegram file_id of an already uploaded file"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'SELECT file_id FROM {BOT_PREFIX}media_cache WHERE bot_id = %s AND content_hash = %s',
+            (bot_id, content_hash)
+        )
+        
+        result = cursor.fetchone()
+        return result[0] if result else None
+
+def save_media_file_id(bot_id, content_hash, file_name, file_id):
+    """Remember the Telegram file_id returned for an uploaded file"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'''INSERT INTO {BOT_PREFIX}media_cache (bot_id, content_hash, file_name, file_id)
+               VALUES (%s, %s, %s, %s)
+               ON CONFLICT (bot_id, content_hash)
+               DO UPDATE SET file_name = EXCLUDED.file_name, file_id = EXCLUDED.file_id, uploaded_at = CURRENT_TIMESTAMP''',
+            (bot_id, content_hash, file_name, file_id)
+        )
+        
+        conn.commit()
+
+def delete_media_file_id(bot_id, content_hash):
+    """Forget a file_id that Telegram no longer accepts"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'DELETE FROM {BOT_PREFIX}media_cache WHERE bot_id = %s AND content_hash = %s',
+            (bot_id, content_hash)
+        )
+        
+        conn.commit()
+
+def get_snapshot(name):
+    """Get a stored snapshot as (data, age in seconds) or None"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'''SELECT data, EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - updated_at))
+               FROM {BOT_PREFIX}snapshots WHERE name = %s''',
+            (name,)
+        )
+        
+        result = cursor.fetchone()
+        if result:
+            return json.loads(result[0]), float(result[1])
+        return None
+
+def save_snapshot(name, data):
+    """Store a JSON-serializable snapshot under the given name"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'''INSERT INTO {BOT_PREFIX}snapshots (name, data) VALUES (%s, %s)
+               ON CONFLICT (name) DO UPDATE SET data = EXCLUDED.data, updated_at = CURRENT_TIMESTAMP''',
+            (name, json.dumps(data, ensure_ascii=False))
+        )
+        
+        conn.commit()
+
+def take_stopword_sentence(stopword):
+    """Take the least served pooled sentence for a stopword, or None if the pool is empty"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Наименее использованное предложение, при равенстве - случайное, чтобы кандидаты видели разные
+        cursor.execute(
+            f'''UPDATE {BOT_PREFIX}stopword_sentences SET served_count = served_count + 1
+               WHERE id = (
+                   SELECT id FROM {BOT_PREFIX}stopword_sentences
+                   WHERE stopword = %s
+                   ORDER BY served_count, random()
+                   LIMIT 1
+                   FOR UPDATE SKIP LOCKED
+               )
+               RETURNING sentence''',
+            (stopword,)
+        )
+        
+        result = cursor.fetchone()
+        conn.commit()
+        
+        return result[0] if result else None
+
+def add_stopword_sentences(stopword, sentences):
+    """Add generated sentences to the pool, skipping duplicates; return how many were added"""
+    if not sentences:
+        return 0
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        execute_values(
+            cursor,
+            f'''INSERT INTO {BOT_PREFIX}stopword_sentences (stopword, sentence) VALUES %s
+               ON CONFLICT (stopword, sentence) DO NOTHING''',
+            [(stopword, sentence) for sentence in sentences]
+        )
+        added = cursor.rowcount
+        
+        conn.commit()
+        
+        return added
+
+def get_stopword_pool_sizes():
+    """Get the number of pooled sentences per stopword"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(f'SELECT stopword, COUNT(*) FROM {BOT_PREFIX}stopword_sentences GROUP BY stopword')
+        
+        return {stopword: count for stopword, count in cursor.fetchall()}
+
+def get_verification_result(cache_key):
+    """Get a cached AI verification result and mark it as used"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'''UPDATE {BOT_PREFIX}ai_verification_cache
+               SET hits = hits + 1, last_used_at = CURRENT_TIMESTAMP
+               WHERE cache_key = %s
+               RETURNING result''',
+            (cache_key,)
+        )
+        
+        result = cursor.fetchone()
+        conn.commit()
+        
+        return json.loads(result[0]) if result else None
+
+def save_verification_result(cache_key, kind, result):
+    """Store an AI verification result"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'''INSERT INTO {BOT_PREFIX}ai_verification_cache (cache_key, kind, result) VALUES (%s, %s, %s)
+               ON CONFLICT (cache_key) DO UPDATE SET result = EXCLUDED.result, last_used_at = CURRENT_TIMESTAMP''',
+            (cache_key, kind, json.dumps(result, ensure_ascii=False))
+        )
+        
+        conn.commit()
+
+def purge_verification_results(max_age_days):
+    """Delete cached verification results not used for max_age_days; return how many were deleted"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'''DELETE FROM {BOT_PREFIX}ai_verification_cache
+               WHERE last_used_at < CURRENT_TIMESTAMP - make_interval(days => %s)''',
+            (max_age_days,)
+        )
+        deleted = cursor.rowcount
+        
+        conn.commit()
+        
+        return deleted
+
+def _insert_deliveries(cursor, bot, kind, ref_id, chat_ids, text, parse_mode, delay):
+    """Insert pending deliveries within the caller's transaction; the first attempt is due after delay seconds"""
+    rows = execute_values(
+        cursor,
+        f'''INSERT INTO {BOT_PREFIX}notification_deliveries (bot, chat_id, kind, ref_id, text, parse_mode, next_attempt_at)
+           VALUES %s RETURNING id''',
+        [(bot, chat_id, kind, ref_id, text, parse_mode) for chat_id in chat_ids],
+        template=f"(%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP + make_interval(secs => {float(delay)}))",
+        fetch=True
+    )
+    return [row[0] for row in rows]
+
+def create_deliveries(bot, kind, ref_id, chat_ids, text, parse_mode=None, first_retry_delay=60):
+    """Record one pending delivery per recipient and return their ids
+
+    Retries of a delivery start no earlier than first_retry_delay seconds from now,
+    so the caller has that long to send it before the retry job picks it up.
+    """
+    if not chat_ids:
+        return []
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        ids = _insert_deliveries(cursor, bot, kind, ref_id, chat_ids, text, parse_mode, first_retry_delay)
+        
+        conn.commit()
+        
+        return ids
+
+def mark_delivery_sent(delivery_id):
+    """Mark a pending notification delivery as sent; returns False if it was already finished"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'''UPDATE {BOT_PREFIX}notification_deliveries
+               SET status = 'sent', attempts = attempts + 1, sent_at = CURRENT_TIMESTAMP, last_error = NULL
+               WHERE status = 'pending' AND id = %s''',
+            (delivery_id,)
+        )
+        updated = cursor.rowcount
+        
+        conn.commit()
+        
+        return updated > 0
+
+def mark_delivery_failed(delivery_id, error, retry_delay, max_attempts):
+    """Record a failed attempt; the delivery is retried after retry_delay seconds until max_attempts"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'''UPDATE {BOT_PREFIX}notification_deliveries
+               SET attempts = attempts + 1,
+                   last_error = %s,
+                   status = CASE WHEN attempts + 1 >= %s THEN 'failed' ELSE 'pending' END,
+                   next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+               WHERE id = %s AND status = 'pending'
+               RETURNING status''',
+            (str(error)[:1000], max_attempts, float(retry_delay), delivery_id)
+        )
+        result = cursor.fetchone()
+        
+        conn.commit()
+        
+        return result[0] if result else None
+
+def claim_due_deliveries(limit, lease):
+    """Claim pending deliveries whose next attempt is due
+
+    Claimed rows are pushed lease seconds into the future, so another worker
+    does not pick them up while this one is sending.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'''UPDATE {BOT_PREFIX}notification_deliveries
+               SET next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+               WHERE id IN (
+                   SELECT id FROM {BOT_PREFIX}notification_deliveries
+                   WHERE status = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP
+                   ORDER BY next_attempt_at
+                   LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+               )
+               RETURNING id, bot, chat_id, kind, ref_id, text, parse_mode, attempts''',
+            (float(lease), limit)
+        )
+        rows = cursor.fetchall()
+        
+        conn.commit()
+        
+        return [
+            {
+                'id': row[0], 'bot': row[1], 'chat_id': row[2], 'kind': row[3],
+                'ref_id': row[4], 'text': row[5], 'parse_mode': row[6], 'attempts': row[7]
+            }
+            for row in rows
+        ]
+
+def extend_delivery_leases(delivery_ids, lease):
+    """Push the next attempt of pending deliveries that are being sent at least lease seconds ahead"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'''UPDATE {BOT_PREFIX}notification_deliveries
+               SET next_attempt_at = GREATEST(next_attempt_at, CURRENT_TIMESTAMP + make_interval(secs => %s))
+               WHERE status = 'pending' AND id = ANY(%s)''',
+            (float(lease), list(delivery_ids))
+        )
+        
+        conn.commit()
+
+def count_pending_deliveries():
+    """Count notification deliveries that are not sent yet"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(f"SELECT COUNT(*) FROM {BOT_PREFIX}notification_deliveries WHERE status = 'pending'")
+        
+        return cursor.fetchone()[0]
+
+def load_persisted_user_data(namespace):
+    """Load persisted user_data of a bot as {user_id: data}"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'SELECT user_id, data FROM {BOT_PREFIX}persisted_user_data WHERE namespace = %s',
+            (namespace,)
+        )
+        
+        return {row[0]: row[1] for row in cursor.fetchall()}
+
+def save_persisted_user_data(namespace, changes):
+    """Write a batch of user_data changes: (user_id, data as JSON text, or None to delete)"""
+    upserts = [(namespace, user_id, data) for user_id, data in changes if data is not None]
+    deletes = [user_id for user_id, data in changes if data is None]
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        if upserts:
+            execute_values(
+                cursor,
+                f'''INSERT INTO {BOT_PREFIX}persisted_user_data (namespace, user_id, data) VALUES %s
+                   ON CONFLICT (namespace, user_id) DO UPDATE SET data = EXCLUDED.data, updated_at = CURRENT_TIMESTAMP''',
+                upserts,
+                template="(%s, %s, %s::jsonb)"
+            )
+        if deletes:
+            cursor.execute(
+                f'DELETE FROM {BOT_PREFIX}persisted_user_data WHERE namespace = %s AND user_id = ANY(%s)',
+                (namespace, deletes)
+            )
+        
+        conn.commit()
+
+def load_persisted_conversations(namespace, name):
+    """Load persisted states of a ConversationHandler as [(key as JSON text, state)]"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f'SELECT key, state FROM {BOT_PREFIX}persisted_conversations WHERE namespace = %s AND name = %s',
+            (namespace, name)
+        )
+        
+        return cursor.fetchall()
+
+def save_persisted_conversations(namespace, changes):
+    """Write a batch of conversation changes: (name, key as JSON text, state as JSON text, or None to delete)"""
+    upserts = [(namespace, name, key, state) for name, key, state in changes if state is not None]
+    deletes = [(name, key) for name, key, state in changes if state is None]
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        if upserts:
+            execute_values(
+                cursor,
+                f'''INSERT INTO {BOT_PREFIX}persisted_conversations (namespace, name, key, state) VALUES %s
+                   ON CONFLICT (namespace, name, key) DO UPDATE SET state = EXCLUDED.state, updated_at = CURRENT_TIMESTAMP''',
+                upserts,
+                template="(%s, %s, %s, %s::jsonb)"
+            )
+        for name, key in deletes:
+            cursor.execute(
+                f'DELETE FROM {BOT_PREFIX}persisted_conversations WHERE namespace = %s AND name = %s AND key = %s',
+                (namespace, name, key)
+            )
+        
+        conn.commit()
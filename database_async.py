@@ -0,0 +1,85 @@
+"""
+Асинхронный доступ к базе данных для обработчиков телеграм ботов.
+
+Каждая функция здесь - awaitable-версия одноименной функции из database.py.
+Запросы выполняются в отдельном пуле потоков, размер которого совпадает с
+размером пула соединений, поэтому медленный запрос одного пользователя не
+останавливает цикл событий и обработку обновлений других пользователей.
+Синхронный API database.py остается для скриптов (init_db.py, reset_db.py).
+"""
+import asyncio
+import functools
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Добавляем текущую директорию в путь импорта
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+from config import DB_POOL_MAX
+
+# Потоков столько же, сколько соединений в пуле: запросы не ждут соединение внутри потока
+_executor = ThreadPoolExecutor(max_workers=DB_POOL_MAX, thread_name_prefix="db")
+
+def _run_in_executor(func):
+    """Wrap a blocking database function into a coroutine function"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+    return wrapper
+
+init_db = _run_in_executor(database.init_db)
+register_user = _run_in_executor(database.register_user)
+get_user_unlocked_stages = _run_in_executor(database.get_user_unlocked_stages)
+get_user_test_results = _run_in_executor(database.get_user_test_results)
+unlock_stage = _run_in_executor(database.unlock_stage)
+save_test_submission = _run_in_executor(database.save_test_submission)
+update_test_result = _run_in_executor(database.update_test_result)
+update_test_submission = _run_in_executor(database.update_test_submission)
+get_pending_submissions = _run_in_executor(database.get_pending_submissions)
+save_interview_request = _run_in_executor(database.save_interview_request)
+update_interview_request = _run_in_executor(database.update_interview_request)
+get_pending_interview_requests = _run_in_executor(database.get_pending_interview_requests)
+get_test_result = _run_in_executor(database.get_test_result)
+get_interview_status = _run_in_executor(database.get_interview_status)
+user_exists = _run_in_executor(database.user_exists)
+create_user = _run_in_executor(database.create_user)
+get_metrics = _run_in_executor(database.get_metrics)
+get_user_info = _run_in_executor(database.get_user_info)
+send_developer_message = _run_in_executor(database.send_developer_message)
+get_developer_messages = _run_in_executor(database.get_developer_messages)
+mark_message_read = _run_in_executor(database.mark_message_read)
+register_recruiter = _run_in_executor(database.register_recruiter)
+get_all_recruiters = _run_in_executor(database.get_all_recruiters)
+get_user_info_with_interview_details = _run_in_executor(database.get_user_info_with_interview_details)
+reset_user_progress = _run_in_executor(database.reset_user_progress)
+get_media_file_id = _run_in_executor(database.get_media_file_id)
+save_media_file_id = _run_in_executor(database.save_media_file_id)
+delete_media_file_id = _run_in_executor(database.delete_media_file_id)
+get_snapshot = _run_in_executor(database.get_snapshot)
+save_snapshot = _run_in_executor(database.save_snapshot)
+take_stopword_sentence = _run_in_executor(database.take_stopword_sentence)
+add_stopword_sentences = _run_in_executor(database.add_stopword_sentences)
+get_stopword_pool_sizes = _run_in_executor(database.get_stopword_pool_sizes)
+get_verification_result = _run_in_executor(database.get_verification_result)
+save_verification_result = _run_in_executor(database.save_verification_result)
+purge_verification_results = _run_in_executor(database.purge_verification_results)
+create_deliveries = _run_in_executor(database.create_deliveries)
+mark_delivery_sent = _run_in_executor(database.mark_delivery_sent)
+mark_delivery_failed = _run_in_executor(database.mark_delivery_failed)
+claim_due_deliveries = _run_in_executor(database.claim_due_deliveries)
+extend_delivery_leases = _run_in_executor(database.extend_delivery_leases)
+count_pending_deliveries = _run_in_executor(database.count_pending_deliveries)
+load_persisted_user_data = _run_in_executor(database.load_persisted_user_data)
+save_persisted_user_data = _run_in_executor(database.save_persisted_user_data)
+load_persisted_conversations = _run_in_executor(database.load_persisted_conversations)
+save_persisted_conversations = _run_in_executor(database.save_persisted_conversations)
+
+async def close():
+    """Stop the worker threads and close pooled connections (used on shutdown)"""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, functools.partial(_executor.shutdown, wait=True))
+    await loop.run_in_executor(None, database.stop_progress_listener)
+    database.close_pool()
@@ -7,6 +7,8 @@ module.exports = {
       // interpreter: ".venv\\Scripts\\python.exe", // для Windows
       interpreter_args: "-u",
       watch: true,
+      // Материалы перечитываются ботом на лету, перезапуск не нужен
+      ignore_watch: ["materials"],
       autorestart: true,
     },
     {
@@ -16,6 +18,8 @@ module.exports = {
       // interpreter: ".venv\\Scripts\\python.exe", // для Windows
       interpreter_args: "-u",
       watch: true,
+      // Материалы перечитываются ботом на лету, перезапуск не нужен
+      ignore_watch: ["materials"],
       autorestart: true,
     }
   ]
@@ -3,9 +3,11 @@ import os
 import sys
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile
 from telegram.ext import ContextTypes
-import database as db
+import database_async as db
 from config import CandidateStates
 from utils.helpers import load_text_content, load_test_questions
+from utils import notifier
+from utils.media import send_cached_media
 from handlers.candidate_handlers import send_main_menu, send_test_question
 import asyncio
 
@@ -21,7 +23,7 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Get user ID and current state
     user_id = update.effective_user.id
-    unlocked_stages = db.get_user_unlocked_stages(user_id)
+    unlocked_stages = await db.get_user_unlocked_stages(user_id)
     
     # Check for admin mode
     admin_mode = context.user_data.get("admin_mode", False)
@@ -161,7 +163,7 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif query.data == "confirm_primary_test":
         # Проверяем, проходил ли пользователь уже этот тест
         user_id = update.effective_user.id
-        user_test_results = db.get_user_test_results(user_id)
+        user_test_results = await db.get_user_test_results(user_id)
         
         # Если тест уже был пройден (успешно или неуспешно), не позволяем пересдавать
         if "primary_test" in user_test_results:
@@ -222,7 +224,7 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif query.data == "where_to_start_test":
         # Проверяем, проходил ли пользователь уже этот тест
         user_id = update.effective_user.id
-        user_test_results = db.get_user_test_results(user_id)
+        user_test_results = await db.get_user_test_results(user_id)
         
         # Если тест уже был пройден (успешно или неуспешно), не позволяем пересдавать
         if "where_to_start_test" in user_test_results:
@@ -261,7 +263,7 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif query.data == "confirm_where_to_start_test":
         # Проверяем, проходил ли пользователь уже этот тест
         user_id = update.effective_user.id
-        user_test_results = db.get_user_test_results(user_id)
+        user_test_results = await db.get_user_test_results(user_id)
         
         # Если тест уже был пройден (успешно или неуспешно), не позволяем пересдавать
         if "where_to_start_test" in user_test_results:
@@ -309,16 +311,14 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             # Сначала отправляем документ
             docx_path = "materials/logic_test_prepare.docx"
-            with open(docx_path, 'rb') as doc:
-                await context.bot.send_document(
-                    chat_id=update.effective_chat.id,
-                    document=doc,
-                    filename="logic_test_prepare.docx",
-                    caption="Материалы для подготовки к тесту на логику"
-                )
-                
-            # Добавляем паузу в 5 секунд, чтобы файл успел загрузиться
-            await asyncio.sleep(5)
+            await send_cached_media(
+                context.bot,
+                update.effective_chat.id,
+                docx_path,
+                kind="document",
+                filename="logic_test_prepare.docx",
+                caption="Материалы для подготовки к тесту на логику"
+            )
                 
             # Затем отправляем краткое описание КАК НОВОЕ СООБЩЕНИЕ
             brief_content = (
@@ -404,7 +404,7 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif query.data == "confirm_logic_test":
         # Проверяем, проходил ли пользователь уже этот тест
         user_id = update.effective_user.id
-        user_test_results = db.get_user_test_results(user_id)
+        user_test_results = await db.get_user_test_results(user_id)
         
         # Если тест уже был пройден (успешно или неуспешно), не позволяем пересдавать
         if "logic_test_result" in user_test_results:
@@ -482,12 +482,13 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
             # Send the video as a separate message
             video_path = "materials/materials_for_prepare.mp4"
-            with open(video_path, 'rb') as video:
-                video_message = await context.bot.send_video(
-                    chat_id=update.effective_chat.id,
-                    video=video,
-                    caption="Материалы для подготовки"
-                )
+            video_message = await send_cached_media(
+                context.bot,
+                update.effective_chat.id,
+                video_path,
+                kind="video",
+                caption="Материалы для подготовки"
+            )
             
             # Now, send the survey question
             survey_data = load_test_questions("materials_for_prepare_survey.json")
@@ -600,7 +601,7 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
         
         # Unlock the next stage (take_test)
-        db.unlock_stage(user_id, "take_test")
+        await db.unlock_stage(user_id, "take_test")
         
         # Update the message with confirmation and return button
         keyboard = [
@@ -627,7 +628,7 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             # Проверяем, проходил ли пользователь уже этот тест
             user_id = update.effective_user.id
-            user_test_results = db.get_user_test_results(user_id)
+            user_test_results = await db.get_user_test_results(user_id)
             
             # Если тест уже был пройден (успешно или неуспешно), не позволяем пересдавать
             if "take_test_result" in user_test_results:
@@ -684,7 +685,7 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
         # Проверяем, проходил ли пользователь уже этот тест
         user_id = update.effective_user.id
-        user_test_results = db.get_user_test_results(user_id)
+        user_test_results = await db.get_user_test_results(user_id)
         
         # Если тест уже был пройден (успешно или неуспешно), не позволяем пересдавать
         if "take_test_result" in user_test_results:
@@ -800,7 +801,7 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif query.data == "confirm_interview_prep_test":
         # Проверяем, проходил ли пользователь уже этот тест
         user_id = update.effective_user.id
-        user_test_results = db.get_user_test_results(user_id)
+        user_test_results = await db.get_user_test_results(user_id)
         
         # Если тест уже был пройден (успешно или неуспешно), не позволяем пересдавать
         if "interview_prep_test" in user_test_results:
@@ -837,7 +838,7 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Handler for scheduled_interview button
     elif (query.data == "schedule_interview" and "schedule_interview" in unlocked_stages) or admin_mode and query.data == "schedule_interview":
         # Get the test results for the user
-        user_test_results = db.get_user_test_results(user_id)
+        user_test_results = await db.get_user_test_results(user_id)
         
         # В режиме администратора используем результаты из context.user_data
         if admin_mode:
@@ -877,7 +878,7 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Check if the user has passed at least 3 out of 5 tests
         if passed_tests >= 3:  # More than 50% requirement
             # Get interview status to check if user already has a pending request
-            interview_status = db.get_interview_status(user_id)
+            interview_status = await db.get_interview_status(user_id)
             
             if interview_status and interview_status['status'] == 'pending':
                 # User already has a pending request
@@ -1039,11 +1040,8 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
         selected_day = context.user_data.get("interview_day", "Не указан")
         selected_time = context.user_data.get("interview_time", "Не указано")
         
-        # Import handle_interview_request function from candidate_bot
-        from candidate_bot import handle_interview_request
-        
         # Submit interview request and send notification to recruiter
-        await handle_interview_request(user_id, selected_day, selected_time)
+        await notifier.handle_interview_request(user_id, selected_day, selected_time)
         
         # Show confirmation message
         message = (
@@ -7,27 +7,29 @@ import datetime
 import random
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile
 from telegram.ext import ContextTypes
-import database as db
+import database_async as db
 
 # Добавляем корневую директорию проекта в путь импорта
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config import CandidateStates
 from utils.helpers import load_text_content, load_test_questions, get_stopwords_data
-from utils.chatgpt_helpers import generate_ai_stopword_sentence, verify_stopword_rephrasing_ai, verify_poem_task
+from utils.chatgpt_helpers import verify_stopword_rephrasing_ai, verify_poem_task
+from utils import pregrader, sentence_pool, timers
+from utils.rate_limiter import COUNTDOWN
 
 logger = logging.getLogger(__name__)
 
 async def send_main_menu(update, context, message=None, edit=False):
     """Send the main menu with appropriate buttons based on user's unlocked stages"""
     user_id = update.effective_user.id
-    unlocked_stages = db.get_user_unlocked_stages(user_id)
+    unlocked_stages = await db.get_user_unlocked_stages(user_id)
     
     # Check for admin mode
     admin_mode = context.user_data.get("admin_mode", False)
     
     # Get test results for emoji display
-    user_test_results = db.get_user_test_results(user_id)
+    user_test_results = await db.get_user_test_results(user_id)
     
     # In admin mode, get test results from context instead of DB
     if admin_mode:
@@ -185,8 +187,8 @@ async def send_main_menu(update, context, message=None, edit=False):
                 if "primary_test" in display_test_results:
                     # If there's a test result, this stage should be unlocked regardless of pass/fail
                     if stage_id not in unlocked_stages:
-                        db.unlock_stage(user_id, "where_to_start")
-                        unlocked_stages = db.get_user_unlocked_stages(user_id)  # Refresh unlocked stages
+                        await db.unlock_stage(user_id, "where_to_start")
+                        unlocked_stages = await db.get_user_unlocked_stages(user_id)  # Refresh unlocked stages
                     
                     # Check if there's a test result for this stage
                     if "where_to_start_test" in display_test_results:
@@ -209,8 +211,8 @@ async def send_main_menu(update, context, message=None, edit=False):
                 if "where_to_start_test" in display_test_results:
                     # If there's a test result, this stage should be unlocked regardless of pass/fail
                     if stage_id not in unlocked_stages:
-                        db.unlock_stage(user_id, "logic_test")
-                        unlocked_stages = db.get_user_unlocked_stages(user_id)  # Refresh unlocked stages
+                        await db.unlock_stage(user_id, "logic_test")
+                        unlocked_stages = await db.get_user_unlocked_stages(user_id)  # Refresh unlocked stages
                     
                     # Check if there's a test result for this stage
                     if "logic_test_result" in display_test_results:
@@ -230,8 +232,8 @@ async def send_main_menu(update, context, message=None, edit=False):
                 if "logic_test_result" in display_test_results:
                     # If there's a test result, this stage should be unlocked regardless of pass/fail
                     if stage_id not in unlocked_stages:
-                        db.unlock_stage(user_id, "preparation_materials")
-                        unlocked_stages = db.get_user_unlocked_stages(user_id)  # Refresh unlocked stages
+                        await db.unlock_stage(user_id, "preparation_materials")
+                        unlocked_stages = await db.get_user_unlocked_stages(user_id)  # Refresh unlocked stages
                     
                     if stage_id in unlocked_stages:
                         # Stage unlocked - show as blue circle (for informational module)
@@ -405,16 +407,12 @@ async def send_test_question(update, context, edit_message=False):
     
     # Запускаем или обновляем таймер, если есть ограничение по времени
     if time_limit is not None:
-        # Останавливаем существующий таймер, если есть
-        if "test_timer_job" in context.user_data:
-            try:
-                context.user_data["test_timer_job"].schedule_removal()
-                logger.info("Таймер остановлен при завершении теста")
-            except Exception as e:
-                logger.error(f"Ошибка при остановке таймера: {e}")
+        # Таймер одного чата один: новый вопрос заменяет таймер предыдущего
+        timer_key = f"test:{update.effective_chat.id}"
         
         # Данные для передачи в функцию обновления таймера
         job_data = {
+            "timer_key": timer_key,
             "chat_id": update.effective_chat.id,
             "message_id": message_id,
             "current_question": current_question,
@@ -425,15 +423,14 @@ async def send_test_question(update, context, edit_message=False):
         }
         
         try:
-            # Запускаем таймер, который будет обновлять сообщение каждую секунду
-            job = context.job_queue.run_repeating(
-                update_timer,
-                interval=1.0,  # Интервал обновления - 1 секунда
-                first=1.0,     # Первое обновление через 1 секунду
-                data=job_data,
-                name=f"timer_{update.effective_chat.id}"
+            # Общий планировщик обновляет отсчет в сообщении и завершает тест по окончании времени
+            timers.schedule(
+                timer_key,
+                context.user_data["test_end_time"],
+                on_tick=lambda remaining: update_timer(job_data, remaining),
+                on_expire=lambda: expire_test_timer(job_data)
             )
-            context.user_data["test_timer_job"] = job
+            context.user_data["test_timer_key"] = timer_key
             logger.info(f"Запущен таймер для теста, оставшееся время: {time_str}")
         except Exception as e:
             logger.error(f"Ошибка при запуске таймера: {e}")
@@ -485,7 +482,7 @@ async def handle_test_completion(update, context):
         logger.info(f"Admin mode: Test {test_name} completed with score {score:.1f}%, result: {'PASS' if passed else 'FAIL'}")
     else:
         # Save test result to database
-        db.update_test_result(user_id, test_name, passed)
+        await db.update_test_result(user_id, test_name, passed)
         logger.info(f"User {user_id} completed test {test_name} with score {score:.1f}%, result: {'PASS' if passed else 'FAIL'}")
     
     # Determine which stages should be unlocked based on the test
@@ -502,7 +499,7 @@ async def handle_test_completion(update, context):
     
     # Unlock the next stage in the regular mode only
     if next_stage and not admin_mode:
-        db.unlock_stage(user_id, next_stage)
+        await db.unlock_stage(user_id, next_stage)
     
     # Show results to the user
     if passed:
@@ -581,13 +578,9 @@ async def handle_test_completion(update, context):
         del context.user_data["timer_data"]
     
     # Останавливаем таймер, если он существует
-    if "test_timer_job" in context.user_data:
-        try:
-            context.user_data["test_timer_job"].schedule_removal()
-            logger.info("Таймер остановлен при завершении теста")
-        except Exception as e:
-            logger.error(f"Ошибка при остановке таймера: {e}")
-        del context.user_data["test_timer_job"]
+    if "test_timer_key" in context.user_data:
+        timers.cancel(context.user_data.pop("test_timer_key"))
+        logger.info("Таймер остановлен при завершении теста")
     
     # Не возвращаемся сразу в главное меню, т.к. пользователь может 
     # захотеть прочитать сообщение о результатах
@@ -668,14 +661,9 @@ async def handle_test_answer(update: Update, context: ContextTypes.DEFAULT_TYPE)
                     logger.info(f"Answer debug - User selected option {answer_index} but correct answer was {correct_answer}")
                 
                 # Останавливаем таймер перед обновлением UI, чтобы избежать гонки
-                if "test_timer_job" in context.user_data:
-                    try:
-                        context.user_data["test_timer_job"].schedule_removal()
-                        logger.info("Таймер остановлен для безопасной обработки ответа")
-                        # Даем небольшую паузу для полной остановки таймера
-                        await asyncio.sleep(0.1)
-                    except Exception as e:
-                        logger.error(f"Ошибка при остановке таймера для обработки ответа: {e}")
+                if "test_timer_key" in context.user_data:
+                    timers.cancel(context.user_data["test_timer_key"])
+                    logger.info("Таймер остановлен для безопасной обработки ответа")
                 
                 # Сразу переходим к следующему вопросу без показа правильности ответа
                 context.user_data["current_question"] = current_question + 1
@@ -736,7 +724,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Проверяем секретную команду для сброса прогресса
     if text == "!reload2!":
         # Сбрасываем прогресс пользователя в базе данных
-        db.reset_user_progress(user_id)
+        await db.reset_user_progress(user_id)
         
         # Очищаем данные пользователя в контексте
         context.user_data.clear()
@@ -773,11 +761,11 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # Разблокируем все модули
         for module in all_modules:
-            db.unlock_stage(user_id, module)
+            await db.unlock_stage(user_id, module)
         
         # Отмечаем все тесты как пройденные
         for test_name, result in test_results.items():
-            db.update_test_result(user_id, test_name, result)
+            await db.update_test_result(user_id, test_name, result)
         
         await update.message.reply_text(
             "🔓 Администраторский режим активирован. Все модули разблокированы и все тесты отмечены как пройденные."
@@ -789,7 +777,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Проверяем команду для пропуска текущего модуля
     if text == "!skip2!":
         # Получаем список разблокированных модулей
-        unlocked_stages = db.get_user_unlocked_stages(user_id)
+        unlocked_stages = await db.get_user_unlocked_stages(user_id)
         
         # Порядок модулей
         module_order = [
@@ -845,10 +833,10 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Если для текущего модуля есть тест, отмечаем его как пройденный
         if last_unlocked in module_test_mapping:
             test_name = module_test_mapping[last_unlocked]
-            db.update_test_result(user_id, test_name, True)
+            await db.update_test_result(user_id, test_name, True)
         
         # Разблокируем следующий модуль
-        db.unlock_stage(user_id, next_module_to_unlock)
+        await db.unlock_stage(user_id, next_module_to_unlock)
         
         await update.message.reply_text(
             f"✅ Модуль '{last_unlocked}' отмечен как успешно пройденный.\n🔓 Модуль '{next_module_to_unlock}' разблокирован."
@@ -908,14 +896,9 @@ async def process_stopword_answer(update, context, text):
     
     try:
         # Останавливаем таймер, если он существует
-        if "stopwords_timer_job" in context.user_data:
-            try:
-                context.user_data["stopwords_timer_job"].schedule_removal()
-                logger.info("Таймер остановлен при обработке ответа на вопрос")
-                # Даем небольшую паузу для полной остановки таймера
-                await asyncio.sleep(0.1)
-            except Exception as e:
-                logger.error(f"Ошибка при остановке таймера: {e}")
+        if "stopwords_timer_key" in context.user_data:
+            timers.cancel(context.user_data["stopwords_timer_key"])
+            logger.info("Таймер остановлен при обработке ответа на вопрос")
         
         # Получаем текущий вопрос
         current_stopword = context.user_data.get("current_stopword", {})
@@ -940,8 +923,13 @@ async def process_stopword_answer(update, context, text):
         
         # Проверяем ответ пользователя с помощью ИИ
         try:
-            # Используем AI для проверки ответа пользователя
-            passed, feedback = await verify_stopword_rephrasing_ai(original_sentence, text, current_stopword)
+            # Очевидные ошибки (ответ совпадает с исходным или содержит стоп-слово) решаются без AI
+            verdict = pregrader.grade(original_sentence, text, current_stopword)
+            if verdict is not None:
+                passed, feedback = verdict
+            else:
+                # Используем AI для проверки ответа пользователя
+                passed, feedback = await verify_stopword_rephrasing_ai(original_sentence, text, current_stopword, user_id)
             
             # Определяем результат
             result_emoji = "✅" if passed else "❌"
@@ -1001,11 +989,11 @@ async def handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     last_name = update.effective_user.last_name
     
     # Register user in the database if not already registered
-    db.register_candidate(user_id, username, first_name, last_name)
+    await db.register_candidate(user_id, username, first_name, last_name)
     
     # Unlock first stages
-    db.unlock_stage(user_id, "about_company")
-    db.unlock_stage(user_id, "primary_file")
+    await db.unlock_stage(user_id, "about_company")
+    await db.unlock_stage(user_id, "primary_file")
     
     # Welcome message
     await update.message.reply_text(
@@ -1027,7 +1015,7 @@ async def handle_schedule_interview(update: Update, context: ContextTypes.DEFAUL
     
     # Получаем информацию о пользователе из базы данных
     user_id = update.effective_user.id
-    user_info = db.get_user_info(user_id)
+    user_info = await db.get_user_info(user_id)
     
     # Формируем текст с username пользователя
     username = user_info.get('username', '')
@@ -1072,14 +1060,9 @@ async def next_stopword_question(update, context):
     
     try:
         # Останавливаем таймер, если он существует
-        if "stopwords_timer_job" in context.user_data:
-            try:
-                context.user_data["stopwords_timer_job"].schedule_removal()
-                logger.info("Таймер остановлен при переходе к следующему вопросу")
-                # Даем небольшую паузу для полной остановки таймера
-                await asyncio.sleep(0.1)
-            except Exception as e:
-                logger.error(f"Ошибка при остановке таймера: {e}")
+        if "stopwords_timer_key" in context.user_data:
+            timers.cancel(context.user_data["stopwords_timer_key"])
+            logger.info("Таймер остановлен при переходе к следующему вопросу")
         
         # Проверяем существование данных теста
         if "stopwords_test" not in context.user_data:
@@ -1122,14 +1105,9 @@ async def handle_stopword_answer(update, context):
     
     try:
         # Останавливаем таймер, если он существует
-        if "stopwords_timer_job" in context.user_data:
-            try:
-                context.user_data["stopwords_timer_job"].schedule_removal()
-                logger.info("Таймер остановлен при обработке ответа на вопрос")
-                # Даем небольшую паузу для полной остановки таймера
-                await asyncio.sleep(0.1)
-            except Exception as e:
-                logger.error(f"Ошибка при остановке таймера: {e}")
+        if "stopwords_timer_key" in context.user_data:
+            timers.cancel(context.user_data["stopwords_timer_key"])
+            logger.info("Таймер остановлен при обработке ответа на вопрос")
         
         
         # Получаем выбранный вариант ответа
@@ -1228,7 +1206,7 @@ async def start_stopwords_test(update, context):
     
     # Проверяем, проходил ли пользователь уже этот тест
     user_id = update.effective_user.id
-    user_test_results = db.get_user_test_results(user_id)
+    user_test_results = await db.get_user_test_results(user_id)
     
     # Если тест уже был пройден (успешно или неуспешно), не позволяем пересдавать
     if "where_to_start_test" in user_test_results:
@@ -1240,8 +1218,8 @@ async def start_stopwords_test(update, context):
         )
         return CandidateStates.MAIN_MENU
         
-    # Получаем данные о стоп-словах из Google Sheets
-    stopwords_data = get_stopwords_data()
+    # Получаем данные о стоп-словах (кэш; при холодном старте загрузка идет в отдельном потоке)
+    stopwords_data = await asyncio.to_thread(get_stopwords_data)
     
     if not stopwords_data:
         await query.edit_message_text(
@@ -1287,7 +1265,7 @@ async def begin_stopwords_test(update, context):
     
     # Проверяем, проходил ли пользователь уже этот тест
     user_id = update.effective_user.id
-    user_test_results = db.get_user_test_results(user_id)
+    user_test_results = await db.get_user_test_results(user_id)
     
     # Если тест уже был пройден (успешно или неуспешно), не позволяем пересдавать
     if "where_to_start_test" in user_test_results:
@@ -1299,8 +1277,8 @@ async def begin_stopwords_test(update, context):
         )
         return CandidateStates.MAIN_MENU
     
-    # Получаем данные о стоп-словах из Google Sheets
-    stopwords_data = get_stopwords_data()
+    # Получаем данные о стоп-словах (кэш; при холодном старте загрузка идет в отдельном потоке)
+    stopwords_data = await asyncio.to_thread(get_stopwords_data)
     
     if not stopwords_data:
         await query.edit_message_text(
@@ -1311,6 +1289,9 @@ async def begin_stopwords_test(update, context):
         )
         return CandidateStates.MAIN_MENU
     
+    # Предзагрузка от предыдущей попытки теста больше не нужна
+    sentence_pool.cancel_prefetch(user_id)
+    
     # Выбираем случайные стоп-слова для теста (без генерации предложений)
     random.shuffle(stopwords_data)
     selected_stopwords = stopwords_data[:10] if len(stopwords_data) >= 10 else stopwords_data
@@ -1355,22 +1336,30 @@ async def send_stopword_question(update, context):
         # Предложение уже сгенерировано, используем его
         current_stopword = generated_sentences[current_question_idx]
     else:
-        # Нужно сгенерировать предложение
-        if hasattr(update, 'callback_query') and update.callback_query:
-            # Отправляем сообщение о генерации
-            await update.callback_query.edit_message_text(
-                f"⏳ Генерирую предложение..."
-            )
-        elif update.effective_message:
-            # Отправляем как новое сообщение
-            await update.effective_message.reply_text(
-                f"⏳ Генерирую предложение..."
-            )
-        
         try:
-            # Генерируем предложение с использованием стоп-слова через ИИ
+            # Сначала берем предложение, подготовленное заранее, затем из пула; генерация через ИИ - только если пул пуст
             word = current_stopword.get("word", "")
-            sentence = await generate_ai_stopword_sentence(current_stopword)
+            sentence = await sentence_pool.get_prefetched(update.effective_user.id, current_question_idx)
+            if sentence is None:
+                sentence = await sentence_pool.take_sentence(word)
+            
+            if sentence is None:
+                if hasattr(update, 'callback_query') and update.callback_query:
+                    # Отправляем сообщение о генерации
+                    await update.callback_query.edit_message_text(
+                        f"⏳ Генерирую предложение..."
+                    )
+                elif update.effective_message:
+                    # Отправляем как новое сообщение
+                    await update.effective_message.reply_text(
+                        f"⏳ Генерирую предложение..."
+                    )
+                
+                sentence = await sentence_pool.generate_sentence(current_stopword, update.effective_user.id)
+            
+            if sentence is None:
+                # ИИ не вернул предложение - используем простой пример, как при ошибке генерации
+                sentence = f"В этом предложении используется стоп-слово {word}."
             
             # Обновляем объект с предложением
             current_stopword["sentence"] = sentence
@@ -1433,22 +1422,21 @@ async def send_stopword_question(update, context):
             parse_mode='HTML'
         )
     
+    # Пока кандидат отвечает, готовим предложения для следующих вопросов
+    sentence_pool.prefetch(update.effective_user.id, all_stopwords, current_question_idx + 1, end_time)
+    
     # Запускаем или обновляем таймер
     message_id = message.message_id if message else (
         update.callback_query.message.message_id if hasattr(update, 'callback_query') and update.callback_query else None
     )
     
     if message_id:
-        # Останавливаем существующий таймер, если есть
-        if "stopwords_timer_job" in context.user_data:
-            try:
-                context.user_data["stopwords_timer_job"].schedule_removal()
-                logger.info("Таймер остановлен при переходе к новому вопросу")
-            except Exception as e:
-                logger.error(f"Ошибка при остановке таймера: {e}")
+        # Таймер одного чата один: новый вопрос заменяет таймер предыдущего
+        timer_key = f"stopwords:{update.effective_chat.id}"
         
         # Данные для передачи в функцию обновления таймера
         job_data = {
+            "timer_key": timer_key,
             "chat_id": update.effective_chat.id,
             "message_id": message_id,
             "stopwords": all_stopwords,
@@ -1467,15 +1455,14 @@ async def send_stopword_question(update, context):
         }
         
         try:
-            # Запускаем таймер, который будет обновлять сообщение каждую секунду
-            job = context.job_queue.run_repeating(
-                update_stopwords_timer,
-                interval=1.0,  # Интервал обновления - 1 секунда
-                first=1.0,     # Первое обновление через 1 секунду
-                data=job_data,
-                name=f"stopwords_timer_{update.effective_chat.id}"
+            # Общий планировщик обновляет отсчет в сообщении и завершает тест по окончании времени
+            timers.schedule(
+                timer_key,
+                end_time,
+                on_tick=lambda remaining: update_stopwords_timer(job_data, remaining),
+                on_expire=lambda: expire_stopwords_timer(job_data)
             )
-            context.user_data["stopwords_timer_job"] = job
+            context.user_data["stopwords_timer_key"] = timer_key
             logger.info(f"Запущен таймер для теста стоп-слов, оставшееся время: {time_str}")
         except Exception as e:
             logger.error(f"Ошибка при запуске таймера: {e}")
@@ -1484,14 +1471,12 @@ async def send_stopword_question(update, context):
 
 async def handle_stopwords_test_completion(update, context):
     """Обработка завершения теста стоп-слов"""
+    sentence_pool.cancel_prefetch(update.effective_user.id)
+    
     # Останавливаем таймер, если он существует
-    if "stopwords_timer_job" in context.user_data:
-        try:
-            context.user_data["stopwords_timer_job"].schedule_removal()
-            logger.info("Таймер остановлен при завершении теста")
-        except Exception as e:
-            logger.error(f"Ошибка при остановке таймера: {e}")
-        del context.user_data["stopwords_timer_job"]
+    if "stopwords_timer_key" in context.user_data:
+        timers.cancel(context.user_data.pop("stopwords_timer_key"))
+        logger.info("Таймер остановлен при завершении теста")
     
     # Получаем результаты теста
     test_data = context.user_data.get("stopwords_test", {})
@@ -1506,10 +1491,10 @@ async def handle_stopwords_test_completion(update, context):
     
     # Сохраняем результат теста в базе данных
     user_id = update.effective_user.id
-    db.update_test_result(user_id, "where_to_start_test", passed)
+    await db.update_test_result(user_id, "where_to_start_test", passed)
     
     # Разблокируем следующий этап
-    db.unlock_stage(user_id, "logic_test")
+    await db.unlock_stage(user_id, "logic_test")
     
     # Формируем сообщение с результатами
     if passed:
@@ -1576,18 +1561,14 @@ def get_test_time_limit(test_name):
     # Возвращаем ограничение по времени или None, если ограничения нет
     return time_limits.get(test_name, None)
 
-async def update_timer(context):
-    """Обновляет таймер для тестов с ограничением времени"""
-    job_data = context.job.data
-    
+async def update_timer(job_data, remaining):
+    """Обновляет отсчет времени в сообщении теста с ограничением времени"""
     # Получаем данные из параметров задания
     chat_id = job_data.get("chat_id")
     message_id = job_data.get("message_id")
     current_question = job_data.get("current_question")
-    end_time = job_data.get("end_time")
     
-    # Получаем текущий контекст и обновление
-    update_obj = job_data.get("update")
+    # Получаем текущий контекст
     context_obj = job_data.get("context_obj")
     
     # Проверяем блокировку - если идет обработка ответа, пропускаем обновление таймера
@@ -1598,42 +1579,15 @@ async def update_timer(context):
     # Проверяем, не изменился ли номер текущего вопроса в контексте
     context_current_question = context_obj.user_data.get("current_question", 0)
     
-    # Если номер вопроса изменился, останавливаем этот таймер
+    # Если номер вопроса изменился, этот отсчет устарел (новый вопрос запускает свой таймер)
     if context_current_question != current_question:
-        logger.info(f"Номер вопроса изменился: {current_question} -> {context_current_question}. Останавливаем таймер.")
-        context.job.schedule_removal()
+        logger.info(f"Номер вопроса изменился: {current_question} -> {context_current_question}. Пропускаем обновление таймера.")
         return
     
     # Проверяем, не завершился ли уже тест
     if "test_data" not in context_obj.user_data:
         logger.info("Тест завершен. Останавливаем таймер.")
-        context.job.schedule_removal()
-        return
-    
-    # Вычисляем оставшееся время
-    now = time.time()
-    remaining = max(0, end_time - now)
-    
-    # Если время истекло, завершаем тест
-    if remaining <= 0:
-        logger.info("Время теста истекло. Завершаем тест.")
-        context.job.schedule_removal()
-        
-        # Заменяем сообщение на уведомление об истечении времени
-        try:
-            await context_obj.bot.edit_message_text(
-                chat_id=chat_id,
-                message_id=message_id,
-                text="⏰ Время тестирования истекло! Пожалуйста, вернитесь в главное меню.",
-                reply_markup=InlineKeyboardMarkup([
-                    [InlineKeyboardButton("⬅️ Вернуться в главное меню", callback_data="back_to_menu")]
-                ])
-            )
-        except Exception as e:
-            logger.error(f"Ошибка при обновлении сообщения об истечении времени: {e}")
-        
-        # Вызываем функцию для обработки таймаута теста
-        asyncio.create_task(test_timeout(update_obj, context_obj))
+        timers.cancel(job_data["timer_key"])
         return
     
     # Форматируем оставшееся время
@@ -1645,7 +1599,6 @@ async def update_timer(context):
         if not current_message_text:
             # Если текст сообщения недоступен, прекращаем обновление
             logger.error("Текст сообщения недоступен для обновления таймера")
-            context.job.schedule_removal()
             return
         
         # Обновляем только строку с временем, остальной текст сохраняем
@@ -1696,7 +1649,9 @@ async def update_timer(context):
                         chat_id=chat_id,
                         message_id=message_id,
                         text=updated_text,
-                        reply_markup=InlineKeyboardMarkup(keyboard) if keyboard else None
+                        reply_markup=InlineKeyboardMarkup(keyboard) if keyboard else None,
+                        # Обновление отсчета уступает ответам кандидатам при нагрузке
+                        rate_limit_args={"priority": COUNTDOWN}
                     )
                 except Exception as e:
                     logger.error(f"Ошибка при обновлении таймера с сохраненной клавиатурой: {e}")
@@ -1707,22 +1662,42 @@ async def update_timer(context):
     except Exception as e:
         logger.error(f"Ошибка при обновлении таймера: {e}")
         # Не останавливаем таймер при ошибке, чтобы продолжить попытки обновления
-    
-    return CandidateStates.STOPWORDS_TEST
 
-async def update_stopwords_timer(context):
-    """Обновляет таймер для теста стоп-слов"""
-    job_data = context.job.data
+async def expire_test_timer(job_data):
+    """Завершает тест с ограничением времени, когда время истекло"""
+    update_obj = job_data.get("update")
+    context_obj = job_data.get("context_obj")
+    
+    # Тест мог завершиться в момент срабатывания таймера
+    if "test_data" not in context_obj.user_data:
+        return
     
+    logger.info("Время теста истекло. Завершаем тест.")
+    
+    # Заменяем сообщение на уведомление об истечении времени
+    try:
+        await context_obj.bot.edit_message_text(
+            chat_id=job_data.get("chat_id"),
+            message_id=job_data.get("message_id"),
+            text="⏰ Время тестирования истекло! Пожалуйста, вернитесь в главное меню.",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("⬅️ Вернуться в главное меню", callback_data="back_to_menu")]
+            ])
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при обновлении сообщения об истечении времени: {e}")
+    
+    # Обрабатываем таймаут теста
+    await test_timeout(update_obj, context_obj)
+
+async def update_stopwords_timer(job_data, remaining):
+    """Обновляет отсчет времени в сообщении теста стоп-слов"""
     # Получаем данные из параметров задания
     chat_id = job_data.get("chat_id")
     message_id = job_data.get("message_id")
     current_question = job_data.get("current_question")
-    end_time = job_data.get("end_time")
-    stopwords = job_data.get("stopwords", [])
     
-    # Получаем текущий контекст и обновление
-    update_obj = job_data.get("update")
+    # Получаем текущий контекст
     context_obj = job_data.get("context_obj")
     
     # Проверяем блокировку - если идет обработка ответа, пропускаем обновление таймера
@@ -1730,49 +1705,19 @@ async def update_stopwords_timer(context):
         logger.info("Пропуск обновления таймера стоп-слов, так как идет обработка ответа")
         return
     
-    # Проверяем, не изменился ли номер текущего вопроса в контексте
-    test_data = context_obj.user_data.get("stopwords_test", {})
-    current_question_in_context = test_data.get("current_question", 0)
-    
-    # Если номер вопроса изменился, останавливаем этот таймер
-    if current_question_in_context != current_question:
-        logger.info(f"Номер вопроса изменился: {current_question} -> {current_question_in_context}. Останавливаем таймер.")
-        context.job.schedule_removal()
-        return
-    
     # Проверяем, не завершился ли уже тест
     if "stopwords_test" not in context_obj.user_data:
         logger.info("Тест завершен. Останавливаем таймер.")
-        context.job.schedule_removal()
+        timers.cancel(job_data["timer_key"])
         return
     
-    # Вычисляем оставшееся время
-    now = time.time()
-    remaining = max(0, end_time - now)
+    # Проверяем, не изменился ли номер текущего вопроса в контексте
+    test_data = context_obj.user_data.get("stopwords_test", {})
+    current_question_in_context = test_data.get("current_question", 0)
     
-    # Если время истекло, завершаем тест
-    if remaining <= 0:
-        logger.info("Время теста истекло. Завершаем тест.")
-        context.job.schedule_removal()
-        
-        # Отправляем сообщение о завершении времени
-        await context_obj.bot.edit_message_text(
-            chat_id=chat_id,
-            message_id=message_id,
-            text="⏰ Время тестирования истекло! Пожалуйста, вернитесь в главное меню.",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("⬅️ Вернуться в главное меню", callback_data="back_to_menu")]
-            ])
-        )
-        
-        # Очищаем данные теста из контекста
-        if "stopwords_test" in context_obj.user_data:
-            del context_obj.user_data["stopwords_test"]
-        if "current_stopword" in context_obj.user_data:
-            del context_obj.user_data["current_stopword"]
-        if "awaiting_stopword_answer" in context_obj.user_data:
-            del context_obj.user_data["awaiting_stopword_answer"]
-        
+    # Если номер вопроса изменился, этот отсчет устарел (новый вопрос запускает свой таймер)
+    if current_question_in_context != current_question:
+        logger.info(f"Номер вопроса изменился: {current_question} -> {current_question_in_context}. Пропускаем обновление таймера.")
         return
     
     # Форматируем оставшееся время
@@ -1782,10 +1727,9 @@ async def update_stopwords_timer(context):
         # Получаем текущий текст из контекста, если он сохранен
         current_message_text = job_data.get("current_message_text", "")
         
-        # Если текст не сохранен, предполагаем проблему и останавливаем таймер
+        # Если текст не сохранен, предполагаем проблему и пропускаем обновление
         if not current_message_text:
             logger.error("Текст сообщения недоступен для обновления таймера стоп-слов")
-            context.job.schedule_removal()
             return
         
         # Обновляем только строку с временем
@@ -1803,7 +1747,8 @@ async def update_stopwords_timer(context):
                     chat_id=chat_id,
                     message_id=message_id,
                     text=updated_text,
-                    parse_mode='HTML'
+                    parse_mode='HTML',
+                    rate_limit_args={"priority": COUNTDOWN}
                 )
             except Exception as e:
                 logger.error(f"Ошибка при обновлении текста таймера стоп-слов: {e}")
@@ -1811,7 +1756,40 @@ async def update_stopwords_timer(context):
             logger.warning("Не удалось найти строку с таймером в тесте стоп-слов")
     except Exception as e:
         logger.error(f"Ошибка при обновлении таймера стоп-слов: {e}")
-        context.job.schedule_removal()
+
+async def expire_stopwords_timer(job_data):
+    """Завершает тест стоп-слов, когда время истекло"""
+    update_obj = job_data.get("update")
+    context_obj = job_data.get("context_obj")
+    
+    # Тест мог завершиться в момент срабатывания таймера
+    if "stopwords_test" not in context_obj.user_data:
+        return
+    
+    logger.info("Время теста истекло. Завершаем тест.")
+    sentence_pool.cancel_prefetch(update_obj.effective_user.id)
+    context_obj.user_data.pop("stopwords_timer_key", None)
+    
+    # Отправляем сообщение о завершении времени
+    try:
+        await context_obj.bot.edit_message_text(
+            chat_id=job_data.get("chat_id"),
+            message_id=job_data.get("message_id"),
+            text="⏰ Время тестирования истекло! Пожалуйста, вернитесь в главное меню.",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("⬅️ Вернуться в главное меню", callback_data="back_to_menu")]
+            ])
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при обновлении сообщения об истечении времени: {e}")
+    
+    # Очищаем данные теста из контекста
+    if "stopwords_test" in context_obj.user_data:
+        del context_obj.user_data["stopwords_test"]
+    if "current_stopword" in context_obj.user_data:
+        del context_obj.user_data["current_stopword"]
+    if "awaiting_stopword_answer" in context_obj.user_data:
+        del context_obj.user_data["awaiting_stopword_answer"]
 
 async def test_timeout(update, context):
     """Handle the case when the test time expires"""
@@ -1829,7 +1807,7 @@ async def test_timeout(update, context):
         logger.info(f"Admin mode: Test {test_name} failed due to timeout")
     else:
         # Save test result to database
-        db.update_test_result(user_id, test_name, False)
+        await db.update_test_result(user_id, test_name, False)
         logger.info(f"User {user_id} failed test {test_name} due to timeout")
     
     # Determine which stages should be unlocked based on the test
@@ -1846,7 +1824,7 @@ async def test_timeout(update, context):
     
     # Unlock the next stage in regular mode
     if next_stage and not admin_mode:
-        db.unlock_stage(user_id, next_stage)
+        await db.unlock_stage(user_id, next_stage)
     
     # Show timeout message
     result_message = (
@@ -1879,13 +1857,9 @@ async def test_timeout(update, context):
         del context.user_data["timer_data"]
     
     # Stop timer if it exists
-    if "test_timer_job" in context.user_data:
-        try:
-            context.user_data["test_timer_job"].schedule_removal()
-            logger.info("Timer stopped due to test timeout")
-        except Exception as e:
-            logger.error(f"Error stopping timer due to timeout: {e}")
-        del context.user_data["test_timer_job"]
+    if "test_timer_key" in context.user_data:
+        timers.cancel(context.user_data.pop("test_timer_key"))
+        logger.info("Timer stopped due to test timeout")
     
     try:
         # Try to edit the last test message if possible
@@ -1929,7 +1903,7 @@ async def process_poem_task(update, context, text):
     
     # Используем ИИ для проверки стихотворения
     try:
-        result = await verify_poem_task(text)
+        result = await verify_poem_task(text, update.effective_user.id)
         is_valid = result["is_valid"]
         feedback = result["feedback"]
         
@@ -1941,10 +1915,10 @@ async def process_poem_task(update, context, text):
         
         if is_valid:
             # Обновляем результат теста в базе данных
-            db.update_test_result(user_id, "interview_prep_test", True)
+            await db.update_test_result(user_id, "interview_prep_test", True)
             
             # Разблокируем следующий этап если он был заблокирован
-            db.unlock_stage(user_id, "schedule_interview")
+            await db.unlock_stage(user_id, "schedule_interview")
             
             # Отправляем сообщение об успешном выполнении
             await update.message.reply_text(
@@ -3,7 +3,7 @@ import os
 import sys
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-import database as db
+import database_async as db
 from config import CandidateStates
 from utils.helpers import load_text_content
 from handlers.candidate_handlers import send_main_menu
@@ -17,7 +17,7 @@ logger = logging.getLogger(__name__)
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start the conversation and show the main menu."""
     user = update.effective_user
-    db.register_user(
+    await db.register_user(
         user.id,
         user.username,
         user.first_name,
@@ -0,0 +1,347 @@
+"""
+Версионированные миграции схемы базы данных.
+
+Каждая миграция применяется ровно один раз, ее номер записывается в таблицу
+{BOT_PREFIX}schema_migrations. Новые изменения схемы добавляются в конец списка
+MIGRATIONS с очередным номером; уже выпущенные миграции не редактируются.
+"""
+import json
+import os
+import sys
+
+from psycopg2.extras import execute_values
+
+# Добавляем текущую директорию в путь импорта
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import BOT_PREFIX
+
+def _create_base_tables(cursor):
+    """Create the original users/recruiters/submissions/interviews/messages tables"""
+    # IF NOT EXISTS оставлен, чтобы базы, созданные до появления миграций, проходили эту версию без ошибок
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {BOT_PREFIX}users (
+        user_id BIGINT PRIMARY KEY,
+        username TEXT,
+        first_name TEXT,
+        last_name TEXT,
+        unlocked_stages TEXT,
+        current_test_results TEXT,
+        registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {BOT_PREFIX}recruiters (
+        user_id BIGINT PRIMARY KEY,
+        username TEXT,
+        first_name TEXT,
+        last_name TEXT,
+        registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {BOT_PREFIX}test_submissions (
+        id SERIAL PRIMARY KEY,
+        user_id BIGINT,
+        test_type TEXT,
+        submission_data TEXT,
+        status TEXT DEFAULT 'pending',
+        feedback TEXT,
+        submission_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES {BOT_PREFIX}users(user_id)
+    )
+    ''')
+
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {BOT_PREFIX}interview_requests (
+        id SERIAL PRIMARY KEY,
+        user_id BIGINT,
+        preferred_day TEXT,
+        preferred_time TEXT,
+        status TEXT DEFAULT 'pending',
+        recruiter_response TEXT,
+        request_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES {BOT_PREFIX}users(user_id)
+    )
+    ''')
+
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {BOT_PREFIX}developer_messages (
+        id SERIAL PRIMARY KEY,
+        user_id BIGINT,
+        user_name TEXT,
+        message TEXT,
+        timestamp TIMESTAMP,
+        status TEXT DEFAULT 'unread',
+        FOREIGN KEY (user_id) REFERENCES {BOT_PREFIX}users(user_id)
+    )
+    ''')
+
+def _create_progress_tables(cursor):
+    """Create user_stages/user_test_results and move legacy JSON progress into them"""
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {BOT_PREFIX}user_stages (
+        user_id BIGINT REFERENCES {BOT_PREFIX}users(user_id) ON DELETE CASCADE,
+        stage TEXT,
+        unlocked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, stage)
+    )
+    ''')
+
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {BOT_PREFIX}user_test_results (
+        user_id BIGINT REFERENCES {BOT_PREFIX}users(user_id) ON DELETE CASCADE,
+        test_name TEXT,
+        passed BOOLEAN NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, test_name)
+    )
+    ''')
+
+    migrate_legacy_progress(cursor)
+
+def _create_lookup_indexes(cursor):
+    """Add indexes for the per-user lookups and the pending/unread queues"""
+    # get_test_result: WHERE user_id AND test_type ORDER BY submission_date DESC LIMIT 1
+    cursor.execute(f'''
+    CREATE INDEX IF NOT EXISTS {BOT_PREFIX}test_submissions_user_type_date_idx
+    ON {BOT_PREFIX}test_submissions (user_id, test_type, submission_date DESC)
+    ''')
+    # get_pending_submissions: очередь на проверку мала по сравнению со всей таблицей
+    cursor.execute(f'''
+    CREATE INDEX IF NOT EXISTS {BOT_PREFIX}test_submissions_pending_idx
+    ON {BOT_PREFIX}test_submissions (submission_date DESC)
+    WHERE status = 'pending'
+    ''')
+    # get_interview_status и save_interview_request: WHERE user_id ORDER BY request_date DESC
+    cursor.execute(f'''
+    CREATE INDEX IF NOT EXISTS {BOT_PREFIX}interview_requests_user_date_idx
+    ON {BOT_PREFIX}interview_requests (user_id, request_date DESC)
+    ''')
+    # get_pending_interview_requests
+    cursor.execute(f'''
+    CREATE INDEX IF NOT EXISTS {BOT_PREFIX}interview_requests_pending_idx
+    ON {BOT_PREFIX}interview_requests (request_date DESC)
+    WHERE status = 'pending'
+    ''')
+    # get_developer_messages
+    cursor.execute(f'''
+    CREATE INDEX IF NOT EXISTS {BOT_PREFIX}developer_messages_unread_idx
+    ON {BOT_PREFIX}developer_messages (timestamp DESC)
+    WHERE status = 'unread'
+    ''')
+    # Удаление пользователя (reset_db.py) проверяет внешний ключ developer_messages.user_id
+    cursor.execute(f'''
+    CREATE INDEX IF NOT EXISTS {BOT_PREFIX}developer_messages_user_idx
+    ON {BOT_PREFIX}developer_messages (user_id)
+    ''')
+
+def _create_media_cache(cursor):
+    """Create the table of Telegram file_ids for uploaded materials"""
+    # file_id действителен только для бота, который загрузил файл, поэтому ключ включает bot_id
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {BOT_PREFIX}media_cache (
+        bot_id BIGINT,
+        content_hash TEXT,
+        file_name TEXT,
+        file_id TEXT NOT NULL,
+        uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (bot_id, content_hash)
+    )
+    ''')
+
+def _create_snapshots(cursor):
+    """Create the table for last-good copies of data loaded from external services"""
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {BOT_PREFIX}snapshots (
+        name TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+def _create_stopword_sentences(cursor):
+    """Create the pool of pre-generated sentences for the stopwords test"""
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {BOT_PREFIX}stopword_sentences (
+        id SERIAL PRIMARY KEY,
+        stopword TEXT NOT NULL,
+        sentence TEXT NOT NULL,
+        served_count INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (stopword, sentence)
+    )
+    ''')
+    # Выдача берет наименее использованное предложение для стоп-слова
+    cursor.execute(f'''
+    CREATE INDEX IF NOT EXISTS {BOT_PREFIX}stopword_sentences_served_idx
+    ON {BOT_PREFIX}stopword_sentences (stopword, served_count)
+    ''')
+
+def _create_verification_cache(cursor):
+    """Create the persistent cache of AI verification results"""
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {BOT_PREFIX}ai_verification_cache (
+        cache_key TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        result TEXT NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    # Очистка удаляет записи, к которым давно не обращались
+    cursor.execute(f'''
+    CREATE INDEX IF NOT EXISTS {BOT_PREFIX}ai_verification_cache_last_used_idx
+    ON {BOT_PREFIX}ai_verification_cache (last_used_at)
+    ''')
+
+def _create_notification_deliveries(cursor):
+    """Create the outbox of notifications to candidates and recruiters"""
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {BOT_PREFIX}notification_deliveries (
+        id SERIAL PRIMARY KEY,
+        bot TEXT NOT NULL,
+        chat_id BIGINT NOT NULL,
+        kind TEXT NOT NULL,
+        ref_id INTEGER,
+        text TEXT NOT NULL,
+        parse_mode TEXT,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        sent_at TIMESTAMP
+    )
+    ''')
+    # Повторная отправка выбирает неотправленные уведомления, срок которых подошел
+    cursor.execute(f'''
+    CREATE INDEX IF NOT EXISTS {BOT_PREFIX}notification_deliveries_pending_idx
+    ON {BOT_PREFIX}notification_deliveries (next_attempt_at) WHERE status = 'pending'
+    ''')
+
+def _create_bot_persistence(cursor):
+    """Create the tables for persisted user_data and conversation states of the bots"""
+    # user_data и состояния диалогов приложений PTB (utils/persistence.py), namespace - имя бота
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {BOT_PREFIX}persisted_user_data (
+        namespace TEXT NOT NULL,
+        user_id BIGINT NOT NULL,
+        data JSONB NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (namespace, user_id)
+    )
+    ''')
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {BOT_PREFIX}persisted_conversations (
+        namespace TEXT NOT NULL,
+        name TEXT NOT NULL,
+        key TEXT NOT NULL,
+        state JSONB NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (namespace, name, key)
+    )
+    ''')
+
+# (версия, описание, функция) - порядок и номера менять нельзя
+MIGRATIONS = [
+    (1, 'base tables', _create_base_tables),
+    (2, 'user progress tables', _create_progress_tables),
+    (3, 'lookup and queue indexes', _create_lookup_indexes),
+    (4, 'media file_id cache', _create_media_cache),
+    (5, 'external data snapshots', _create_snapshots),
+    (6, 'stopword sentence pool', _create_stopword_sentences),
+    (7, 'AI verification cache', _create_verification_cache),
+    (8, 'notification deliveries', _create_notification_deliveries),
+    (9, 'bot persistence', _create_bot_persistence),
+]
+
+def _load_legacy_json(value, default):
+    """Parse a legacy JSON-in-TEXT progress column, tolerating broken values"""
+    if not value:
+        return default
+    try:
+        data = json.loads(value)
+    except json.JSONDecodeError:
+        return default
+    return data if isinstance(data, type(default)) else default
+
+def migrate_legacy_progress(cursor):
+    """Move unlocked_stages/current_test_results JSON from users rows into the progress tables"""
+    cursor.execute(f'''
+        SELECT user_id, unlocked_stages, current_test_results
+        FROM {BOT_PREFIX}users
+        WHERE unlocked_stages IS NOT NULL OR current_test_results IS NOT NULL
+        FOR UPDATE
+    ''')
+    rows = cursor.fetchall()
+    if not rows:
+        return
+
+    stage_rows = []
+    result_rows = []
+    for user_id, unlocked_stages, current_test_results in rows:
+        for stage in _load_legacy_json(unlocked_stages, []):
+            stage_rows.append((user_id, stage))
+        for test_name, passed in _load_legacy_json(current_test_results, {}).items():
+            result_rows.append((user_id, test_name, bool(passed)))
+
+    if stage_rows:
+        execute_values(
+            cursor,
+            f'INSERT INTO {BOT_PREFIX}user_stages (user_id, stage) VALUES %s ON CONFLICT DO NOTHING',
+            stage_rows
+        )
+    if result_rows:
+        execute_values(
+            cursor,
+            f'INSERT INTO {BOT_PREFIX}user_test_results (user_id, test_name, passed) VALUES %s ON CONFLICT DO NOTHING',
+            result_rows
+        )
+
+    # Старые колонки больше не читаются, очищаем их, чтобы перенос выполнялся один раз
+    cursor.execute(
+        f'UPDATE {BOT_PREFIX}users SET unlocked_stages = NULL, current_test_results = NULL WHERE user_id = ANY(%s)',
+        ([row[0] for row in rows],)
+    )
+    print(f"Migrated progress of {len(rows)} users to {BOT_PREFIX}user_stages/{BOT_PREFIX}user_test_results")
+
+def applied_versions(cursor):
+    """Return the set of migration versions already recorded in the database"""
+    cursor.execute(f'SELECT version FROM {BOT_PREFIX}schema_migrations')
+    return {row[0] for row in cursor.fetchall()}
+
+def apply_migrations(conn):
+    """Apply all pending migrations in a single transaction"""
+    cursor = conn.cursor()
+
+    # Оба бота вызывают init_db при старте; блокировка на время транзакции
+    # гарантирует, что миграции применяет только один процесс
+    cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', (f'{BOT_PREFIX}schema_migrations',))
+
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {BOT_PREFIX}schema_migrations (
+        version INTEGER PRIMARY KEY,
+        description TEXT,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    done = applied_versions(cursor)
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version in done:
+            continue
+        migrate(cursor)
+        cursor.execute(
+            f'INSERT INTO {BOT_PREFIX}schema_migrations (version, description) VALUES (%s, %s)',
+            (version, description)
+        )
+        applied.append(version)
+        print(f"Applying migration {version}: {description}")
+
+    conn.commit()
+    return applied
@@ -8,8 +8,12 @@ from telegram.ext import Application, CommandHandler, CallbackQueryHandler, Mess
 # Добавляем текущую директорию в путь импорта
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-import database as db
+import database
+import database_async as db
 from config_fix import RecruiterStates, RECRUITER_BOT_TOKEN
+from utils import notifier
+from utils.persistence import PostgresPersistence
+from utils.rate_limiter import OutboundRateLimiter
 
 # Enable logging
 logging.basicConfig(
@@ -19,7 +23,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Initialize database
-db.init_db()
+database.init_db()
 
 # Helper functions
 async def send_main_menu(update, context, edit=False):
@@ -54,7 +58,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     # Register user as a recruiter
-    db.register_recruiter(
+    await db.register_recruiter(
         user_id, 
         update.effective_user.username,
         update.effective_user.first_name,
@@ -73,7 +77,7 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if query.data == "view_metrics":
         # Get metrics from database
-        metrics = db.get_metrics()
+        metrics = await db.get_metrics()
         
         # Format metrics into a readable message
         message = "📊 **Метрики процесса найма:**\n\n"
@@ -167,7 +171,7 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     elif query.data == "interview_requests":
         # Get pending interview requests
-        requests = db.get_pending_interview_requests()
+        requests = await db.get_pending_interview_requests()
         
         if not requests:
             # Если нет запросов, редактируем текущее сообщение
@@ -249,7 +253,7 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data["current_submission_id"] = submission_id
         
         # Get submission details from database
-        submissions = db.get_pending_submissions()
+        submissions = await db.get_pending_submissions()
         submission = next((s for s in submissions if s["id"] == submission_id), None)
         
         if not submission:
@@ -298,14 +302,14 @@ async def handle_submission_feedback(update: Update, context: ContextTypes.DEFAU
         return await send_main_menu(update, context, edit=True)
     
     # Update submission status in database
-    result = db.update_test_submission(submission_id, status, feedback)
+    # The candidate's notification is written to the outbox in the same transaction
+    result = await db.update_test_submission(
+        submission_id, status, feedback, notifier.test_feedback_notification(status, feedback)
+    )
     
     if result:
-        # Import the function from candidate_bot to send notification
-        from candidate_bot import handle_test_feedback
-        
         # Send notification to candidate
-        await handle_test_feedback(result["user_id"], submission_id, status, feedback)
+        notifier.kick()
         
         await update.message.reply_text(
             f"Обратная связь отправлена кандидату. Статус заявки: {status}."
@@ -327,14 +331,13 @@ async def handle_interview_response(update: Update, context: ContextTypes.DEFAUL
         return await send_main_menu(update, context, edit=True)
     
     # Update request status in database
-    result = db.update_interview_request(request_id, status, response)
+    result = await db.update_interview_request(
+        request_id, status, response, notifier.interview_response_notification(status, response)
+    )
     
     if result:
-        # Import the function from candidate_bot to send notification
-        from candidate_bot import handle_interview_response
-        
         # Send notification to candidate
-        await handle_interview_response(result["user_id"], request_id, status, response)
+        notifier.kick()
         
         await update.message.reply_text(
             f"Ответ отправлен кандидату. Статус запроса: {status}."
@@ -381,10 +384,32 @@ async def unknown_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return RecruiterStates.MAIN_MENU
 
+async def post_init(application):
+    """Register the application's bot for notifications and start the outbox dispatcher"""
+    notifier.register(notifier.RECRUITER, application.bot)
+    application.job_queue.run_repeating(
+        notifier.dispatch_job, interval=notifier.NOTIFY_DISPATCH_INTERVAL, first=1
+    )
+
+async def post_shutdown(application):
+    """Close long-lived clients and database connections when the application stops"""
+    await notifier.close()
+    await db.close()
+
 def main():
     """Start the bot."""
+    database.start_progress_listener()
+    
     # Create the Application
-    application = Application.builder().token(RECRUITER_BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(RECRUITER_BOT_TOKEN)
+        .rate_limiter(OutboundRateLimiter())
+        .persistence(PostgresPersistence("recruiter"))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
     # Добавляем ConversationHandler (должен иметь приоритет)
     conv_handler = ConversationHandler(
@@ -410,6 +435,9 @@ def main():
             MessageHandler(filters.COMMAND, unknown_command),
             MessageHandler(filters.ALL, unknown_message),
         ],
+        # Шаг диалога сохраняется в базе и переживает перезапуск бота
+        name="recruiter_conversation",
+        persistent=True,
     )
     
     # Добавляем ConversationHandler (должен иметь приоритет)
@@ -0,0 +1,23 @@
+"""
+Общие настройки тестов.
+
+Модули бота лежат в корне репозитория, поэтому корень добавляется в путь
+импорта. config требует токены и параметры базы при импорте - для тестов
+подставляются фиктивные значения (настоящие переменные окружения не
+перезаписываются); к базе тесты не подключаются.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for name, value in {
+    "CANDIDATE_BOT_TOKEN": "test-candidate-token",
+    "RECRUITER_BOT_TOKEN": "test-recruiter-token",
+    "HOST": "localhost",
+    "PORT": "5432",
+    "DATABASE": "test",
+    "DB_USER": "test",
+    "DB_PASSWORD": "test",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from utils import ai_queue
+
+@pytest.fixture(autouse=True)
+def empty_queue(monkeypatch):
+    monkeypatch.setattr(ai_queue, "AI_MAX_IN_FLIGHT", 1)
+    monkeypatch.setattr(ai_queue, "AI_BACKGROUND_MAX_IN_FLIGHT", 1)
+    for priority in ai_queue.PRIORITY_NAMES:
+        ai_queue._waiting[priority].clear()
+        ai_queue._in_flight[priority] = 0
+    yield
+    for priority in ai_queue.PRIORITY_NAMES:
+        assert not ai_queue._waiting[priority]
+        assert ai_queue._in_flight[priority] == 0
+
+async def _run_in_order(requests):
+    """Queue the requests behind a held slot, release it and return the order slots were granted in"""
+    order = []
+
+    async def request(name, priority, user_id):
+        async with ai_queue.slot(priority, user_id):
+            order.append(name)
+
+    await ai_queue._acquire(ai_queue.GRADING, "holder")
+    tasks = [asyncio.create_task(request(*args)) for args in requests]
+    await asyncio.sleep(0)
+    ai_queue._release(ai_queue.GRADING)
+    await asyncio.gather(*tasks)
+    return order
+
+def test_higher_priority_is_served_first():
+    order = asyncio.run(_run_in_order([
+        ("background", ai_queue.BACKGROUND, None),
+        ("interactive", ai_queue.INTERACTIVE, 1),
+        ("grading", ai_queue.GRADING, 2),
+    ]))
+    assert order == ["grading", "interactive", "background"]
+
+def test_users_are_served_in_turn():
+    order = asyncio.run(_run_in_order([
+        ("a1", ai_queue.GRADING, "a"),
+        ("a2", ai_queue.GRADING, "a"),
+        ("a3", ai_queue.GRADING, "a"),
+        ("b1", ai_queue.GRADING, "b"),
+        ("c1", ai_queue.GRADING, "c"),
+    ]))
+    assert order == ["a1", "b1", "c1", "a2", "a3"]
+
+def test_batch_takes_the_turn_of_every_user_in_it():
+    order = asyncio.run(_run_in_order([
+        ("batch", ai_queue.GRADING, ("a", "b")),
+        ("a1", ai_queue.GRADING, "a"),
+        ("b1", ai_queue.GRADING, "b"),
+        ("c1", ai_queue.GRADING, "c"),
+    ]))
+    assert order == ["batch", "c1", "a1", "b1"]
+
+def test_background_requests_leave_slots_for_candidates(monkeypatch):
+    monkeypatch.setattr(ai_queue, "AI_MAX_IN_FLIGHT", 3)
+
+    async def scenario():
+        await ai_queue._acquire(ai_queue.BACKGROUND, None)
+        waiter = asyncio.create_task(ai_queue._acquire(ai_queue.BACKGROUND, None))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        # Обычный запрос не ждет за фоновыми
+        await asyncio.wait_for(ai_queue._acquire(ai_queue.INTERACTIVE, 1), timeout=1)
+        ai_queue._release(ai_queue.INTERACTIVE)
+        ai_queue._release(ai_queue.BACKGROUND)
+        await asyncio.wait_for(waiter, timeout=1)
+        ai_queue._release(ai_queue.BACKGROUND)
+
+    asyncio.run(scenario())
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        await ai_queue._acquire(ai_queue.GRADING, 1)
+        waiter = asyncio.create_task(ai_queue._acquire(ai_queue.GRADING, 2))
+        await asyncio.sleep(0)
+        assert ai_queue._depth(ai_queue.GRADING) == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert ai_queue._depth(ai_queue.GRADING) == 0
+        ai_queue._release(ai_queue.GRADING)
+
+    asyncio.run(scenario())
+
+def test_slot_granted_to_cancelled_waiter_is_released():
+    async def scenario():
+        await ai_queue._acquire(ai_queue.GRADING, 1)
+        waiter = asyncio.create_task(ai_queue._acquire(ai_queue.GRADING, 2))
+        await asyncio.sleep(0)
+        # Слот передан ждущей задаче, но она отменена раньше, чем успела продолжиться
+        ai_queue._release(ai_queue.GRADING)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert ai_queue._total_in_flight() == 0
+        await asyncio.wait_for(ai_queue._acquire(ai_queue.GRADING, 3), timeout=1)
+        ai_queue._release(ai_queue.GRADING)
+
+    asyncio.run(scenario())
@@ -0,0 +1,78 @@
+import json
+import os
+
+import pytest
+
+from utils import ai_responses
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "ai_responses.jsonl")
+
+with open(CORPUS_PATH, encoding="utf-8") as corpus_file:
+    CORPUS = [json.loads(line) for line in corpus_file if line.strip()]
+
+# Номера строк корпуса (с 1) с ответами, которые не соответствуют схеме
+MALFORMED_LINES = {7, 8, 11, 19, 21}
+
+@pytest.mark.parametrize("line", range(1, len(CORPUS) + 1))
+def test_corpus_response(line):
+    entry = CORPUS[line - 1]
+    value, ok = ai_responses.parse(entry["endpoint"], entry["body"])
+    assert ok == (line not in MALFORMED_LINES)
+    if not ok:
+        return
+
+    response_type = ai_responses.SCHEMAS[entry["endpoint"]]["type"]
+    verdicts = {ai_responses.VERDICT: [value], ai_responses.VERDICTS: value}.get(response_type)
+    if verdicts is not None:
+        assert verdicts
+        for verdict in verdicts:
+            assert isinstance(verdict["passed"], bool)
+            assert isinstance(verdict["feedback"], str) and "\\u" not in verdict["feedback"]
+            assert isinstance(verdict["better_example"], str) and "\\u" not in verdict["better_example"]
+    else:
+        assert isinstance(value, str) and value
+        assert "\\u" not in value
+
+def test_verdict_inside_markdown_and_prose():
+    body = json.dumps({"output": 'Вот оценка:\n```json\n{"passed": "true", "feedback": "Хорошо"}\n```'})
+    assert ai_responses.parse("stopword_verify", body) == (
+        {"passed": True, "feedback": "Хорошо", "better_example": ""}, True
+    )
+
+def test_verdict_without_envelope():
+    value, ok = ai_responses.parse("poem_verify", '{"passed": false, "feedback": "Нет рифмы"}')
+    assert ok and value["passed"] is False and value["feedback"] == "Нет рифмы"
+
+def test_double_escaped_unicode_is_decoded():
+    inner = json.dumps({"passed": False, "feedback": "\\u041e\\u0448\\u0438\\u0431\\u043a\\u0430"})
+    value, ok = ai_responses.parse("stopword_verify", json.dumps({"output": inner}))
+    assert ok and value["feedback"] == "Ошибка"
+
+def test_generated_sentence_is_unquoted():
+    value, ok = ai_responses.parse("stopword_generate", json.dumps({"output": '"Это очень важно."'}))
+    assert (value, ok) == ("Это очень важно.", True)
+
+def test_plain_text_translation():
+    assert ai_responses.parse("chatgpt_translate", "Привет, мир") == ("Привет, мир", True)
+
+@pytest.mark.parametrize("endpoint", ["stopword_verify", "stopword_verify_batch", "openai_chat_completions"])
+@pytest.mark.parametrize("body", ["", "Internal Server Error", '{"output": "не JSON"}', "[1, 2]"])
+def test_garbage_is_not_ok(endpoint, body):
+    value, ok = ai_responses.parse(endpoint, body)
+    assert ok is False
+
+def test_batch_verdicts_keep_ids():
+    items = [{"id": 0, "passed": True, "feedback": "a"}, {"id": 2, "passed": False, "feedback": "b"}, {"id": 3}]
+    for body in (
+        json.dumps({"output": json.dumps(items)}),
+        json.dumps({"output": {"results": items}}),
+        "Результаты: " + json.dumps(items),
+    ):
+        value, ok = ai_responses.parse("stopword_verify_batch", body)
+        assert ok
+        assert [(verdict["id"], verdict["passed"]) for verdict in value] == [(0, True), (2, False)]
+
+def test_parse_results_are_counted():
+    before = ai_responses.parse_results.value("failed:stopword_verify")
+    ai_responses.parse("stopword_verify", "garbage")
+    assert ai_responses.parse_results.value("failed:stopword_verify") == before + 1
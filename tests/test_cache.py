@@ -0,0 +1,79 @@
+from utils import cache
+from utils.cache import TTLCache
+
+def test_get_returns_stored_value_and_counts_hits():
+    c = TTLCache(maxsize=10, ttl=60)
+    c.set("a", 1)
+    assert c.get("a") == 1
+    assert c.get("b", "default") == "default"
+    assert (c.hits, c.misses) == (1, 1)
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    c = TTLCache(maxsize=10, ttl=5)
+    c.set("a", 1)
+    now[0] += 4
+    assert c.get("a") == 1
+    now[0] += 2
+    assert c.get("a") is None
+    assert len(c) == 0
+
+def test_least_recently_used_entry_is_evicted():
+    c = TTLCache(maxsize=2, ttl=60)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert c.get("a") == 1 and c.get("c") == 3
+
+def test_set_with_version_taken_before_invalidate_is_rejected():
+    c = TTLCache(maxsize=10, ttl=60)
+    version = c.version("a")
+    c.invalidate("a")
+    assert c.set("a", "stale", version) is False
+    assert c.get("a") is None
+
+    version = c.version("a")
+    assert c.set("a", "fresh", version) is True
+    assert c.get("a") == "fresh"
+
+def test_invalidating_other_keys_does_not_reject_a_load():
+    c = TTLCache(maxsize=10, ttl=60)
+    version = c.version("a")
+    c.invalidate("b")
+    assert c.set("a", 1, version) is True
+
+def test_versions_are_bounded_by_maxsize():
+    c = TTLCache(maxsize=3, ttl=60)
+    for key in range(100):
+        c.invalidate(key)
+    assert len(c._versions) == 3
+
+def test_stale_load_is_rejected_after_its_version_record_is_evicted():
+    # Версия ключа не должна вернуться к значению, взятому до инвалидации (ABA)
+    c = TTLCache(maxsize=2, ttl=60)
+    version = c.version("a")
+    c.invalidate("a")
+    c.invalidate("b")
+    c.invalidate("c")
+    assert "a" not in c._versions
+    assert c.set("a", "stale", version) is False
+
+def test_stale_load_is_rejected_after_entry_eviction():
+    c = TTLCache(maxsize=1, ttl=60)
+    c.set("a", 1)
+    version = c.version("a")
+    c.invalidate("a")
+    c.set("b", 2)
+    assert c.set("a", "stale", version) is False
+
+def test_clear_rejects_loads_started_before_it():
+    c = TTLCache(maxsize=10, ttl=60)
+    c.set("a", 1)
+    version = c.version("b")
+    c.clear()
+    assert c.get("a") is None
+    assert c.set("b", "stale", version) is False
+    assert c.set("b", "fresh", c.version("b")) is True
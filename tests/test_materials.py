@@ -0,0 +1,38 @@
+import json
+import os
+
+import pytest
+
+from utils import materials
+
+@pytest.fixture
+def materials_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(materials, "MATERIALS_DIR", tmp_path)
+    monkeypatch.setattr(materials, "_snapshot", None)
+    return tmp_path
+
+def _write(path, content, mtime):
+    path.write_text(content, encoding="utf-8")
+    os.utime(path, ns=(mtime, mtime))
+
+def test_test_is_normalized_and_shared_between_calls(materials_dir):
+    _write(materials_dir / "test.json", json.dumps([{"question": "2+2?", "answers": ["3", "4"], "correct_index": 1}]), 10**9)
+    test = materials.get_test("test.json")
+    assert test == {"questions": [{"question": "2+2?", "options": ["3", "4"], "correct_answer": 1}], "time_limit": None}
+    assert materials.get_test("test.json") is test
+    assert materials.get_test("missing.json") is None
+
+def test_changed_file_replaces_snapshot(materials_dir):
+    _write(materials_dir / "intro.txt", "old", 10**9)
+    assert materials.get_text("intro.txt") == "old"
+    assert materials.reload() is False
+    _write(materials_dir / "intro.txt", "new text", 2 * 10**9)
+    assert materials.reload() is True
+    assert materials.get_text("intro.txt") == "new text"
+
+def test_broken_file_keeps_previous_version(materials_dir):
+    _write(materials_dir / "test.json", json.dumps({"questions": [], "time_limit": 60}), 10**9)
+    previous = materials.get_test("test.json")
+    _write(materials_dir / "test.json", "{\"questions\": [", 2 * 10**9)
+    materials.reload()
+    assert materials.get_test("test.json") is previous
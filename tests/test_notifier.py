@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("telegram")
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+
+from telegram.error import BadRequest
+from telegram.helpers import escape_markdown
+
+from utils import notifier
+
+@pytest.mark.parametrize("version, parse_mode", [(1, "Markdown"), (2, "MarkdownV2")])
+@pytest.mark.parametrize("text", ["snake_case *bold* [link](url)", "C:\\path\\_file", "1.5 + (2-1) = 2.5!", "plain"])
+def test_plain_text_undoes_escape_markdown(text, version, parse_mode):
+    assert notifier._plain_text(escape_markdown(text, version=version), parse_mode) == text
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None, rate_limit_args=None):
+        self.sent.append((text, parse_mode))
+        if parse_mode is not None:
+            raise BadRequest("Can't parse entities: can't find end of the entity starting at byte offset 42")
+
+def test_broken_markup_is_sent_as_unescaped_plain_text():
+    notification = notifier.test_feedback_notification("approved", "Проверьте поле user_name и *шаг 2")
+    delivery = {"id": 1, "chat_id": 10, **notification}
+    bot = FakeBot()
+
+    asyncio.run(notifier._send(bot, delivery))
+
+    assert len(bot.sent) == 2
+    text, parse_mode = bot.sent[1]
+    assert parse_mode is None
+    assert "Проверьте поле user_name и *шаг 2" in text
+    assert "\\" not in text
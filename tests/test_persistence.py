@@ -0,0 +1,141 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("telegram")
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+
+from config import RecruiterStates
+from utils import persistence
+from utils.persistence import PostgresPersistence, _decode_state, _dump_user_data, _encode_state
+
+class FakeStorage:
+    """Stands in for the database_async persistence functions"""
+
+    def __init__(self, user_data=None, conversations=None):
+        self.user_data = user_data or {}
+        self.conversations = conversations or []
+        self.user_writes = []
+        self.conversation_writes = []
+        self.failures = 0
+
+    async def load_persisted_user_data(self, namespace):
+        return self.user_data
+
+    async def load_persisted_conversations(self, namespace, name):
+        return self.conversations
+
+    async def save_persisted_user_data(self, namespace, changes):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database is down")
+        self.user_writes.append(dict(changes))
+
+    async def save_persisted_conversations(self, namespace, changes):
+        self.conversation_writes.append(changes)
+
+@pytest.fixture
+def storage(monkeypatch):
+    storage = FakeStorage()
+    for name in ("load_persisted_user_data", "load_persisted_conversations",
+                 "save_persisted_user_data", "save_persisted_conversations"):
+        monkeypatch.setattr(persistence.db, name, getattr(storage, name))
+    return storage
+
+def test_dump_user_data_skips_transient_and_non_json_values():
+    text = _dump_user_data({
+        "test_name": "stopwords",
+        "answers": [1, 2],
+        "processing_answer": True,
+        "current_question_keyboard": object(),
+        "started": object(),
+    })
+    assert json.loads(text) == {"answers": [1, 2], "test_name": "stopwords"}
+
+def test_dump_user_data_keeps_dicts_with_mixed_key_types():
+    text = _dump_user_data({"answers": {1: "a", "2": "b", 3: {True: None}}})
+    assert json.loads(text) == {"answers": {"1": "a", "2": "b", "3": {"true": None}}}
+
+def test_skipped_values_are_logged(caplog):
+    with caplog.at_level("WARNING", logger=persistence.__name__):
+        _dump_user_data({"unserializable_test_value": {1, 2}})
+        _dump_user_data({"unserializable_test_value": {1, 2}})
+    messages = [record.getMessage() for record in caplog.records]
+    assert len(messages) == 1 and "unserializable_test_value" in messages[0]
+
+def test_dump_user_data_is_stable_across_key_order():
+    assert _dump_user_data({"b": {"y": 1, "x": 2}, "a": 1}) == _dump_user_data({"a": 1, "b": {"x": 2, "y": 1}})
+
+@pytest.mark.parametrize("state", [RecruiterStates.LOGIN, RecruiterStates.MAIN_MENU, 3, "waiting", None])
+def test_state_round_trip(state):
+    assert _decode_state(json.loads(json.dumps(_encode_state(state)))) == state
+
+def test_changes_are_buffered_and_written_once(storage):
+    async def scenario():
+        store = PostgresPersistence("candidate", flush_interval=0.05, flush_changes=100)
+        await store.update_user_data(1, {"step": 1})
+        await store.update_user_data(1, {"step": 2})
+        await store.update_user_data(2, {"step": 1})
+        await store.update_conversation("recruiter_conversation", (10, 10), RecruiterStates.LOGIN)
+        assert storage.user_writes == []
+        await asyncio.sleep(0.1)
+        # Неизмененные данные повторно не пишутся
+        await store.update_user_data(1, {"step": 2})
+        await store.update_conversation("recruiter_conversation", (10, 10), RecruiterStates.LOGIN)
+        await store.flush()
+
+    asyncio.run(scenario())
+    assert storage.user_writes == [{1: '{"step": 2}', 2: '{"step": 1}'}]
+    assert len(storage.conversation_writes) == 1
+    [(name, key, state)] = storage.conversation_writes[0]
+    assert (name, json.loads(key)) == ("recruiter_conversation", [10, 10])
+    assert _decode_state(json.loads(state)) is RecruiterStates.LOGIN
+
+def test_many_changes_are_written_without_waiting(storage):
+    async def scenario():
+        store = PostgresPersistence("candidate", flush_interval=60, flush_changes=3)
+        for user_id in range(3):
+            await store.update_user_data(user_id, {"step": user_id})
+        await asyncio.sleep(0.01)
+        assert len(storage.user_writes) == 1
+        await store.flush()
+
+    asyncio.run(scenario())
+
+def test_failed_write_is_retried_with_newer_changes(storage):
+    storage.failures = 1
+
+    async def scenario():
+        store = PostgresPersistence("candidate", flush_interval=0.05, flush_changes=100)
+        await store.update_user_data(1, {"step": 1})
+        await store.update_user_data(2, {"step": 1})
+        await store.flush()
+        assert storage.user_writes == []
+        await store.update_user_data(1, {"step": 2})
+        await store.drop_user_data(2)
+        await store.flush()
+
+    asyncio.run(scenario())
+    assert storage.user_writes == [{1: '{"step": 2}', 2: None}]
+
+def test_loaded_state_is_not_written_back(storage):
+    storage.user_data = {1: {"step": 1}}
+    storage.conversations = [
+        ("[10, 10]", {"enum": "config:RecruiterStates", "name": "LOGIN"}),
+        ("[11, 11]", {"enum": "config:RecruiterStates", "name": "REMOVED"}),
+    ]
+
+    async def scenario():
+        store = PostgresPersistence("recruiter", flush_interval=0.05, flush_changes=100)
+        assert await store.get_user_data() == {1: {"step": 1}}
+        conversations = await store.get_conversations("recruiter_conversation")
+        assert conversations == {(10, 10): RecruiterStates.LOGIN}
+        await store.update_user_data(1, {"step": 1})
+        await store.update_conversation("recruiter_conversation", (10, 10), RecruiterStates.LOGIN)
+        await store.flush()
+
+    asyncio.run(scenario())
+    assert storage.user_writes == []
+    assert storage.conversation_writes == []
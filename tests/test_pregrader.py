@@ -0,0 +1,86 @@
+import pytest
+
+from utils import pregrader
+
+def test_tokenize_lowercases_and_replaces_yo():
+    assert pregrader.tokenize("Всё, ЕЩЁ раз - кое-как!") == ["все", "еще", "раз", "кое-как"]
+    assert pregrader.tokenize(None) == []
+
+@pytest.mark.parametrize("text, stopword", [
+    ("Это очень важно", "очень"),
+    ("ОЧЕНЬ важно", "Очень"),
+    ("Наверное, он прав", "Вероятно/наверное"),
+    ("Я сделаю, и точка", "Все/точка"),
+    ("Он, в общем-то, прав", "в общем-то"),
+    ("Всё будет готово", "все"),
+])
+def test_contains_stopword(text, stopword):
+    assert pregrader.contains_stopword(text, stopword)
+
+@pytest.mark.parametrize("text, stopword", [
+    ("Это важно", "очень"),
+    ("Нет, так нельзя", "не"),
+    ("Каких результатов ждать", "как"),
+    ("Точность важна", "Все/точка"),
+    ("Это конечный результат работы", "конечно"),
+    ("Это простой вопрос", "просто"),
+])
+def test_does_not_contain_stopword(text, stopword):
+    assert not pregrader.contains_stopword(text, stopword)
+
+@pytest.fixture
+def without_morphology(monkeypatch):
+    monkeypatch.setattr(pregrader, "pymorphy3", None)
+    monkeypatch.setattr(pregrader, "_morph", None)
+
+@pytest.mark.usefixtures("without_morphology")
+@pytest.mark.parametrize("text, stopword", [
+    ("Это конечный результат работы", "конечно"),
+    ("Это простой вопрос", "просто"),
+])
+def test_does_not_contain_stopword_without_morphology(text, stopword):
+    assert not pregrader.contains_stopword(text, stopword)
+
+def test_word_forms_are_left_to_ai_without_morphology(without_morphology):
+    assert pregrader.contains_stopword("Я сделаю, и точка", "Все/точка")
+    assert not pregrader.contains_stopword("Я сделаю это завтра", "сделать")
+
+@pytest.mark.parametrize("text, stopword", [
+    ("Я сделаю это завтра", "сделать"),
+    ("Поставим точкой", "точка"),
+    ("Красивого дома нет", "красивый"),
+])
+def test_word_forms_with_morphology(text, stopword):
+    pytest.importorskip("pymorphy3")
+    assert pregrader.contains_stopword(text, stopword)
+
+def test_is_category():
+    assert pregrader.is_category("Прилагательные")
+    assert pregrader.is_category("Вводные  слова")
+    assert not pregrader.is_category("очень")
+
+def test_grade_rejects_answer_identical_to_original():
+    passed, feedback = pregrader.grade("Это очень важно.", "это очень важно", {"word": "Очень"})
+    assert passed is False
+    assert "совпадает" in feedback
+
+def test_grade_rejects_answer_with_stopword():
+    passed, feedback = pregrader.grade("Я сделаю это, и все.", "Я сделаю и точка", {"word": "Все/точка"})
+    assert passed is False
+    assert "все/точка" in feedback
+
+def test_grade_leaves_other_answers_to_ai():
+    assert pregrader.grade("Это очень важно.", "Это крайне важно.", {"word": "очень"}) is None
+
+def test_grade_leaves_categories_to_ai():
+    assert pregrader.grade("Красивый дом.", "Дом стоит.", {"word": "Прилагательные"}) is None
+    assert pregrader.grade("Красивый дом.", "Прилагательные тут.", {"word": "Прилагательные"}) is None
+
+def test_decisions_are_counted():
+    before_ai = pregrader.decisions.value("ai")
+    before_local = pregrader.decisions.value("local:contains_stopword")
+    pregrader.grade("Это очень важно.", "Это крайне важно.", {"word": "очень"})
+    pregrader.grade("Это очень важно.", "Очень важно.", {"word": "очень"})
+    assert pregrader.decisions.value("ai") == before_ai + 1
+    assert pregrader.decisions.value("local:contains_stopword") == before_local + 1
+    assert 0 < pregrader.avoided_fraction() < 1
@@ -0,0 +1,65 @@
+import contextlib
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+
+import database
+
+class FakeCursor:
+    def __init__(self, row, on_fetch=None):
+        self.row = row
+        self.on_fetch = on_fetch
+        self.queries = 0
+
+    def execute(self, query, params=None):
+        self.queries += 1
+
+    def fetchone(self):
+        if self.on_fetch is not None:
+            self.on_fetch()
+        return self.row
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    database._progress_cache.clear()
+
+    def install(row, on_fetch=None):
+        cursor = FakeCursor(row, on_fetch)
+        monkeypatch.setattr(database, "get_connection", lambda: contextlib.nullcontext(FakeConnection(cursor)))
+        return cursor
+
+    yield install
+    database._progress_cache.clear()
+
+def test_progress_is_loaded_once_and_served_from_cache(fake_db):
+    cursor = fake_db((["stage1", "stage2"], {"test1": True}))
+    assert database.get_user_unlocked_stages(1) == ["stage1", "stage2"]
+    assert database.get_user_test_results(1) == {"test1": True}
+    assert cursor.queries == 1
+
+def test_callers_cannot_modify_cached_progress(fake_db):
+    fake_db((["stage1"], {"test1": True}))
+    database.get_user_unlocked_stages(1).append("stage2")
+    database.get_user_test_results(1)["test2"] = False
+    assert database.get_user_unlocked_stages(1) == ["stage1"]
+    assert database.get_user_test_results(1) == {"test1": True}
+
+def test_invalidation_during_load_prevents_caching_stale_progress(fake_db):
+    # Прогресс изменился, пока шел запрос: прочитанные данные уже устарели
+    cursor = fake_db(([], {}), on_fetch=lambda: database._progress_cache.invalidate(1))
+    assert database.get_user_unlocked_stages(1) == []
+    assert database._progress_cache.get(1) is None
+
+    cursor.on_fetch = None
+    database.get_user_unlocked_stages(1)
+    database.get_user_unlocked_stages(1)
+    assert cursor.queries == 2
@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("telegram")
+
+from telegram.error import RetryAfter
+
+from utils import rate_limiter
+from utils.rate_limiter import TokenBucket, OutboundRateLimiter
+
+def test_token_bucket_allows_burst_then_refills_at_rate():
+    bucket = TokenBucket(rate=2, capacity=3)
+    for _ in range(3):
+        assert bucket.delay(0) == 0
+        bucket.take(0)
+    assert bucket.delay(0) == pytest.approx(0.5)
+    assert bucket.delay(0.25) == pytest.approx(0.25)
+    assert bucket.delay(0.5) == 0
+    assert not bucket.is_idle(0.5)
+    assert bucket.is_idle(1.5)
+
+def test_token_bucket_pause_overrides_tokens():
+    bucket = TokenBucket(rate=2, capacity=3)
+    bucket.paused_until = 10
+    assert bucket.delay(4) == pytest.approx(6)
+    assert not bucket.is_idle(4)
+    assert bucket.delay(10) == 0
+
+@pytest.fixture
+def limiter(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "TELEGRAM_CHAT_RATE", 20)
+    monkeypatch.setattr(rate_limiter, "TELEGRAM_CHAT_BURST", 1)
+    return OutboundRateLimiter()
+
+def _request(limiter, sent, endpoint, data, priority=rate_limiter.ANSWER, result=True):
+    async def callback():
+        sent.append((endpoint, data.get("text")))
+        return result
+    return limiter.process_request(callback, (), {}, endpoint, data, {"priority": priority})
+
+def test_superseded_edit_is_not_sent(limiter):
+    sent = []
+
+    async def scenario():
+        edits = [
+            _request(limiter, sent, "editMessageText", {"chat_id": 1, "message_id": 5, "text": text})
+            for text in ("10", "9", "8")
+        ]
+        return await asyncio.gather(*edits)
+
+    assert asyncio.run(scenario()) == [True, True, True]
+    assert sent == [("editMessageText", "10"), ("editMessageText", "8")]
+    assert limiter._latest_edit == {}
+
+def test_edits_of_different_messages_are_all_sent(limiter):
+    sent = []
+
+    async def scenario():
+        await asyncio.gather(*(
+            _request(limiter, sent, "editMessageText", {"chat_id": 1, "message_id": message_id, "text": str(message_id)})
+            for message_id in (5, 6)
+        ))
+
+    asyncio.run(scenario())
+    assert sorted(sent) == [("editMessageText", "5"), ("editMessageText", "6")]
+
+def test_request_is_retried_after_retry_after(limiter):
+    calls = []
+
+    async def callback():
+        calls.append(asyncio.get_running_loop().time())
+        if len(calls) == 1:
+            raise RetryAfter(0.1)
+        return "sent"
+
+    async def scenario():
+        return await limiter.process_request(callback, (), {}, "sendMessage", {"chat_id": 1}, None)
+
+    assert asyncio.run(scenario()) == "sent"
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.1
+
+def test_retry_after_above_limit_is_raised(limiter, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "TELEGRAM_MAX_RETRY_AFTER", 1)
+
+    async def callback():
+        raise RetryAfter(30)
+
+    async def scenario():
+        await limiter.process_request(callback, (), {}, "sendMessage", {"chat_id": 1}, None)
+
+    with pytest.raises(RetryAfter):
+        asyncio.run(scenario())
+
+def test_answers_get_global_limit_before_countdowns(limiter):
+    limiter._global = TokenBucket(rate=20, capacity=1)
+    sent = []
+
+    async def scenario():
+        await _request(limiter, sent, "sendMessage", {"chat_id": 1, "text": "first"})
+        await asyncio.gather(
+            _request(limiter, sent, "editMessageText", {"chat_id": 2, "message_id": 1, "text": "countdown"},
+                     priority=rate_limiter.COUNTDOWN),
+            _request(limiter, sent, "sendMessage", {"chat_id": 3, "text": "answer"}),
+        )
+
+    asyncio.run(scenario())
+    assert [text for _, text in sent] == ["first", "answer", "countdown"]
+
+def test_other_methods_are_not_limited(limiter):
+    limiter._global.paused_until = float("inf")
+    sent = []
+
+    async def scenario():
+        return await asyncio.wait_for(_request(limiter, sent, "getMe", {}, result="me"), timeout=1)
+
+    assert asyncio.run(scenario()) == "me"
@@ -0,0 +1,44 @@
+import contextlib
+import inspect
+import re
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+
+import database
+import migrations
+
+class RecordingCursor:
+    def __init__(self):
+        self.queries = []
+
+    def execute(self, query, params=None):
+        self.queries.append(query)
+
+class RecordingConnection:
+    def __init__(self):
+        self._cursor = RecordingCursor()
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        pass
+
+def test_reset_drops_every_table_created_by_migrations(monkeypatch):
+    conn = RecordingConnection()
+    monkeypatch.setattr(database, "get_connection", lambda: contextlib.nullcontext(conn))
+    monkeypatch.setattr(database, "init_db", lambda: None)
+
+    database.reset_database()
+
+    prefix = re.escape(database.BOT_PREFIX)
+    dropped = {re.search(rf"DROP TABLE IF EXISTS {prefix}(\w+)", query).group(1) for query in conn._cursor.queries}
+    created = set()
+    for _, _, migration in migrations.MIGRATIONS:
+        created.update(re.findall(r"CREATE TABLE IF NOT EXISTS \{BOT_PREFIX\}(\w+)", inspect.getsource(migration)))
+    # Учетные записи рекрутеров сброс сохраняет
+    assert created - {"recruiters"} <= dropped
+    assert "schema_migrations" in dropped
@@ -0,0 +1,49 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+
+from utils import chatgpt_helpers, sentence_pool
+
+STOPWORD = {"word": "Прилагательные", "description": "Не используйте прилагательные"}
+
+@pytest.fixture
+def api(monkeypatch):
+    responses = []
+
+    async def fake_post(url, payload, priority, user_id=None, **kwargs):
+        return responses.pop(0)
+
+    monkeypatch.setenv("CHATGPT_API_KEY", "http://ai.test/generate")
+    monkeypatch.setattr(chatgpt_helpers, "_post", fake_post)
+    return responses
+
+@pytest.fixture
+def pool(monkeypatch):
+    saved = []
+
+    async def add_stopword_sentences(word, sentences):
+        saved.extend(sentences)
+        return len(sentences)
+
+    monkeypatch.setattr(sentence_pool.db, "add_stopword_sentences", add_stopword_sentences)
+    return saved
+
+def test_generated_sentence_is_kept_in_pool(api, pool):
+    api.append((200, json.dumps({"output": "\"У тебя хорошая зарплата.\""})))
+    assert asyncio.run(sentence_pool.generate_sentence(STOPWORD)) == "У тебя хорошая зарплата."
+    assert pool == ["У тебя хорошая зарплата."]
+
+def test_error_response_is_not_shown_or_pooled(api, pool):
+    api.append((500, "Internal Server Error: upstream model is overloaded"))
+    assert asyncio.run(sentence_pool.generate_sentence(STOPWORD)) is None
+    assert pool == []
+
+def test_pool_refill_stops_on_error_response(api, pool):
+    api.extend([(502, "Bad Gateway from the upstream server"), (200, json.dumps({"output": "Это красивый дом."}))])
+    added = asyncio.run(sentence_pool._generate_for_pool(STOPWORD, 1, asyncio.Semaphore(1)))
+    assert (added, pool) == (0, [])
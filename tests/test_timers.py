@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import pytest
+
+from utils import timers
+
+@pytest.fixture(autouse=True)
+def fast_intervals(monkeypatch):
+    monkeypatch.setattr(timers, "TIMER_MAX_INTERVAL", 0.02)
+    monkeypatch.setattr(timers, "TIMER_MIN_INTERVAL", 0.01)
+
+def _run(scenario):
+    async def main():
+        try:
+            await scenario()
+        finally:
+            await timers.stop()
+    asyncio.run(main())
+
+class Recorder:
+    def __init__(self):
+        self.ticks = []
+        self.expired = 0
+
+    async def on_tick(self, remaining):
+        self.ticks.append(remaining)
+
+    async def on_expire(self):
+        self.expired += 1
+
+def test_timer_ticks_and_expires_once():
+    recorder = Recorder()
+
+    async def scenario():
+        timers.schedule("test:1", time.time() + 0.1, recorder.on_tick, recorder.on_expire)
+        assert timers.is_scheduled("test:1")
+        await asyncio.sleep(0.3)
+        assert not timers.is_scheduled("test:1")
+
+    _run(scenario)
+    assert recorder.expired == 1
+    assert recorder.ticks
+    assert all(0 < remaining <= 0.1 for remaining in recorder.ticks)
+    assert recorder.ticks == sorted(recorder.ticks, reverse=True)
+
+def test_deadline_in_the_past_expires_immediately():
+    recorder = Recorder()
+
+    async def scenario():
+        timers.schedule("test:1", time.time() - 1, recorder.on_tick, recorder.on_expire)
+        await asyncio.sleep(0.05)
+
+    _run(scenario)
+    assert recorder.expired == 1
+    assert recorder.ticks == []
+
+def test_replaced_timer_does_not_fire():
+    old, new = Recorder(), Recorder()
+
+    async def scenario():
+        timers.schedule("test:1", time.time() + 0.05, old.on_tick, old.on_expire)
+        timers.schedule("test:1", time.time() + 0.15, new.on_tick, new.on_expire)
+        await asyncio.sleep(0.1)
+        assert new.expired == 0
+        await asyncio.sleep(0.2)
+
+    _run(scenario)
+    assert (old.expired, old.ticks) == (0, [])
+    assert new.expired == 1
+
+def test_cancelled_timer_does_not_fire():
+    recorder = Recorder()
+
+    async def scenario():
+        timers.schedule("test:1", time.time() + 0.05, recorder.on_tick, recorder.on_expire)
+        timers.cancel("test:1")
+        assert not timers.is_scheduled("test:1")
+        await asyncio.sleep(0.15)
+
+    _run(scenario)
+    assert (recorder.expired, recorder.ticks) == (0, [])
+
+def test_failing_handler_does_not_stop_other_timers():
+    recorder = Recorder()
+
+    async def failing():
+        raise RuntimeError("boom")
+
+    async def scenario():
+        timers.schedule("test:1", time.time() + 0.02, on_expire=failing)
+        timers.schedule("test:2", time.time() + 0.05, on_expire=recorder.on_expire)
+        await asyncio.sleep(0.15)
+
+    _run(scenario)
+    assert recorder.expired == 1
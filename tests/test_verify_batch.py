@@ -0,0 +1,43 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+
+from utils import ai_queue, chatgpt_helpers
+
+def _item(idx, user_id):
+    return ("http://ai.test/verify", f"Это очень важно {idx}.", f"Это крайне важно {idx}.", "очень", user_id)
+
+@pytest.fixture
+def api(monkeypatch):
+    calls = []
+
+    async def fake_post(url, payload, priority, user_id=None, **kwargs):
+        calls.append((kwargs["endpoint"], priority, user_id))
+        if kwargs["endpoint"] == "stopword_verify_batch":
+            return 200, json.dumps({"output": json.dumps([
+                {"id": 0, "passed": True, "feedback": "ok 0"},
+                {"id": 2, "passed": False, "feedback": "no 2"},
+            ])})
+        return 200, json.dumps({"output": json.dumps({"passed": True, "feedback": "single"})})
+
+    monkeypatch.setattr(chatgpt_helpers, "_post", fake_post)
+    return calls
+
+def test_batch_is_queued_for_every_user_and_missing_items_are_checked_alone(api):
+    items = [_item(0, 1), _item(1, 2), _item(2, 1)]
+    results = asyncio.run(chatgpt_helpers._verify_rephrasing_batch(items))
+    assert [(result["feedback"], cacheable) for result, cacheable in results] == [
+        ("ok 0", True), ("single", True), ("no 2", True)
+    ]
+    assert api[0] == ("stopword_verify_batch", ai_queue.GRADING, (1, 2))
+    assert api[1] == ("stopword_verify", ai_queue.GRADING, 2)
+
+def test_single_item_is_not_batched(api):
+    [(result, _)] = asyncio.run(chatgpt_helpers._verify_rephrasing_batch([_item(0, 1)]))
+    assert result["feedback"] == "single"
+    assert api == [("stopword_verify", ai_queue.GRADING, 1)]
@@ -0,0 +1,242 @@
+"""
+Общий асинхронный HTTP клиент для запросов к AI API.
+
+Одна aiohttp-сессия с пулом соединений переиспользуется всеми запросами,
+поэтому соединения к API не открываются заново на каждую проверку, а ожидание
+ответа не блокирует цикл событий бота. Запрос отменяется вместе с задачей,
+которая его ждет, и ограничен тайм-аутом, заданным для конкретного вызова.
+
+Сессия создается в post_init приложения (start) и закрывается в post_shutdown (close).
+
+Запросы к каждому хосту идут через автоматический выключатель (circuit breaker):
+после AI_BREAKER_FAILURES ошибок подряд запросы к хосту сразу завершаются
+CircuitOpenError, и вызывающий код переходит в упрощенный режим проверки, не
+дожидаясь тайм-аута. Через AI_BREAKER_RESET_TIMEOUT секунд один пробный запрос
+проверяет, восстановился ли API. Если включено хеджирование (AI_HEDGE_ENABLED),
+запрос, который не ответил за p95 обычной задержки, дублируется, и берется
+первый полученный ответ.
+"""
+import asyncio
+import logging
+import os
+import time
+from urllib.parse import urlparse
+
+import aiohttp
+
+from utils.metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Тайм-аут по умолчанию для генерации и проверки ответов (в секундах)
+AI_REQUEST_TIMEOUT = float(os.getenv("AI_REQUEST_TIMEOUT", "15"))
+# Максимум одновременных соединений к AI API, всего и к одному хосту
+AI_MAX_CONNECTIONS = int(os.getenv("AI_MAX_CONNECTIONS", "20"))
+AI_MAX_CONNECTIONS_PER_HOST = int(os.getenv("AI_MAX_CONNECTIONS_PER_HOST", "10"))
+# Сколько секунд держать открытым простаивающее соединение
+AI_KEEPALIVE_TIMEOUT = float(os.getenv("AI_KEEPALIVE_TIMEOUT", "60"))
+
+# Сколько ошибок подряд размыкают выключатель и через сколько секунд пробовать снова
+AI_BREAKER_FAILURES = int(os.getenv("AI_BREAKER_FAILURES", "5"))
+AI_BREAKER_RESET_TIMEOUT = float(os.getenv("AI_BREAKER_RESET_TIMEOUT", "30"))
+# Хеджирование: дублировать запрос, не ответивший за p95 задержки endpoint (не раньше AI_HEDGE_MIN_DELAY).
+# До набора AI_HEDGE_MIN_SAMPLES замеров p95 неизвестен, и запросы не дублируются
+AI_HEDGE_ENABLED = os.getenv("AI_HEDGE_ENABLED", "false").lower() == "true"
+AI_HEDGE_MIN_DELAY = float(os.getenv("AI_HEDGE_MIN_DELAY", "1"))
+AI_HEDGE_MIN_SAMPLES = int(os.getenv("AI_HEDGE_MIN_SAMPLES", "20"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+request_latency = Histogram("ai_request_seconds", "AI API request latency by endpoint")
+request_errors = Counter("ai_request_errors_total", "AI API requests that failed or timed out")
+circuit_state = Gauge("ai_circuit_state", "AI circuit breaker state by host (0 closed, 1 half-open, 2 open)")
+circuit_transitions = Counter("ai_circuit_transitions_total", "AI circuit breaker transitions by host and new state")
+circuit_rejected = Counter("ai_circuit_rejected_total", "AI requests rejected by an open circuit breaker")
+hedged_requests = Counter("ai_hedged_requests_total", "Duplicate AI requests sent after the p95 delay, by endpoint")
+hedge_wins = Counter("ai_hedge_wins_total", "Hedged AI requests answered by the duplicate first, by endpoint")
+
+class CircuitOpenError(Exception):
+    """The AI API is considered down and the request was not sent"""
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one AI API host"""
+
+    def __init__(self, host):
+        self.host = host
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        circuit_state.set(_STATE_VALUES[CLOSED], label=host)
+
+    def _transition(self, state):
+        if state == self.state:
+            return
+        logger.warning(f"AI circuit breaker for {self.host}: {self.state} -> {state}")
+        self.state = state
+        circuit_state.set(_STATE_VALUES[state], label=self.host)
+        circuit_transitions.inc(label=f"{self.host}:{state}")
+
+    def before_request(self):
+        """Raise CircuitOpenError unless a request may be sent now"""
+        if self.state == OPEN and time.monotonic() - self.opened_at >= AI_BREAKER_RESET_TIMEOUT:
+            self._transition(HALF_OPEN)
+        # В полуоткрытом состоянии пропускаем только один пробный запрос
+        if self.state == OPEN or (self.state == HALF_OPEN and self.trial_in_flight):
+            circuit_rejected.inc(label=self.host)
+            raise CircuitOpenError(f"AI API at {self.host} is unavailable")
+        if self.state == HALF_OPEN:
+            self.trial_in_flight = True
+
+    def record_success(self):
+        self.failures = 0
+        self.trial_in_flight = False
+        self._transition(CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.state == HALF_OPEN or self.failures >= AI_BREAKER_FAILURES:
+            self.opened_at = time.monotonic()
+            self._transition(OPEN)
+
+    def is_available(self):
+        return self.state == CLOSED or (
+            self.state == OPEN and time.monotonic() - self.opened_at >= AI_BREAKER_RESET_TIMEOUT
+        )
+
+_session = None
+# host -> CircuitBreaker
+_breakers = {}
+
+def _create_session():
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=AI_MAX_CONNECTIONS,
+            limit_per_host=AI_MAX_CONNECTIONS_PER_HOST,
+            keepalive_timeout=AI_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300
+        )
+    )
+
+async def start():
+    """Create the shared session (called from the application's post_init)"""
+    global _session
+    if _session is None or _session.closed:
+        _session = _create_session()
+
+async def get_session():
+    """Return the shared aiohttp session, creating it if start() was not called"""
+    global _session
+    # Между проверкой и созданием нет await, поэтому в одном цикле событий сессия создается один раз
+    if _session is None or _session.closed:
+        _session = _create_session()
+    return _session
+
+def _get_breaker(url):
+    host = urlparse(url).netloc or url
+    breaker = _breakers.get(host)
+    if breaker is None:
+        breaker = _breakers[host] = CircuitBreaker(host)
+    return breaker
+
+def is_available(url):
+    """Check whether requests to the API at url are currently allowed by its circuit breaker"""
+    return _get_breaker(url).is_available()
+
+async def _attempt(url, payload, timeout, headers, endpoint):
+    """Send one POST request and return (status, response text)"""
+    session = await get_session()
+    started = time.monotonic()
+    try:
+        async with session.post(
+            url,
+            json=payload,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as response:
+            result = response.status, await response.text()
+    except asyncio.CancelledError:
+        # Отмененный (например, проигравший хедж) запрос не учитываем в задержках
+        raise
+    except Exception:
+        request_errors.inc(label=endpoint)
+        request_latency.observe(time.monotonic() - started, label=endpoint)
+        raise
+    request_latency.observe(time.monotonic() - started, label=endpoint)
+    return result
+
+def _hedge_delay(endpoint, timeout):
+    """Delay after which to send a duplicate request, or None if hedging does not apply"""
+    if not AI_HEDGE_ENABLED or request_latency.count(endpoint) < AI_HEDGE_MIN_SAMPLES:
+        return None
+    delay = max(request_latency.quantile(0.95, endpoint), AI_HEDGE_MIN_DELAY)
+    return delay if delay < timeout else None
+
+async def _hedged(url, payload, timeout, headers, endpoint, delay):
+    """Send a request, duplicate it if there is no answer after delay and return the first answer"""
+    first = asyncio.create_task(_attempt(url, payload, timeout, headers, endpoint))
+    pending = {first}
+    error = None
+    try:
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return first.result()
+
+        hedged_requests.inc(label=endpoint)
+        # Дубликат ограничен оставшимся временем, чтобы общий тайм-аут не вырос
+        second = asyncio.create_task(_attempt(url, payload, timeout - delay, headers, endpoint))
+        pending = {first, second}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        hedge_wins.inc(label=endpoint)
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def post(url, payload, timeout=AI_REQUEST_TIMEOUT, headers=None, endpoint=None):
+    """POST a JSON payload and return (status, response text)
+
+    endpoint names the call in latency metrics (defaults to the URL path).
+    Raises CircuitOpenError without sending anything while the API is considered down,
+    asyncio.TimeoutError if no full response arrives within timeout seconds
+    and aiohttp.ClientError on connection problems.
+    """
+    endpoint = endpoint or urlparse(url).path or url
+    breaker = _get_breaker(url)
+    breaker.before_request()
+    try:
+        delay = _hedge_delay(endpoint, timeout)
+        if delay is None:
+            status, text = await _attempt(url, payload, timeout, headers, endpoint)
+        else:
+            status, text = await _hedged(url, payload, timeout, headers, endpoint, delay)
+    except asyncio.CancelledError:
+        # Отмена вызывающей задачей - не признак недоступности API
+        breaker.trial_in_flight = False
+        raise
+    except Exception:
+        breaker.record_failure()
+        raise
+    # 5xx и 429 означают, что API перегружен или не работает
+    if status >= 500 or status == 429:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return status, text
+
+async def close():
+    """Close the shared session (called from the application's post_shutdown)"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
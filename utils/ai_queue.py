@@ -0,0 +1,142 @@
+"""
+Очередь исходящих запросов к AI API с ограничением одновременных запросов.
+
+Запрос занимает слот (async with slot(...)), пока ждет ответа API. Если слотов
+нет, он ждет в очереди своего приоритета: сначала проверка ответов кандидатов
+во время теста (GRADING), затем запросы, которых ждет пользователь
+(INTERACTIVE), и в последнюю очередь фоновая генерация (BACKGROUND).
+Внутри приоритета слоты выдаются по кругу между пользователями, поэтому
+один кандидат с несколькими запросами не занимает все слоты. Пакетный
+запрос за нескольких пользователей (user_id - кортеж) тратит очередь
+каждого из них. Фоновые
+запросы дополнительно ограничены AI_BACKGROUND_MAX_IN_FLIGHT, чтобы всегда
+оставались слоты для кандидатов.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from utils.metrics import Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Сколько запросов к AI API выполнять одновременно, из них фоновых
+AI_MAX_IN_FLIGHT = int(os.getenv("AI_MAX_IN_FLIGHT", "8"))
+AI_BACKGROUND_MAX_IN_FLIGHT = int(os.getenv("AI_BACKGROUND_MAX_IN_FLIGHT", "2"))
+
+GRADING = 0
+INTERACTIVE = 1
+BACKGROUND = 2
+PRIORITY_NAMES = {GRADING: "grading", INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+queue_depth = Gauge("ai_queue_depth", "AI requests waiting for a slot by priority")
+queue_wait = Histogram("ai_queue_wait_seconds", "Time AI requests waited for a slot by priority")
+in_flight_gauge = Gauge("ai_in_flight", "AI requests currently sent by priority")
+
+# priority -> OrderedDict(user_key -> deque(future)); порядок ключей - очередь пользователей по кругу
+_waiting = {priority: OrderedDict() for priority in PRIORITY_NAMES}
+_in_flight = {priority: 0 for priority in PRIORITY_NAMES}
+
+def _total_in_flight():
+    return sum(_in_flight.values())
+
+def _has_capacity(priority):
+    if _total_in_flight() >= AI_MAX_IN_FLIGHT:
+        return False
+    return priority != BACKGROUND or _in_flight[BACKGROUND] < AI_BACKGROUND_MAX_IN_FLIGHT
+
+def _grant(priority):
+    _in_flight[priority] += 1
+    in_flight_gauge.set(_in_flight[priority], label=PRIORITY_NAMES[priority])
+
+def _depth(priority):
+    return sum(len(waiters) for waiters in _waiting[priority].values())
+
+def _pop_next(priority):
+    """Take the next waiter of a priority, rotating between users"""
+    users = _waiting[priority]
+    while users:
+        user_key, waiters = users.popitem(last=False)
+        future = waiters.popleft()
+        if waiters:
+            # Пользователь уходит в конец круга со своими оставшимися запросами
+            users[user_key] = waiters
+        if not future.done():
+            _charge(priority, user_key)
+            return future
+    return None
+
+def _charge(priority, user_key):
+    """Send the other waiting requests of every user of a batch to the end of the rotation"""
+    if isinstance(user_key, tuple):
+        users = _waiting[priority]
+        for member in user_key:
+            if member in users:
+                users.move_to_end(member)
+
+def _dispatch():
+    """Hand free slots to waiting requests, highest priority first"""
+    for priority in PRIORITY_NAMES:
+        while _waiting[priority] and _has_capacity(priority):
+            future = _pop_next(priority)
+            if future is None:
+                break
+            _grant(priority)
+            future.set_result(None)
+        queue_depth.set(_depth(priority), label=PRIORITY_NAMES[priority])
+
+def _release(priority):
+    _in_flight[priority] -= 1
+    in_flight_gauge.set(_in_flight[priority], label=PRIORITY_NAMES[priority])
+    _dispatch()
+
+def _remove_waiter(priority, user_key, future):
+    waiters = _waiting[priority].get(user_key)
+    if waiters is None:
+        return
+    try:
+        waiters.remove(future)
+    except ValueError:
+        return
+    if not waiters:
+        del _waiting[priority][user_key]
+    queue_depth.set(_depth(priority), label=PRIORITY_NAMES[priority])
+
+async def _acquire(priority, user_id):
+    label = PRIORITY_NAMES[priority]
+    if not _waiting[priority] and _has_capacity(priority):
+        _grant(priority)
+        queue_wait.observe(0, label=label)
+        return
+
+    # Запросы без пользователя (фоновые) делят одну очередь
+    user_key = user_id if user_id is not None else "system"
+    future = asyncio.get_running_loop().create_future()
+    _waiting[priority].setdefault(user_key, deque()).append(future)
+    queue_depth.set(_depth(priority), label=label)
+    started = time.monotonic()
+    try:
+        await future
+    except asyncio.CancelledError:
+        if future.done() and not future.cancelled():
+            # Слот уже выдан, но ждавшая задача отменена - возвращаем его
+            _release(priority)
+        else:
+            _remove_waiter(priority, user_key, future)
+        raise
+    queue_wait.observe(time.monotonic() - started, label=label)
+
+@asynccontextmanager
+async def slot(priority=INTERACTIVE, user_id=None):
+    """Wait for a free AI request slot and hold it for the duration of the block
+
+    user_id may be a tuple of users when one request is made for several of them.
+    """
+    await _acquire(priority, user_id)
+    try:
+        yield
+    finally:
+        _release(priority)
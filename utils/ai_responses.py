@@ -0,0 +1,206 @@
+"""
+Разбор ответов AI API по заранее объявленной схеме.
+
+Для каждого endpoint указано, что он возвращает: текст (перевод, сгенерированное
+предложение), оценку ({"passed", "feedback", "better_example"}), список
+оценок (пакетная проверка) или ответ
+OpenAI chat completions. Локальный API оборачивает результат модели в JSON
+(обычно {"output": "..."}), а модель может добавить к JSON оценки пояснения
+или markdown. Ответ разбирается за один проход: конверт декодируется один раз,
+оценка ищется как первый JSON-объект внутри результата.
+
+parse возвращает (значение, ok); ok = False означает, что ответ не
+соответствует схеме и значение получено запасным способом (или равно None).
+Если задан AI_RESPONSE_RECORD_PATH, сырые ответы дописываются в этот файл
+(JSON lines) для пополнения корпуса bench_ai_responses.py. Файл должен быть
+вне каталога бота: pm2 перезапускает бота при изменении файлов в нем.
+"""
+import json
+import logging
+import os
+import re
+import threading
+
+from utils.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+# Файл для записи сырых ответов API (пусто - не записывать)
+AI_RESPONSE_RECORD_PATH = os.getenv("AI_RESPONSE_RECORD_PATH", "")
+
+TEXT = "text"
+VERDICT = "verdict"
+VERDICTS = "verdicts"
+CHAT = "chat"
+
+# endpoint -> тип ответа и поля конверта, в которых лежит результат (по приоритету)
+SCHEMAS = {
+    "chatgpt_translate": {
+        "type": TEXT,
+        "fields": ("output", "response", "text", "content", "translated_text", "translation"),
+    },
+    "stopword_generate": {
+        "type": TEXT,
+        "fields": ("output", "text", "content", "response", "result"),
+        "strip_quotes": True,
+    },
+    "stopword_verify": {"type": VERDICT, "fields": ("output",)},
+    "poem_verify": {"type": VERDICT, "fields": ("output",)},
+    # Пакетная проверка: список оценок с "id" элемента (массив или {"results": [...]})
+    "stopword_verify_batch": {"type": VERDICTS, "fields": ("output",)},
+    "openai_chat_completions": {"type": CHAT},
+}
+
+# Метка: ok или failed, через двоеточие - endpoint
+parse_results = Counter("ai_response_parse_total", "AI responses by endpoint and parse result")
+
+_decoder = json.JSONDecoder()
+_UNICODE_ESCAPE_RE = re.compile(r"\\u([0-9a-fA-F]{4})")
+_record_lock = threading.Lock()
+
+def _unescape(text):
+    """Decode \\uXXXX sequences left in a string that was escaped twice"""
+    if "\\u" not in text:
+        return text
+    return _UNICODE_ESCAPE_RE.sub(lambda m: chr(int(m.group(1), 16)), text)
+
+def _decode_envelope(text):
+    """Decode the response body as JSON, or return None if it is plain text"""
+    stripped = text.lstrip()
+    if not stripped or stripped[0] not in '{["':
+        return None
+    try:
+        return json.loads(stripped)
+    except json.JSONDecodeError:
+        return None
+
+def _find_object(text):
+    """Return the first JSON object in a text that may contain prose or markdown around it"""
+    start = text.find("{")
+    while start != -1:
+        try:
+            value, _ = _decoder.raw_decode(text, start)
+            if isinstance(value, dict):
+                return value
+        except json.JSONDecodeError:
+            pass
+        start = text.find("{", start + 1)
+    return None
+
+def _find_array(text):
+    """Return the first JSON array of objects in a text, or the "results" list of the first object"""
+    for start, char in ((i, c) for i, c in enumerate(text) if c in "[{"):
+        try:
+            value, _ = _decoder.raw_decode(text, start)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(value, dict) and isinstance(value.get("results"), list):
+            return value["results"]
+        if isinstance(value, list) and all(isinstance(item, dict) for item in value):
+            return value
+    return None
+
+def _normalize_verdict(value):
+    passed = value.get("passed")
+    if isinstance(passed, str):
+        passed = passed.strip().lower() == "true"
+    return {
+        "passed": bool(passed),
+        "feedback": _unescape(str(value.get("feedback") or "")),
+        "better_example": _unescape(str(value.get("better_example") or "")),
+    }
+
+def _parse_text(schema, text):
+    envelope = _decode_envelope(text)
+    if envelope is None:
+        value, ok = text, True
+    elif isinstance(envelope, str):
+        value, ok = envelope, True
+    elif isinstance(envelope, dict):
+        field = next((field for field in schema["fields"] if field in envelope), None)
+        if field is not None:
+            value, ok = str(envelope[field]), True
+        else:
+            # Неизвестный формат конверта: берем первое подходящее строковое поле
+            value = next((v for v in envelope.values() if isinstance(v, str) and len(v) > 5), str(envelope))
+            ok = False
+    else:
+        value, ok = str(envelope), False
+
+    value = _unescape(value)
+    if schema.get("strip_quotes"):
+        value = value.strip().strip('"\'`').strip()
+    return value, ok
+
+def _parse_verdict(schema, text):
+    envelope = _decode_envelope(text)
+    if envelope is None:
+        envelope = _find_object(text)
+    elif isinstance(envelope, str):
+        envelope = _find_object(envelope)
+    elif isinstance(envelope, dict) and "passed" not in envelope:
+        inner = next((envelope[field] for field in schema["fields"] if field in envelope), None)
+        if isinstance(inner, dict):
+            envelope = inner
+        elif isinstance(inner, str):
+            envelope = _find_object(inner)
+        else:
+            envelope = None
+
+    if not isinstance(envelope, dict) or "passed" not in envelope:
+        return None, False
+
+    return _normalize_verdict(envelope), True
+
+def _parse_verdicts(schema, text):
+    envelope = _decode_envelope(text)
+    if isinstance(envelope, dict) and "results" not in envelope:
+        inner = next((envelope[field] for field in schema["fields"] if field in envelope), None)
+        envelope = inner if isinstance(inner, (list, dict)) else _find_array(inner) if isinstance(inner, str) else None
+    elif isinstance(envelope, str):
+        envelope = _find_array(envelope)
+    elif envelope is None:
+        envelope = _find_array(text)
+    if isinstance(envelope, dict):
+        envelope = envelope.get("results")
+
+    if not isinstance(envelope, list):
+        return None, False
+    verdicts = []
+    for value in envelope:
+        if not isinstance(value, dict) or "passed" not in value:
+            continue
+        verdict = _normalize_verdict(value)
+        verdict["id"] = value.get("id")
+        verdicts.append(verdict)
+    return verdicts, bool(verdicts)
+
+def _parse_chat(schema, text):
+    envelope = _decode_envelope(text)
+    try:
+        return envelope["choices"][0]["message"]["content"], True
+    except (TypeError, KeyError, IndexError):
+        return None, False
+
+_PARSERS = {TEXT: _parse_text, VERDICT: _parse_verdict, VERDICTS: _parse_verdicts, CHAT: _parse_chat}
+
+def parse(endpoint, response_text):
+    """Parse a raw response of the given endpoint according to its schema; returns (value, ok)"""
+    schema = SCHEMAS[endpoint]
+    response_text = response_text or ""
+    if AI_RESPONSE_RECORD_PATH:
+        record(endpoint, response_text)
+    value, ok = _PARSERS[schema["type"]](schema, response_text)
+    parse_results.inc(label=f"{'ok' if ok else 'failed'}:{endpoint}")
+    if not ok:
+        logger.warning(f"Ответ {endpoint} не соответствует схеме: {response_text[:200]}")
+    return value, ok
+
+def record(endpoint, response_text):
+    """Append a raw response to AI_RESPONSE_RECORD_PATH"""
+    line = json.dumps({"endpoint": endpoint, "body": response_text}, ensure_ascii=False)
+    try:
+        with _record_lock, open(AI_RESPONSE_RECORD_PATH, "a", encoding="utf-8") as file:
+            file.write(line + "\n")
+    except OSError as e:
+        logger.error(f"Не удалось записать ответ API в {AI_RESPONSE_RECORD_PATH}: {e}")
@@ -0,0 +1,76 @@
+"""
+Потокобезопасный in-memory кэш с ограничением по времени жизни (TTL) и размеру (LRU).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries expire after ttl seconds"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        # Версия ключа - номер из общего растущего счетчика, выданный при его последней инвалидации:
+        # значение, прочитанное из базы до инвалидации, не должно попасть в кэш после нее.
+        # Хранятся версии не более maxsize ключей; у остальных версия - _floor, не меньше
+        # любой вытесненной, поэтому версия ключа никогда не уменьшается и не повторяется
+        self._versions = OrderedDict()
+        self._counter = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value or default if it is missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def version(self, key):
+        """Return the current version of a key, to be passed to set() after loading"""
+        with self._lock:
+            return self._versions.get(key, self._floor)
+
+    def set(self, key, value, version=None):
+        """Store a value; skipped if the key was invalidated after version was taken"""
+        with self._lock:
+            if version is not None and self._versions.get(key, self._floor) != version:
+                return False
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return True
+
+    def invalidate(self, key):
+        """Drop a key and make in-flight loads of it stale"""
+        with self._lock:
+            self._data.pop(key, None)
+            self._counter += 1
+            self._versions[key] = self._counter
+            self._versions.move_to_end(key)
+            while len(self._versions) > self.maxsize:
+                _, evicted_version = self._versions.popitem(last=False)
+                self._floor = max(self._floor, evicted_version)
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._counter += 1
+            self._floor = self._counter
+            self._versions.clear()
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
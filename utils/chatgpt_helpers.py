@@ -1,12 +1,14 @@
 import os
-import logging
-import aiohttp
+import asyncio
 import json
-import re
-import requests
+import logging
 from dotenv import load_dotenv
 import random
 from utils.helpers import get_stopwords_data
+from utils import ai_batcher, ai_client, ai_queue, ai_responses, verification_cache
+from utils.metrics import Counter
+from utils.pregrader import contains_stopword, tokenize
+from utils.verification_cache import normalize_text
 
 load_dotenv()
 
@@ -14,6 +16,16 @@ load_dotenv()
 DEFAULT_MODEL = "gpt-3.5-turbo-0125"
 DEFAULT_TEMPERATURE = 0.7
 DEFAULT_MAX_TOKENS = 1000
+# Тайм-аут call_openai_api: ответ модели может генерироваться долго
+AI_CHAT_TIMEOUT = float(os.getenv("AI_CHAT_TIMEOUT", "60"))
+# Версии промптов проверки: при изменении текста промпта увеличьте версию, чтобы не использовать старые оценки из кэша
+STOPWORD_VERIFY_PROMPT_VERSION = 1
+POEM_VERIFY_PROMPT_VERSION = 1
+# Проверка стихотворения отправляет весь диалог кандидата, поэтому ей нужно больше времени
+AI_POEM_TIMEOUT = float(os.getenv("AI_POEM_TIMEOUT", "60"))
+
+# Проверки, выполненные упрощенно без AI (API недоступен), по виду проверки
+degraded_gradings = Counter("ai_degraded_gradings_total", "Answers graded locally because the AI API was unavailable")
 
 # Global variables
 _api_key = None
@@ -22,6 +34,11 @@ _api_url = None
 # Logger
 logger = logging.getLogger(__name__)
 
+async def _post(url, payload, priority, user_id=None, **kwargs):
+    """Send a request to the AI API once the queue gives it a slot"""
+    async with ai_queue.slot(priority, user_id):
+        return await ai_client.post(url, payload, **kwargs)
+
 def load_api_key():
     """Load API key or URL for the local API."""
     global _api_key, _api_url
@@ -45,7 +62,8 @@ async def call_openai_api(messages,
                           model=DEFAULT_MODEL,
                           temperature=DEFAULT_TEMPERATURE,
                           max_tokens=DEFAULT_MAX_TOKENS,
-                          language="ru"):
+                          language="ru",
+                          user_id=None):
     """
     Call OpenAI API or local API to get a response from the model.
     
@@ -55,6 +73,7 @@ async def call_openai_api(messages,
         temperature: Generation temperature
         max_tokens: Maximum tokens
         language: Response language
+        user_id: Telegram user the request is made for (for fair queueing)
     
     Returns:
         Response text or None on error
@@ -89,53 +108,15 @@ async def call_openai_api(messages,
             if not endpoint.endswith("/chatgpt_translate"):
                 endpoint = f"{endpoint}/chatgpt_translate"
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(endpoint, 
-                                       headers=headers, 
-                                       json=data) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"Local API error ({response.status}): {error_text}")
-                        return None
-                    
-                    # Get response
-                    response_text = await response.text()
-                    
-                    try:
-                        # Try to parse JSON
-                        result = json.loads(response_text)
-                        
-                        # If response is a dictionary
-                        if isinstance(result, dict):
-                            # Check different field variants
-                            if "output" in result:
-                                return decode_unicode_string(result["output"])
-                            elif "response" in result:
-                                return decode_unicode_string(result["response"])
-                            elif "text" in result:
-                                return decode_unicode_string(result["text"])
-                            elif "content" in result:
-                                return decode_unicode_string(result["content"])
-                            elif "translated_text" in result:
-                                return decode_unicode_string(result["translated_text"])
-                            elif "translation" in result:
-                                return decode_unicode_string(result["translation"])
-                            elif "success" in result and "output" in result:
-                                return decode_unicode_string(result["output"])
-                            else:
-                                # If no known fields, return whole JSON as string
-                                # Try to find any text field
-                                for key, value in result.items():
-                                    if isinstance(value, str) and len(value) > 5:
-                                        return decode_unicode_string(value)
-                                return decode_unicode_string(str(result))
-                        elif isinstance(result, str):
-                            return decode_unicode_string(result)
-                        else:
-                            return decode_unicode_string(str(result))
-                    except json.JSONDecodeError:
-                        # If JSON parsing failed, return text as is
-                        return decode_unicode_string(response_text)
+            status, response_text = await _post(
+                endpoint, data, ai_queue.INTERACTIVE, user_id, timeout=AI_CHAT_TIMEOUT, headers=headers, endpoint="chatgpt_translate"
+            )
+            if status != 200:
+                logger.error(f"Local API error ({status}): {response_text}")
+                return None
+            
+            text, _ = ai_responses.parse("chatgpt_translate", response_text)
+            return text
                         
         except Exception as e:
             logger.error(f"Error calling local API: {e}")
@@ -156,54 +137,22 @@ async def call_openai_api(messages,
         }
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post("https://api.openai.com/v1/chat/completions", 
-                                       headers=headers, 
-                                       json=data) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"OpenAI API error ({response.status}): {error_text}")
-                        return None
-                    
-                    result = await response.json()
-                    return result["choices"][0]["message"]["content"]
+            status, response_text = await _post(
+                "https://api.openai.com/v1/chat/completions", data, ai_queue.INTERACTIVE, user_id,
+                timeout=AI_CHAT_TIMEOUT, headers=headers, endpoint="openai_chat_completions"
+            )
+            if status != 200:
+                logger.error(f"OpenAI API error ({status}): {response_text}")
+                return None
+            
+            content, _ = ai_responses.parse("openai_chat_completions", response_text)
+            return content
         except Exception as e:
             logger.error(f"Error calling OpenAI API: {e}")
             return None
 
-def decode_unicode_string(text):
-    """
-    Decode a string containing Unicode sequences like \\uXXXX.
-    
-    Args:
-        text: String to decode
-    
-    Returns:
-        Decoded string
-    """
-    if not isinstance(text, str):
-        return text
-    
-    # If string doesn't contain Unicode sequences, return as is
-    if '\\u' not in text:
-        return text
-    
-    try:
-        # Try to decode through JSON
-        decoded = json.loads(f'"{text}"')
-        return decoded
-    except json.JSONDecodeError:
-        # If failed, use regex
-        try:
-            pattern = '\\\\u([0-9a-fA-F]{4})'
-            result = re.sub(pattern, lambda m: chr(int(m.group(1), 16)), text)
-            return result
-        except Exception as e:
-            logger.warning(f"Failed to decode Unicode: {e}")
-            return text
-
-async def generate_ai_stopword_sentence(stopword_data):
-    """Генерирует предложение с использованием стоп-слова через AI"""
+async def generate_ai_stopword_sentence(stopword_data, priority=ai_queue.INTERACTIVE, user_id=None):
+    """Генерирует предложение с использованием стоп-слова через AI (None, если API вернул ошибку)"""
     api_url = os.getenv("CHATGPT_API_KEY")
     
     stopword_word = stopword_data.get('word', '')
@@ -238,69 +187,27 @@ async def generate_ai_stopword_sentence(stopword_data):
     """
     
     # Отправляем запрос к API
-    response = requests.post(api_url, json={
+    status, response_text = await _post(api_url, {
         "text": stopword_word,
         "prompt": prompt,
         "format": "text"
-    }, timeout=15)
+    }, priority, user_id, endpoint="stopword_generate")
     
-    # Получаем сгенерированное предложение
-    ai_sentence = extract_sentence_from_response(response.text)
+    # Получаем сгенерированное предложение (без кавычек вокруг)
+    ai_sentence, parsed = ai_responses.parse("stopword_generate", response_text)
     
-    # Удаляем кавычки, если они есть
-    ai_sentence = ai_sentence.strip('"\'`')
+    # Текст ошибки API похож на предложение - его нельзя показывать кандидату или сохранять в пул
+    if status != 200 or not parsed:
+        logger.error(f"Не удалось сгенерировать предложение для '{stopword_word}' ({status}): {(response_text or '')[:200]}")
+        return None
     
     # Логируем финальное предложение
     logger.info(f"Сгенерировано предложение: {ai_sentence}")
     
     return ai_sentence
 
-def extract_sentence_from_response(response_text):
-    """Извлекает чистый текст предложения из ответа API, который может быть в JSON"""
-    try:
-        # Попытка распарсить как JSON
-        response_data = json.loads(response_text)
-        
-        # Если это словарь
-        if isinstance(response_data, dict):
-            # Проверяем распространенные ключи в ответах API
-            if 'output' in response_data:
-                return response_data['output']
-            elif 'text' in response_data:
-                return response_data['text']
-            elif 'content' in response_data:
-                return response_data['content']
-            elif 'response' in response_data:
-                return response_data['response']
-            elif 'result' in response_data:
-                return response_data['result']
-            else:
-                # Если ничего не нашли, возвращаем первое строковое значение
-                for key, value in response_data.items():
-                    if isinstance(value, str) and len(value) > 5:
-                        return value
-                
-                # Если не нашли подходящих строк, возвращаем весь текст
-                return str(response_data)
-    except json.JSONDecodeError:
-        # Если это не JSON, просто возвращаем текст как есть
-        pass
-    except Exception as e:
-        logger.error(f"Ошибка при извлечении предложения из ответа: {e}")
-    
-    # Удаляем кавычки в начале и конце
-    return response_text.strip().strip('"\'`').strip()
-
-async def verify_stopword_rephrasing_ai(original_sentence, rephrased_sentence, stopword):
-    """Проверить корректность перефразированного предложения без стоп-слова используя AI"""
-    api_url = os.getenv("CHATGPT_API_KEY")
-    
-    # Получаем данные о стоп-слове
-    stopword_text = stopword.get('word', '').strip().lower()
-    
-    # Логируем то, что проверяем для отладки
-    logger.info(f"Проверка ответа: Исходное='{original_sentence}', Ответ='{rephrased_sentence}', Стоп-слово='{stopword_text}'")
-    
+async def _request_rephrasing_verification(api_url, original_sentence, rephrased_sentence, stopword_text, user_id=None):
+    """Ask the AI to grade a rephrasing; returns (result dict, cacheable)"""
     # Проверка на сохранение смысла и прочие критерии через API
     # Создаем улучшенный промпт для AI
     prompt = f"""
@@ -334,64 +241,157 @@ async def verify_stopword_rephrasing_ai(original_sentence, rephrased_sentence, s
     """
     
     # Отправляем запрос к API
-    response = requests.post(api_url, json={
+    status, result_text = await _post(api_url, {
         "text": rephrased_sentence,
         "prompt": prompt,
         "format": "json"
-    }, timeout=15)
+    }, ai_queue.GRADING, user_id, endpoint="stopword_verify")
     
     # Логируем полный ответ API для отладки
-    logger.info(f"Ответ API на проверку: {response.text}")
+    logger.info(f"Ответ API на проверку: {result_text}")
+    
+    result, parsed = ai_responses.parse("stopword_verify", result_text)
+    if result is None:
+        result = {
+            "passed": False,
+            "feedback": "Не удалось проанализировать ответ. Пожалуйста, попробуйте перефразировать иначе."
+        }
     
-    # Обработка ответа API
-    result_text = response.text
+    # Ответ после ошибки API или неразобранный ответ не кэшируем
+    return result, status == 200 and parsed
+
+async def _verify_rephrasing_batch(items):
+    """Grade several rephrasings with one multi-item prompt; returns (result, cacheable) per item
+
+    Items are (api_url, original_sentence, rephrased_sentence, stopword_text, user_id).
+    Items the batch answer does not cover (or all of them, if the batch request
+    fails) are checked one by one; a failed single check is returned as its exception.
+    """
+    if len(items) == 1:
+        return [await _request_rephrasing_verification(*items[0])]
+
+    tasks = "\n".join(
+        f'{{"id": {idx}, "original": {json.dumps(original, ensure_ascii=False)}, '
+        f'"stopword": {json.dumps(stopword_text, ensure_ascii=False)}, '
+        f'"answer": {json.dumps(rephrased, ensure_ascii=False)}}}'
+        for idx, (_, original, rephrased, stopword_text, _) in enumerate(items)
+    )
+    prompt = f"""
+    Ты - старший преподаватель делового русского языка и коммуникаций. Проверь несколько ответов кандидатов: каждый должен был перефразировать исходное предложение (original), избегая стоп-слова (stopword).
+
+    ## КРИТЕРИИ ОЦЕНКИ (оценивай строго и каждый ответ отдельно):
+    1. В ответе (answer) НЕТ стоп-слова или его форм/вариаций.
+    2. КРИТИЧЕСКИ ВАЖНО: ответ СОХРАНЯЕТ ОСНОВНОЙ СМЫСЛ исходного предложения.
+    3. Ответ логичен и согласован грамматически.
+
+    ## ПРАВИЛА ПРОВЕРКИ:
+    - Ответ ПРАВИЛЬНЫЙ, только если соответствует ВСЕМ критериям.
+    - Даже небольшое искажение смысла, превращение отрицания в утверждение, несвязанный с оригиналом или слишком сокращенный ответ - НЕПРАВИЛЬНО.
+    - Ответ с большим количеством ошибок в грамматике, пунктуации, синтаксисе - НЕПРАВИЛЬНО.
+
+    ## ЗАДАНИЯ (по одному JSON на строку):
+    {tasks}
+
+    ## ФОРМАТ ОТВЕТА (строго JSON-массив, по одному элементу на каждое задание, с тем же id):
+    [
+      {{"id": 0, "passed": true/false, "feedback": "Развернутая оценка ответа.", "better_example": "Пример правильного перефразирования (только если ответ неверный)."}}
+    ]
+    """
+    api_url = items[0][0]
+    # Пакет занимает очередь всех кандидатов, чьи ответы в нем проверяются
+    users = tuple(dict.fromkeys(item[4] for item in items if item[4] is not None)) or None
     try:
-        # Сначала парсим внешний JSON
-        outer_result = json.loads(result_text)
-        
-        # Проверяем, есть ли поле 'output' - значит результат в нем
-        if 'output' in outer_result:
-            # Парсим JSON строку из поля 'output'
-            try:
-                inner_json = outer_result['output']
-                result = json.loads(inner_json)
-            except json.JSONDecodeError:
-                # Если не удалось распарсить внутренний JSON, пытаемся найти JSON в тексте
-                json_match = re.search(r'({\s*"passed"\s*:.*})', inner_json, re.DOTALL)
-                if json_match:
-                    try:
-                        result = json.loads(json_match.group(1))
-                    except json.JSONDecodeError:
-                        result = {
-                            "passed": False,
-                            "feedback": "Не удалось проанализировать ответ. Пожалуйста, попробуйте перефразировать иначе."
-                        }
-                else:
-                    result = {
-                        "passed": False,
-                        "feedback": "Не удалось проанализировать ответ. Пожалуйста, попробуйте перефразировать иначе."
-                    }
-        else:
-            # Если нет поля 'output', то результат, вероятно, в корне ответа
-            result = outer_result
-    except json.JSONDecodeError:
-        # Если внешний JSON не распарсился, пытаемся найти JSON в тексте с помощью регулярного выражения
-        json_match = re.search(r'({\s*"passed"\s*:.*})', result_text, re.DOTALL)
-        if json_match:
-            try:
-                result = json.loads(json_match.group(1))
-            except json.JSONDecodeError:
-                # Если и это не помогло, создаем базовый объект результата
+        status, response_text = await _post(api_url, {
+            "text": "\n".join(item[2] for item in items),
+            "prompt": prompt,
+            "format": "json"
+        }, ai_queue.GRADING, users, timeout=ai_batcher.AI_BATCH_TIMEOUT, endpoint="stopword_verify_batch")
+    except Exception as e:
+        # При разомкнутом выключателе одиночные запросы тоже не пройдут
+        if isinstance(e, ai_client.CircuitOpenError) or not ai_client.is_available(api_url):
+            raise
+        logger.warning(f"Пакетная проверка не удалась ({e!r}), проверяем ответы по одному")
+        status, response_text = None, None
+
+    verdicts, parsed = ai_responses.parse("stopword_verify_batch", response_text) if response_text is not None else (None, False)
+    by_id = {}
+    if status == 200 and parsed:
+        for position, verdict in enumerate(verdicts):
+            idx = verdict.pop("id", None)
+            by_id[idx if isinstance(idx, int) else position] = verdict
+
+    results = [(by_id[idx], True) if idx in by_id else None for idx in range(len(items))]
+    missing = [idx for idx, result in enumerate(results) if result is None]
+    if missing:
+        logger.warning(f"Пакетная проверка не вернула оценку для {len(missing)} из {len(items)} ответов, проверяем их по одному")
+        # Ошибка одного запроса достается только его ответу
+        singles = await asyncio.gather(
+            *(_request_rephrasing_verification(*items[idx]) for idx in missing), return_exceptions=True
+        )
+        for idx, result in zip(missing, singles):
+            results[idx] = result
+    return results
+
+_verify_batcher = ai_batcher.MicroBatcher("stopword_verify", _verify_rephrasing_batch)
+
+def _degraded_rephrasing_result(original_sentence, rephrased_sentence, stopword_text):
+    """Grade a rephrasing locally while the AI API is unavailable"""
+    degraded_gradings.inc(label="stopword_verify")
+    if stopword_text and contains_stopword(rephrased_sentence, stopword_text):
+        return {
+            "passed": False,
+            "feedback": f"В вашем ответе осталось стоп-слово \"{stopword_text}\" или одна из его форм."
+        }
+    # Смысл без AI не проверить, поэтому отсекаем только явно обрезанные ответы
+    if len(tokenize(rephrased_sentence)) < max(2, len(tokenize(original_sentence)) // 3):
+        return {
+            "passed": False,
+            "feedback": "Ответ слишком сильно сокращен по сравнению с исходным предложением."
+        }
+    return {
+        "passed": True,
+        "feedback": "Стоп-слово не найдено. Сервис проверки смысла временно недоступен, поэтому ответ проверен в упрощенном режиме."
+    }
+
+async def verify_stopword_rephrasing_ai(original_sentence, rephrased_sentence, stopword, user_id=None):
+    """Проверить корректность перефразированного предложения без стоп-слова используя AI"""
+    api_url = os.getenv("CHATGPT_API_KEY")
+    
+    # Получаем данные о стоп-слове
+    stopword_text = stopword.get('word', '').strip().lower()
+    
+    # Логируем то, что проверяем для отладки
+    logger.info(f"Проверка ответа: Исходное='{original_sentence}', Ответ='{rephrased_sentence}', Стоп-слово='{stopword_text}'")
+    
+    # Одинаковый ответ на то же предложение уже мог быть проверен
+    cache_key = verification_cache.make_key(
+        "stopword_verify", STOPWORD_VERIFY_PROMPT_VERSION,
+        normalize_text(original_sentence), normalize_text(rephrased_sentence), stopword_text
+    )
+    result = await verification_cache.get("stopword_verify", cache_key)
+    if result is None:
+        try:
+            item = (api_url, original_sentence, rephrased_sentence, stopword_text, user_id)
+            if ai_batcher.AI_BATCH_ENABLED:
+                # Ответы, пришедшие одновременно, проверяются одним запросом
+                result, cacheable = await _verify_batcher.submit(item)
+            else:
+                result, cacheable = await _request_rephrasing_verification(*item)
+        except Exception as e:
+            if isinstance(e, ai_client.CircuitOpenError) or not ai_client.is_available(api_url):
+                # Выключатель разомкнут - API недоступен, не заставляем кандидата ждать
+                logger.warning(f"AI проверка недоступна, ответ проверяется упрощенно: {e!r}")
+                result = _degraded_rephrasing_result(original_sentence, rephrased_sentence, stopword_text)
+            else:
+                # Единичный сбой (тайм-аут, ошибка разбора) - ответ не засчитываем без проверки смысла
+                logger.error(f"Ошибка AI проверки ответа: {e!r}")
                 result = {
                     "passed": False,
-                    "feedback": "Не удалось проанализировать ответ. Пожалуйста, попробуйте перефразировать иначе."
+                    "feedback": "Не удалось проверить ответ. Пожалуйста, попробуйте еще раз."
                 }
-        else:
-            # Если JSON не найден, создаем базовый объект результата
-            result = {
-                "passed": False,
-                "feedback": "Не удалось проанализировать ответ. Пожалуйста, попробуйте перефразировать иначе."
-            }
+            cacheable = False
+        if cacheable:
+            await verification_cache.put("stopword_verify", cache_key, result)
     
     print("РЕЗУЛЬТАТ:", result)
     # Извлекаем результаты проверки
@@ -412,14 +412,30 @@ async def verify_stopword_rephrasing_ai(original_sentence, rephrased_sentence, s
     
     return passed, final_feedback
 
-async def verify_poem_task(solution_text):
+async def verify_poem_task(solution_text, user_id=None):
     """Verify completion of the poem task using ChatGPT"""
+    # Повторно отправленное то же решение не проверяется заново
+    cache_key = verification_cache.make_key("poem_verify", POEM_VERIFY_PROMPT_VERSION, normalize_text(solution_text))
+    cached = await verification_cache.get("poem_verify", cache_key)
+    if cached is not None:
+        return cached["passed"], cached["feedback"]
+    
+    passed, feedback, cacheable = await _verify_poem_task(solution_text, user_id)
+    if cacheable:
+        await verification_cache.put("poem_verify", cache_key, {"passed": passed, "feedback": feedback})
+    return passed, feedback
+
+async def _verify_poem_task(solution_text, user_id=None):
+    """Verify the poem task; returns (passed, feedback, cacheable)
+
+    cacheable is False when the result is a fallback after an API error.
+    """
     # Use the API endpoint from .env
     api_url = os.getenv("CHATGPT_API_KEY")
     
     # Проверка на наличие самого стихотворения в решении (базовая)
     if not solution_text:
-        return False, "Отсутствует решение. Пожалуйста, предоставьте полный диалог с ИИ, включая стихотворение."
+        return False, "Отсутствует решение. Пожалуйста, предоставьте полный диалог с ИИ, включая стихотворение.", True
     
     # Проверка наличия диалога с ИИ и стихотворения с ключевыми элементами
     has_dialog = "You" in solution_text or "Assistant" in solution_text or "Human" in solution_text or "AI" in solution_text
@@ -428,7 +444,7 @@ async def verify_poem_task(solution_text):
     
     # Если в тексте совсем нет признаков стихотворения
     if not (has_dialog and has_poem and has_key_terms):
-        return False, "Решение не содержит необходимых элементов: диалога с ИИ, стихотворения с акростихом 'ИСКРА', упоминания стихий и аллитерации. Пожалуйста, предоставьте полное решение согласно заданию."
+        return False, "Решение не содержит необходимых элементов: диалога с ИИ, стихотворения с акростихом 'ИСКРА', упоминания стихий и аллитерации. Пожалуйста, предоставьте полное решение согласно заданию.", True
     
     # Автоматически проверим текст на наличие стихотворения с акростихом ИСКРА
     lines = solution_text.split('\n')
@@ -444,7 +460,7 @@ async def verify_poem_task(solution_text):
         # Проверяем также наличие упоминания проверки в тексте
         verification_mentioned = "проверь" in solution_text.lower() or "verify" in solution_text.lower()
         if verification_mentioned:
-            return True, "Стихотворение найдено и соответствует требованиям. Акростих 'ИСКРА' присутствует. Диалог с проверкой включен."
+            return True, "Стихотворение найдено и соответствует требованиям. Акростих 'ИСКРА' присутствует. Диалог с проверкой включен.", True
     
     # Prepare the prompt for GPT
     prompt = f"""
@@ -483,96 +499,48 @@ async def verify_poem_task(solution_text):
     
     try:
         # Make the API request
-        response = requests.post(api_url, json={
+        status, response_text = await _post(api_url, {
             "text": solution_text,
             "prompt": prompt,
             "format": "json"
-        })
+        }, ai_queue.GRADING, user_id, timeout=AI_POEM_TIMEOUT, endpoint="poem_verify")
         
         # Process the response
-        if response.status_code != 200:
-            logger.error(f"Error calling ChatGPT API: {response.status_code}")
-            logger.error(f"Response text: {response.text}")
+        if status != 200:
+            logger.error(f"Error calling ChatGPT API: {status}")
+            logger.error(f"Response text: {response_text}")
             # Если API не работает, но мы уже проверили стихотворение 
             if poem_found:
-                return True, "Стихотворение найдено и соответствует требованиям. Акростих 'ИСКРА' присутствует."
-            return False, "Произошла ошибка при проверке вашего решения. Пожалуйста, попробуйте позже."
+                return True, "Стихотворение найдено и соответствует требованиям. Акростих 'ИСКРА' присутствует.", False
+            return False, "Произошла ошибка при проверке вашего решения. Пожалуйста, попробуйте позже.", False
         
         # Log the full response for debugging
-        logger.info(f"API response for poem task: {response.text}")
+        logger.info(f"API response for poem task: {response_text}")
         
-        # Parse the JSON response
-        try:
-            # First try to parse it as a direct JSON
-            result = response.json()
-            
-            # Check if result contains outer structure with 'output'
-            if isinstance(result, dict) and 'output' in result:
-                # Try to parse the output field as JSON
-                try:
-                    inner_result = json.loads(result['output'])
-                    # Use inner result
-                    result = inner_result
-                except json.JSONDecodeError:
-                    # If output is not valid JSON, check if it's a string containing JSON
-                    output_str = result['output']
-                    json_match = re.search(r'({.*?"passed".*?})', output_str, re.DOTALL)
-                    if json_match:
-                        try:
-                            result = json.loads(json_match.group(1))
-                        except json.JSONDecodeError:
-                            # Fallback to simple extraction of passed/feedback
-                            passed = 'true' in output_str.lower() and 'passed' in output_str.lower()
-                            feedback = output_str
-                            return passed, feedback
-            
-            # Now extract passed and feedback
-            if isinstance(result, dict):
-                passed = result.get("passed", False)
-                feedback = result.get("feedback", "Нет обратной связи")
-                # Если API говорит "не прошел", но мы уже проверили стихотворение 
-                if not passed and poem_found:
-                    logger.info("API says test failed but poem was found locally, overriding result")
-                    return True, "Стихотворение прошло проверку. Акростих 'ИСКРА' присутствует. " + feedback
-                return passed, feedback
-            else:
-                # If result is not a dict, treat as string and check for 'passed'
-                result_str = str(result)
-                passed = 'true' in result_str.lower() and 'passed' in result_str.lower()
-                if not passed and poem_found:
-                    logger.info("API says test failed but poem was found locally, overriding result")
-                    return True, "Стихотворение прошло проверку. Акростих 'ИСКРА' присутствует."
-                return passed, result_str
-                
-        except json.JSONDecodeError:
-            # If JSON parsing fails, try to extract passed/feedback using regex
-            response_text = response.text
-            json_match = re.search(r'({.*?"passed".*?})', response_text, re.DOTALL)
-            if json_match:
-                try:
-                    extracted = json.loads(json_match.group(1))
-                    passed = extracted.get("passed", False)
-                    feedback = extracted.get("feedback", "Нет обратной связи")
-                    if not passed and poem_found:
-                        logger.info("API says test failed but poem was found locally, overriding result")
-                        return True, "Стихотворение прошло проверку. Акростих 'ИСКРА' присутствует. " + feedback
-                    return passed, feedback
-                except json.JSONDecodeError:
-                    pass
-                    
-            # As a fallback, check if response contains "passed" and "true"
+        result, parsed = ai_responses.parse("poem_verify", response_text)
+        if result is not None:
+            passed = result["passed"]
+            feedback = result["feedback"] or "Нет обратной связи"
+        else:
+            # Ответ не по схеме: ищем в тексте признак успешной проверки
             passed = 'true' in response_text.lower() and 'passed' in response_text.lower()
-            if not passed and poem_found:
-                logger.info("API says test failed but poem was found locally, overriding result")
-                return True, "Стихотворение прошло проверку. Акростих 'ИСКРА' присутствует."
-            return passed, response_text
+            feedback = response_text
+        
+        # Если API говорит "не прошел", но мы уже проверили стихотворение 
+        if not passed and poem_found:
+            logger.info("API says test failed but poem was found locally, overriding result")
+            if result is not None:
+                return True, "Стихотворение прошло проверку. Акростих 'ИСКРА' присутствует. " + feedback, True
+            return True, "Стихотворение прошло проверку. Акростих 'ИСКРА' присутствует.", False
+        return passed, feedback, parsed
     
     except Exception as e:
-        logger.error(f"Error verifying poem task: {e}")
+        logger.error(f"Error verifying poem task: {e!r}")
+        degraded_gradings.inc(label="poem_verify")
         # Если произошла ошибка, но мы уже проверили стихотворение 
         if poem_found:
-            return True, "Стихотворение найдено и соответствует требованиям. Акростих 'ИСКРА' присутствует."
-        return False, "Произошла ошибка при проверке вашего решения. Пожалуйста, попробуйте позже."
+            return True, "Стихотворение найдено и соответствует требованиям. Акростих 'ИСКРА' присутствует.", False
+        return False, "Произошла ошибка при проверке вашего решения. Пожалуйста, попробуйте позже.", False
 
 # Load API key on module import
 load_api_key()
@@ -6,83 +6,45 @@ import requests
 from dotenv import load_dotenv
 import re
 import random
+import threading
+import time
+
+import database
+from utils import materials
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Как долго словарь стоп-слов считается свежим и через сколько повторять неудачное обновление (в секундах)
+STOPWORDS_CACHE_TTL = float(os.getenv("STOPWORDS_CACHE_TTL", "3600"))
+STOPWORDS_RETRY_INTERVAL = float(os.getenv("STOPWORDS_RETRY_INTERVAL", "60"))
+# Имя снимка словаря в таблице snapshots
+STOPWORDS_SNAPSHOT = "stopwords"
+
+_stopwords = None
+_stopwords_fetched_at = 0.0
+_stopwords_lock = threading.Lock()
+_stopwords_thread = None
+_stopwords_started = False
+
 def load_text_content(filename):
     """Load text content from a file in the materials folder"""
-    try:
-        with open(Path('materials') / filename, 'r', encoding='utf-8') as file:
-            return file.read()
-    except Exception as e:
-        logger.error(f"Error loading text content from {filename}: {e}")
+    content = materials.get_text(filename)
+    if content is None:
+        logger.error(f"Error loading text content from {filename}: file not found in materials")
         return f"Error loading content from {filename}. Please contact the administrator."
+    return content
 
 def load_test_questions(filename):
     """Load test questions from a JSON file in the materials folder"""
-    try:
-        with open(Path('materials') / filename, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-            # Convert from JSON format to expected format in code
-            if isinstance(data, dict) and "questions" in data:
-                questions = []
-                for q in data["questions"]:
-                    question_data = {
-                        "question": q["question"],
-                        "options": q.get("options", q.get("answers", []))
-                    }
-                    
-                    # Handle different format of correct answer field
-                    if "correct_answer" in q:
-                        question_data["correct_answer"] = q["correct_answer"]
-                    elif "correct_option" in q:
-                        question_data["correct_option"] = q["correct_option"]
-                    elif "correct_index" in q:
-                        question_data["correct_answer"] = q["correct_index"]
-                    else:
-                        question_data["correct_answer"] = 0
-                        
-                    questions.append(question_data)
-                
-                # Сохраняем информацию о времени, если она есть
-                result = {
-                    "questions": questions,
-                    "time_limit": data.get("time_limit", None)  # Время в секундах
-                }
-                return result
-            elif isinstance(data, list):
-                # For list format (like interview_prep_test.json)
-                # Keep original structure but ensure consistent format
-                processed_questions = []
-                for q in data:
-                    question_data = {
-                        "question": q["question"],
-                        "options": q.get("options", q.get("answers", []))
-                    }
-                    
-                    # Handle different format of correct answer field
-                    if "correct_answer" in q:
-                        question_data["correct_answer"] = q["correct_answer"]
-                    elif "correct_option" in q:
-                        question_data["correct_option"] = q["correct_option"]
-                    elif "correct_index" in q:
-                        question_data["correct_answer"] = q["correct_index"]
-                    else:
-                        question_data["correct_answer"] = 0
-                        
-                    processed_questions.append(question_data)
-                
-                return {"questions": processed_questions, "time_limit": None}
-            
-            return data
-    except Exception as e:
-        logger.error(f"Error loading test questions from {filename}: {e}")
-        return None
+    test_data = materials.get_test(filename)
+    if test_data is None:
+        logger.error(f"Error loading test questions from {filename}: file not found in materials")
+    return test_data
 
-def get_stopwords_data():
-    """Получить данные о стоп-словах из Google Sheets"""
+def fetch_stopwords_data():
+    """Загрузить данные о стоп-словах из Google Sheets (без кэша)"""
     try:
         api_url = os.getenv("API_KEY")
         sheet_url = os.getenv("STOPWORDS_SHEET_URL")
@@ -156,6 +118,91 @@ def get_stopwords_data():
         logger.error(f"Ошибка при получении данных о стоп-словах: {e}")
         return []
 
+def _refresh_stopwords():
+    """Fetch the stopword dictionary; keep the previous copy if the sheet is unavailable"""
+    global _stopwords, _stopwords_fetched_at
+    stopwords_data = fetch_stopwords_data()
+    if not stopwords_data:
+        # Пустой ответ означает ошибку таблицы или API: продолжаем отдавать прошлую версию
+        logger.warning("Не удалось обновить стоп-слова, используется сохраненная версия")
+        return False
+    
+    with _stopwords_lock:
+        _stopwords = stopwords_data
+        _stopwords_fetched_at = time.monotonic()
+    
+    try:
+        database.save_snapshot(STOPWORDS_SNAPSHOT, stopwords_data)
+    except Exception as e:
+        logger.error(f"Не удалось сохранить снимок стоп-слов: {e}")
+    return True
+
+def _load_stopwords_snapshot():
+    """Load the last good dictionary saved in the database (cold start without the sheet)"""
+    global _stopwords, _stopwords_fetched_at
+    try:
+        snapshot = database.get_snapshot(STOPWORDS_SNAPSHOT)
+    except Exception as e:
+        logger.error(f"Не удалось загрузить снимок стоп-слов: {e}")
+        return
+    if not snapshot or not snapshot[0]:
+        return
+    
+    data, age = snapshot
+    with _stopwords_lock:
+        if _stopwords is None:
+            _stopwords = data
+            _stopwords_fetched_at = time.monotonic() - age
+    logger.info(f"Загружен сохраненный снимок стоп-слов ({len(data)} шт., возраст {int(age)} с)")
+
+def _stopwords_refresher(initial_delay=0):
+    """Refresh the dictionary every STOPWORDS_CACHE_TTL seconds, retrying sooner after failures"""
+    time.sleep(initial_delay)
+    while True:
+        with _stopwords_lock:
+            age = time.monotonic() - _stopwords_fetched_at if _stopwords is not None else None
+        
+        if age is None or age >= STOPWORDS_CACHE_TTL:
+            delay = STOPWORDS_CACHE_TTL if _refresh_stopwords() else STOPWORDS_RETRY_INTERVAL
+        else:
+            delay = STOPWORDS_CACHE_TTL - age
+        time.sleep(delay)
+
+def start_stopwords_refresh():
+    """Load the saved snapshot (or the sheet on a cold start) and start the background refresh thread
+
+    Returns True if this call started the thread.
+    """
+    global _stopwords_started, _stopwords_thread
+    with _stopwords_lock:
+        if _stopwords_started:
+            return False
+        _stopwords_started = True
+    _load_stopwords_snapshot()
+    initial_delay = 0
+    if _stopwords is None:
+        # Холодный старт без снимка: первая загрузка здесь, а поток начинает с паузы и не загружает таблицу второй раз
+        initial_delay = 0 if _refresh_stopwords() else STOPWORDS_RETRY_INTERVAL
+    _stopwords_thread = threading.Thread(
+        target=_stopwords_refresher, args=(initial_delay,), name="stopwords-refresh", daemon=True
+    )
+    _stopwords_thread.start()
+    return True
+
+def get_stopwords_data():
+    """Получить данные о стоп-словах (из кэша, обновляемого в фоне)"""
+    started = start_stopwords_refresh()
+    
+    # Если обновление только что запущено, первая загрузка уже была выполнена в start_stopwords_refresh
+    if _stopwords is None and not started:
+        # Холодный старт без снимка в базе: ждем первую загрузку из таблицы
+        _refresh_stopwords()
+    
+    with _stopwords_lock:
+        stopwords_data = _stopwords or []
+    # Копия: обработчики перемешивают и дополняют полученный список
+    return [dict(entry) for entry in stopwords_data]
+
 def get_all_stopwords():
     """Получить список всех стоп-слов для проверки"""
     try:
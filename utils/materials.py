@@ -0,0 +1,157 @@
+"""
+Реестр материалов из папки materials.
+
+Тексты (.txt) и тесты (.json) читаются и нормализуются один раз и хранятся
+в снимке в памяти. Фоновый поток раз в MATERIALS_RELOAD_INTERVAL секунд
+сравнивает время изменения и размер файлов и при изменениях собирает новый
+снимок, который подменяется целиком - обработчики всегда видят согласованный
+набор материалов без перезапуска ботов.
+"""
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+MATERIALS_DIR = Path(os.getenv("MATERIALS_DIR", "materials"))
+# Период проверки файлов на изменения (0 - не следить за изменениями)
+MATERIALS_RELOAD_INTERVAL = float(os.getenv("MATERIALS_RELOAD_INTERVAL", "5"))
+
+# Текущий снимок: {"signature": {...}, "texts": {...}, "tests": {...}}
+_snapshot = None
+_load_lock = threading.Lock()
+_watcher_thread = None
+_watcher_stop = threading.Event()
+
+def _normalize_question(q):
+    """Bring a question to the format used by the handlers"""
+    question_data = {
+        "question": q["question"],
+        "options": q.get("options", q.get("answers", []))
+    }
+
+    # Handle different format of correct answer field
+    if "correct_answer" in q:
+        question_data["correct_answer"] = q["correct_answer"]
+    elif "correct_option" in q:
+        question_data["correct_option"] = q["correct_option"]
+    elif "correct_index" in q:
+        question_data["correct_answer"] = q["correct_index"]
+    else:
+        question_data["correct_answer"] = 0
+
+    return question_data
+
+def normalize_test(data):
+    """Convert a parsed test file to the {"questions", "time_limit"} format"""
+    if isinstance(data, dict) and "questions" in data:
+        return {
+            "questions": [_normalize_question(q) for q in data["questions"]],
+            "time_limit": data.get("time_limit", None)  # Время в секундах
+        }
+    if isinstance(data, list):
+        # For list format (like interview_prep_test.json)
+        return {"questions": [_normalize_question(q) for q in data], "time_limit": None}
+    # Остальные файлы (например, опрос) используются как есть
+    return data
+
+def _scan():
+    """Return {filename: (mtime_ns, size)} for text and test files"""
+    signature = {}
+    try:
+        entries = list(os.scandir(MATERIALS_DIR))
+    except OSError as e:
+        logger.error(f"Error scanning materials directory {MATERIALS_DIR}: {e}")
+        return signature
+    for entry in entries:
+        if entry.is_file() and entry.name.endswith((".txt", ".json")):
+            stat = entry.stat()
+            signature[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return signature
+
+def _build_snapshot(signature, previous):
+    """Read changed files and build a new snapshot, reusing unchanged entries"""
+    texts = {}
+    tests = {}
+    signature = dict(signature)
+    for name, file_signature in list(signature.items()):
+        target = texts if name.endswith(".txt") else tests
+        if previous and previous["signature"].get(name) == file_signature:
+            source = previous["texts"] if target is texts else previous["tests"]
+            if name in source:
+                target[name] = source[name]
+                continue
+        try:
+            with open(MATERIALS_DIR / name, 'r', encoding='utf-8') as file:
+                if target is texts:
+                    texts[name] = file.read()
+                else:
+                    tests[name] = normalize_test(json.load(file))
+        except Exception as e:
+            # Файл могли сохранить не до конца - оставляем прошлую версию до следующей проверки
+            logger.error(f"Error loading material {name}: {e}")
+            if previous:
+                source = previous["texts"] if target is texts else previous["tests"]
+                if name in source:
+                    target[name] = source[name]
+            # Сбрасываем подпись, чтобы файл перечитался при следующей проверке
+            signature[name] = None
+    return {"signature": signature, "texts": texts, "tests": tests}
+
+def reload():
+    """Re-read the materials directory if anything changed; return True if the snapshot was replaced"""
+    global _snapshot
+    with _load_lock:
+        signature = _scan()
+        if _snapshot is not None and _snapshot["signature"] == signature:
+            return False
+        _snapshot = _build_snapshot(signature, _snapshot)
+        logger.info(f"Loaded materials: {len(_snapshot['texts'])} texts, {len(_snapshot['tests'])} tests")
+        return True
+
+def _get_snapshot():
+    """Return the current snapshot, loading it on first use"""
+    if _snapshot is None:
+        reload()
+    return _snapshot
+
+def get_text(filename):
+    """Return the text of a materials file or None if it is missing"""
+    return _get_snapshot()["texts"].get(filename)
+
+def get_test(filename):
+    """Return a normalized test file or None if it is missing
+
+    The data is shared with the snapshot and must not be modified; a caller
+    that needs to change it has to copy it first.
+    """
+    # Обработчики только читают тест (в том числе из user_data), поэтому копия на каждый показ не нужна
+    return _get_snapshot()["tests"].get(filename)
+
+def _watch():
+    """Poll the materials directory until stopped"""
+    while not _watcher_stop.wait(MATERIALS_RELOAD_INTERVAL):
+        try:
+            reload()
+        except Exception as e:
+            logger.error(f"Error reloading materials: {e}")
+
+def start_watcher():
+    """Load materials and start the background reload thread"""
+    global _watcher_thread
+    reload()
+    if MATERIALS_RELOAD_INTERVAL <= 0 or _watcher_thread is not None:
+        return
+    _watcher_stop.clear()
+    _watcher_thread = threading.Thread(target=_watch, name="materials-watcher", daemon=True)
+    _watcher_thread.start()
+
+def stop_watcher():
+    """Stop the background reload thread"""
+    global _watcher_thread
+    _watcher_stop.set()
+    if _watcher_thread is not None:
+        _watcher_thread.join(timeout=5)
+        _watcher_thread = None
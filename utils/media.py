@@ -0,0 +1,97 @@
+"""
+Отправка больших файлов из materials через кэш file_id Telegram.
+
+Файл загружается в Telegram один раз, возвращенный file_id сохраняется в базе
+по хэшу содержимого, и дальше файл отправляется по file_id без повторной
+загрузки. После изменения файла меняется хэш, и файл загружается заново.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+
+from telegram.error import BadRequest
+
+import database_async as db
+
+logger = logging.getLogger(__name__)
+
+# path -> (mtime_ns, size, sha256): хэш пересчитывается только после изменения файла
+_hashes = {}
+# (bot_id, sha256) -> file_id
+_file_ids = {}
+# Фрагменты ошибок Telegram, означающих, что сохраненный file_id больше не действителен
+_STALE_FILE_ID_ERRORS = ("wrong file identifier", "file reference expired", "wrong remote file identifier")
+# Блокировки не дают загрузить один и тот же файл несколько раз при одновременных запросах
+_upload_locks = {}
+
+def _file_hash(path):
+    """Return the sha256 of a file, reusing the previous value while the file is unchanged"""
+    stat = os.stat(path)
+    cached = _hashes.get(path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    content_hash = digest.hexdigest()
+    _hashes[path] = (stat.st_mtime_ns, stat.st_size, content_hash)
+    return content_hash
+
+async def _get_file_id(bot_id, content_hash):
+    """Look up a file_id in memory, then in the database"""
+    file_id = _file_ids.get((bot_id, content_hash))
+    if file_id is None:
+        file_id = await db.get_media_file_id(bot_id, content_hash)
+        if file_id is not None:
+            _file_ids[(bot_id, content_hash)] = file_id
+    return file_id
+
+async def _forget_file_id(bot_id, content_hash):
+    """Drop a file_id that Telegram rejected"""
+    _file_ids.pop((bot_id, content_hash), None)
+    await db.delete_media_file_id(bot_id, content_hash)
+
+async def _send(bot, kind, chat_id, media, **kwargs):
+    """Send a video or a document and return the message and its file_id"""
+    if kind == "video":
+        message = await bot.send_video(chat_id=chat_id, video=media, **kwargs)
+        return message, message.video.file_id if message.video else None
+    message = await bot.send_document(chat_id=chat_id, document=media, **kwargs)
+    return message, message.document.file_id if message.document else None
+
+async def send_cached_media(bot, chat_id, path, kind="document", **kwargs):
+    """Send a file from disk as a video or document, uploading it only once per content"""
+    content_hash = await asyncio.to_thread(_file_hash, path)
+    key = (bot.id, content_hash)
+
+    file_id = await _get_file_id(*key)
+    if file_id is not None:
+        try:
+            message, _ = await _send(bot, kind, chat_id, file_id, **kwargs)
+            return message
+        except BadRequest as e:
+            # Остальные ошибки ("chat not found" и т.п.) к файлу не относятся, повторная загрузка не поможет
+            if not any(fragment in str(e).lower() for fragment in _STALE_FILE_ID_ERRORS):
+                raise
+            # file_id стал недействительным - загружаем файл заново
+            logger.warning(f"Cached file_id for {path} was rejected, uploading again: {e}")
+            await _forget_file_id(*key)
+
+    lock = _upload_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        # Пока ждали блокировку, файл мог загрузить другой обработчик
+        file_id = _file_ids.get(key)
+        if file_id is not None:
+            message, _ = await _send(bot, kind, chat_id, file_id, **kwargs)
+            return message
+
+        with open(path, 'rb') as file:
+            message, file_id = await _send(bot, kind, chat_id, file, **kwargs)
+
+        if file_id:
+            _file_ids[key] = file_id
+            await db.save_media_file_id(bot.id, content_hash, os.path.basename(path), file_id)
+            logger.info(f"Uploaded {path} to Telegram, cached file_id for future sends")
+        return message
@@ -0,0 +1,152 @@
+"""
+Простые метрики в памяти процесса: счетчики, гистограммы и текущие значения.
+
+Значения периодически пишутся в лог (см. log_metrics), чтобы по логам pm2 было
+видно задержки внешних API и работу кэшей без отдельной системы мониторинга.
+"""
+import bisect
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Как часто писать метрики в лог (в секундах, 0 - не писать)
+METRICS_LOG_INTERVAL = float(os.getenv("METRICS_LOG_INTERVAL", "300"))
+
+# Границы корзин гистограмм задержек в секундах
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 15, 30, 60)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+def _register(metric):
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+class Counter:
+    """Monotonic counter with an optional label"""
+
+    def __init__(self, name, description=""):
+        self.name = name
+        self.description = description
+        self._values = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def inc(self, amount=1, label=""):
+        with self._lock:
+            self._values[label] = self._values.get(label, 0) + amount
+
+    def value(self, label=""):
+        with self._lock:
+            return self._values.get(label, 0)
+
+    def render(self):
+        with self._lock:
+            return [f"{self.name}{_label(label)} {value}" for label, value in sorted(self._values.items())]
+
+class Gauge:
+    """Value that can go up and down, e.g. queue length"""
+
+    def __init__(self, name, description=""):
+        self.name = name
+        self.description = description
+        self._values = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def set(self, value, label=""):
+        with self._lock:
+            self._values[label] = value
+
+    def inc(self, amount=1, label=""):
+        with self._lock:
+            self._values[label] = self._values.get(label, 0) + amount
+
+    def dec(self, amount=1, label=""):
+        self.inc(-amount, label)
+
+    def value(self, label=""):
+        with self._lock:
+            return self._values.get(label, 0)
+
+    def render(self):
+        with self._lock:
+            return [f"{self.name}{_label(label)} {value}" for label, value in sorted(self._values.items())]
+
+class Histogram:
+    """Bucketed distribution of observed values (latencies in seconds)"""
+
+    def __init__(self, name, description="", buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        # label -> [счетчики по корзинам (+ последняя для значений больше всех границ), количество, сумма]
+        self._values = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def observe(self, value, label=""):
+        with self._lock:
+            entry = self._values.get(label)
+            if entry is None:
+                entry = self._values[label] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += 1
+            entry[2] += value
+
+    def count(self, label=""):
+        with self._lock:
+            entry = self._values.get(label)
+            return entry[1] if entry else 0
+
+    def quantile(self, q, label=""):
+        """Estimate a quantile as the upper bound of the bucket it falls into"""
+        with self._lock:
+            entry = self._values.get(label)
+            if not entry or not entry[1]:
+                return None
+            rank = q * entry[1]
+            seen = 0
+            for i, bucket_count in enumerate(entry[0]):
+                seen += bucket_count
+                if seen >= rank:
+                    return self.buckets[i] if i < len(self.buckets) else float("inf")
+            return float("inf")
+
+    def render(self):
+        with self._lock:
+            labels = sorted(self._values)
+        lines = []
+        for label in labels:
+            with self._lock:
+                _, count, total = self._values[label]
+            lines.append(
+                f"{self.name}{_label(label)} count={count} avg={total / count:.3f}s "
+                f"p50<={self.quantile(0.5, label)}s p95<={self.quantile(0.95, label)}s"
+            )
+        return lines
+
+def _label(label):
+    return f"{{{label}}}" if label else ""
+
+def render():
+    """Return all metrics as text lines"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return lines
+
+def log_metrics():
+    """Write all non-empty metrics to the log"""
+    lines = render()
+    if lines:
+        logger.info("Metrics:\n" + "\n".join(lines))
+
+async def log_metrics_job(context):
+    """Job queue callback that logs metrics periodically"""
+    log_metrics()
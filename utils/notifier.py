@@ -0,0 +1,350 @@
+"""
+Уведомления между ботами кандидатов и рекрутеров.
+
+Каждый процесс держит по одному долгоживущему клиенту (ExtBot) на токен
+бота: соединения к api.telegram.org переиспользуются, а отправка проходит
+через OutboundRateLimiter, как и у самих приложений. Бот своего
+приложения регистрируется в post_init (register), поэтому, например,
+процесс кандидатов отправляет кандидатам через application.bot, а
+рекрутерам - через отдельный клиент бота рекрутеров, который создается
+при первом уведомлении и закрывается в post_shutdown (close). Лимиты
+частоты такого клиента не делятся с процессом, которому принадлежит токен
+(см. utils/rate_limiter.py).
+
+Уведомления нескольким получателям (fan_out) сначала записываются в таблицу
+notification_deliveries - по строке на получателя, - а затем отправляются в
+фоне параллельно (не более NOTIFY_CONCURRENCY одновременно), так что
+обработчик кандидата не ждет отправки.
+
+Эта же таблица служит исходящей очередью (outbox): уведомления кандидату о
+решении рекрутера записываются в той же транзакции, что и само решение
+(update_test_submission/update_interview_request с notification=...).
+Диспетчер (dispatch_job, kick) пачками забирает из нее готовые к отправке
+строки - и новые, и неудачные попытки, - отправляет и помечает их. Строка
+помечается отправленной только один раз; при падении процесса между
+отправкой и отметкой сообщение может прийти повторно, но не потеряется.
+"""
+import asyncio
+import logging
+import os
+import re
+
+from telegram.error import BadRequest, Forbidden
+from telegram.ext import ExtBot
+from telegram.helpers import escape_markdown
+
+import database_async as db
+from config import CANDIDATE_BOT_TOKEN, RECRUITER_BOT_TOKEN
+from utils.metrics import Counter, Gauge, Histogram
+from utils.rate_limiter import NOTIFICATION, OutboundRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Сколько уведомлений отправлять одновременно
+NOTIFY_CONCURRENCY = int(os.getenv("NOTIFY_CONCURRENCY", "5"))
+# Задержка перед первым повтором (удваивается с каждой попыткой) и число попыток
+NOTIFY_RETRY_DELAY = float(os.getenv("NOTIFY_RETRY_DELAY", "60"))
+NOTIFY_MAX_RETRY_DELAY = float(os.getenv("NOTIFY_MAX_RETRY_DELAY", "3600"))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "8"))
+# Как часто диспетчер проверяет очередь (в секундах), размер пачки и число пачек за один проход
+NOTIFY_DISPATCH_INTERVAL = float(os.getenv("NOTIFY_DISPATCH_INTERVAL", "5"))
+NOTIFY_DISPATCH_BATCH = int(os.getenv("NOTIFY_DISPATCH_BATCH", "50"))
+NOTIFY_DISPATCH_MAX_BATCHES = int(os.getenv("NOTIFY_DISPATCH_MAX_BATCHES", "20"))
+# Сколько ждать незавершенные отправки при остановке; оставшиеся будут повторены после перезапуска
+NOTIFY_SHUTDOWN_TIMEOUT = float(os.getenv("NOTIFY_SHUTDOWN_TIMEOUT", "5"))
+
+deliveries_total = Counter("notification_deliveries_total", "Notification delivery attempts by outcome")
+delivery_latency = Histogram("notification_delivery_seconds", "Time to send one notification by bot")
+dispatch_batch_size = Histogram(
+    "notification_dispatch_batch_size", "Deliveries taken from the outbox per batch", buckets=(1, 5, 10, 25, 50, 100)
+)
+dispatch_seconds = Histogram("notification_dispatch_seconds", "Time to send one outbox batch")
+outbox_pending = Gauge("notification_outbox_pending", "Notification deliveries not sent yet")
+
+CANDIDATE = "candidate"
+RECRUITER = "recruiter"
+_TOKENS = {CANDIDATE: CANDIDATE_BOT_TOKEN, RECRUITER: RECRUITER_BOT_TOKEN}
+
+# name -> бот; в _owned - созданные здесь клиенты, которые нужно закрыть
+_bots = {}
+_owned = set()
+_lock = None
+_semaphore = None
+# Фоновые задачи рассылки, чтобы их не собрал сборщик мусора и можно было дождаться при остановке
+_tasks = set()
+# Отправляемые сейчас доставки: их аренда (next_attempt_at) продлевается, пока отправка не закончится
+_in_flight = set()
+_lease_task = None
+# Текущий проход диспетчера и признак, что за время прохода в очередь добавили новые строки
+_drain_task = None
+_drain_again = False
+
+def register(name, bot):
+    """Use an application's own (already initialized) bot for notifications sent with its token"""
+    _bots[name] = bot
+
+async def get_bot(name):
+    """Return the initialized bot for CANDIDATE or RECRUITER, creating the client once"""
+    global _lock
+    bot = _bots.get(name)
+    if bot is not None:
+        return bot
+    if _lock is None:
+        _lock = asyncio.Lock()
+    async with _lock:
+        bot = _bots.get(name)
+        if bot is None:
+            bot = ExtBot(token=_TOKENS[name], rate_limiter=OutboundRateLimiter())
+            await bot.initialize()
+            _bots[name] = bot
+            _owned.add(name)
+    return bot
+
+async def close():
+    """Shut down the clients created by the notifier (called from post_shutdown)"""
+    if _tasks:
+        done, pending = await asyncio.wait(set(_tasks), timeout=NOTIFY_SHUTDOWN_TIMEOUT)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"{len(pending)} notification fan-outs interrupted by shutdown, they will be retried")
+    if _lease_task is not None:
+        _lease_task.cancel()
+    for name in list(_owned):
+        try:
+            await _bots.pop(name).shutdown()
+        except Exception as e:
+            logger.error(f"Error shutting down {name} bot client: {e}")
+        _owned.discard(name)
+    _bots.clear()
+
+def _retry_delay(attempts):
+    return min(NOTIFY_MAX_RETRY_DELAY, NOTIFY_RETRY_DELAY * 2 ** attempts)
+
+# Символы, которые escape_markdown экранирует обратной косой чертой, для каждой разметки
+_ESCAPED_CHARS = {
+    "Markdown": re.compile(r"\\([_*`\[])"),
+    "MarkdownV2": re.compile(r"\\([_*\[\]()~`>#+\-=|{}.!\\])"),
+}
+
+def _plain_text(text, parse_mode):
+    """Undo escape_markdown so that the text can be sent without markup"""
+    pattern = _ESCAPED_CHARS.get(parse_mode)
+    return pattern.sub(r"\1", text) if pattern else text
+
+async def _send(bot, delivery):
+    try:
+        await bot.send_message(
+            chat_id=delivery['chat_id'],
+            text=delivery['text'],
+            parse_mode=delivery['parse_mode'],
+            rate_limit_args={"priority": NOTIFICATION}
+        )
+    except BadRequest as e:
+        # Ошибка разметки не должна стоить получателю уведомления - отправляем обычным текстом
+        if not delivery['parse_mode'] or "parse entities" not in str(e).lower():
+            raise
+        logger.warning(f"Notification {delivery['id']} has broken {delivery['parse_mode']} markup, sending as plain text: {e}")
+        await bot.send_message(
+            chat_id=delivery['chat_id'],
+            text=_plain_text(delivery['text'], delivery['parse_mode']),
+            rate_limit_args={"priority": NOTIFICATION}
+        )
+
+async def _deliver(delivery):
+    """Send one recorded delivery and store the outcome"""
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(NOTIFY_CONCURRENCY)
+    async with _semaphore:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            bot = await get_bot(delivery['bot'])
+            await _send(bot, delivery)
+        except (Forbidden, BadRequest) as e:
+            # Бот заблокирован или чат недоступен - повтор не поможет
+            deliveries_total.inc(label="failed")
+            logger.error(f"Notification {delivery['kind']} to {delivery['chat_id']} rejected: {e}")
+            await db.mark_delivery_failed(delivery['id'], e, 0, 0)
+            return False
+        except Exception as e:
+            attempts = delivery.get('attempts', 0)
+            status = await db.mark_delivery_failed(delivery['id'], e, _retry_delay(attempts), NOTIFY_MAX_ATTEMPTS)
+            deliveries_total.inc(label="failed" if status == "failed" else "retry")
+            logger.error(f"Error sending {delivery['kind']} notification to {delivery['chat_id']} (attempt {attempts + 1}): {e}")
+            return False
+        delivery_latency.observe(loop.time() - started, label=delivery['bot'])
+        deliveries_total.inc(label="sent")
+        if not await db.mark_delivery_sent(delivery['id']):
+            logger.warning(f"Notification delivery {delivery['id']} was already finished by another worker")
+        return True
+
+async def _renew_leases():
+    """Keep in-flight deliveries leased so that dispatch_job does not send them a second time"""
+    while _in_flight:
+        await asyncio.sleep(NOTIFY_RETRY_DELAY / 3)
+        if not _in_flight:
+            return
+        try:
+            await db.extend_delivery_leases(list(_in_flight), NOTIFY_RETRY_DELAY)
+        except Exception as e:
+            logger.error(f"Error extending leases of {len(_in_flight)} notification deliveries: {e}")
+
+async def _deliver_all(deliveries):
+    global _lease_task
+    # Строки, которые этот процесс уже отправляет (например, fan_out), второй раз не берем
+    deliveries = [delivery for delivery in deliveries if delivery['id'] not in _in_flight]
+    ids = [delivery['id'] for delivery in deliveries]
+    _in_flight.update(ids)
+    if _lease_task is None or _lease_task.done():
+        _lease_task = asyncio.create_task(_renew_leases())
+    try:
+        results = await asyncio.gather(*(_deliver(delivery) for delivery in deliveries), return_exceptions=True)
+    finally:
+        _in_flight.difference_update(ids)
+    sent = sum(1 for result in results if result is True)
+    if deliveries:
+        logger.info(f"Notification {deliveries[0]['kind']} ({deliveries[0]['ref_id']}) sent to {sent}/{len(deliveries)} recipients")
+
+def _spawn(coro):
+    task = asyncio.create_task(coro)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+async def fan_out(bot_name, kind, ref_id, chat_ids, text, parse_mode=None):
+    """Record a delivery per recipient and send them in the background; returns the number recorded
+
+    The caller does not wait for Telegram: deliveries that fail (or are cut off by a
+    restart) stay pending in the database and are retried by dispatch_job.
+    """
+    chat_ids = list(dict.fromkeys(chat_ids))
+    # Строки сразу арендованы на NOTIFY_RETRY_DELAY (аренда продлевается, пока идет отправка),
+    # чтобы dispatch_job не отправил уведомление второй раз
+    ids = await db.create_deliveries(bot_name, kind, ref_id, chat_ids, text, parse_mode, NOTIFY_RETRY_DELAY)
+    deliveries = [
+        {'id': delivery_id, 'bot': bot_name, 'chat_id': chat_id, 'kind': kind,
+         'ref_id': ref_id, 'text': text, 'parse_mode': parse_mode, 'attempts': 0}
+        for delivery_id, chat_id in zip(ids, chat_ids)
+    ]
+    if deliveries:
+        _spawn(_deliver_all(deliveries))
+    return len(deliveries)
+
+async def _drain():
+    """Send due outbox rows batch by batch until the outbox is empty"""
+    global _drain_again
+    loop = asyncio.get_running_loop()
+    while True:
+        _drain_again = False
+        for _ in range(NOTIFY_DISPATCH_MAX_BATCHES):
+            try:
+                # Забранные строки откладываются на NOTIFY_RETRY_DELAY, чтобы их не взял другой процесс
+                deliveries = await db.claim_due_deliveries(NOTIFY_DISPATCH_BATCH, NOTIFY_RETRY_DELAY)
+            except Exception as e:
+                logger.error(f"Error loading notification outbox: {e}")
+                return
+            if not deliveries:
+                break
+            dispatch_batch_size.observe(len(deliveries))
+            started = loop.time()
+            await _deliver_all(deliveries)
+            dispatch_seconds.observe(loop.time() - started)
+            if len(deliveries) < NOTIFY_DISPATCH_BATCH:
+                break
+        if not _drain_again:
+            return
+
+def kick():
+    """Start sending due outbox rows now instead of waiting for the next dispatch_job run"""
+    global _drain_task, _drain_again
+    if _drain_task is not None and not _drain_task.done():
+        # Текущий проход сделает еще один круг и заберет новые строки
+        _drain_again = True
+        return
+    _drain_task = _spawn(_drain())
+
+async def dispatch_job(context):
+    """Drain the notification outbox, including retries of failed deliveries (run from the job queue)"""
+    kick()
+    try:
+        outbox_pending.set(await db.count_pending_deliveries())
+    except Exception as e:
+        logger.error(f"Error counting pending notifications: {e}")
+
+async def handle_interview_request(user_id, preferred_day, preferred_time):
+    """Handle a new interview request and notify the recruiter"""
+    # Save the interview request
+    request_id = await db.save_interview_request(user_id, preferred_day, preferred_time)
+
+    # Get user info for notification
+    user_info = await db.get_user_info_with_interview_details(user_id, preferred_day, preferred_time)
+
+    if user_info and request_id:
+        try:
+            # Get display info
+            display_name = escape_markdown(user_info.get('display_name', f"Пользователь {user_id}"))
+            username_display = f" (@{escape_markdown(user_info['username'])})" if user_info.get('username') else ""
+
+            # Format notification message
+            notification = (
+                f"📣 *Новый запрос на собеседование!*\n\n"
+                f"👤 Кандидат: {display_name}{username_display}\n"
+                f"📅 Предпочтительный день: {escape_markdown(str(user_info['preferred_day']))}\n"
+                f"⏰ Предпочтительное время: {escape_markdown(str(user_info['preferred_time']))}\n\n"
+                f"Используйте меню 'Запросы на собеседование' для управления."
+            )
+
+            # Get all recruiters; notifications are sent to them in the background
+            recruiters = await db.get_all_recruiters()
+
+            if recruiters:
+                await fan_out(
+                    RECRUITER, "interview_request", request_id,
+                    [recruiter['user_id'] for recruiter in recruiters],
+                    notification, parse_mode='Markdown'
+                )
+            else:
+                logger.warning("No recruiters found, could not send notification")
+
+        except Exception as e:
+            logger.error(f"Error queueing interview notification: {e}")
+
+    return request_id
+
+def test_feedback_notification(status, feedback):
+    """Build the outbox notification about the recruiter's review of a test submission"""
+    # Decide on message based on status
+    if status == "approved":
+        message = (
+            "🎉 *Ваше тестовое задание одобрено!*\n\n"
+            f"Отзыв рекрутера: {escape_markdown(feedback)}\n\n"
+            "Продолжайте работу с ботом для дальнейших шагов."
+        )
+    else:
+        message = (
+            "❗ *Ваше тестовое задание нуждается в доработке*\n\n"
+            f"Отзыв рекрутера: {escape_markdown(feedback)}\n\n"
+            "Ознакомьтесь с комментариями и повторите попытку."
+        )
+
+    return {'bot': CANDIDATE, 'text': message, 'parse_mode': 'Markdown'}
+
+def interview_response_notification(status, response):
+    """Build the outbox notification about the recruiter's answer to an interview request"""
+    # Decide on message based on status
+    if status == "approved":
+        message = (
+            "✅ *Ваш запрос на собеседование подтвержден!*\n\n"
+            f"Детали: {escape_markdown(response)}\n\n"
+            "Хорошей подготовки к собеседованию!"
+        )
+    else:
+        message = (
+            "❌ *Ваш запрос на собеседование требует корректировки*\n\n"
+            f"Ответ рекрутера: {escape_markdown(response)}\n\n"
+            "Пожалуйста, следуйте инструкциям выше."
+        )
+
+    return {'bot': CANDIDATE, 'text': message, 'parse_mode': 'Markdown'}
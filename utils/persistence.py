@@ -0,0 +1,255 @@
+"""
+Хранение user_data и состояний ConversationHandler в Postgres.
+
+pm2 перезапускает ботов при каждом изменении файлов, поэтому состояние,
+которое живет только в памяти (ход теста, текущий вопрос, время окончания,
+шаг диалога рекрутера), терялось при каждом деплое. PostgresPersistence
+подключается через ApplicationBuilder().persistence() и загружает это
+состояние при старте.
+
+Запись отложенная: PTB передает изменения не реже чем раз в
+PERSISTENCE_FLUSH_INTERVAL секунд, здесь они копятся по пользователям (у
+пользователя в буфере только последняя версия, неизмененные данные не
+пишутся) и записываются одной транзакцией - через PERSISTENCE_FLUSH_INTERVAL
+или сразу, как только изменились PERSISTENCE_FLUSH_CHANGES пользователей.
+При остановке приложения буфер записывается полностью (flush).
+
+Сохраняются только значения, которые переводятся в JSON; объекты Telegram
+(клавиатуры) и служебные флаги (_TRANSIENT_KEYS) пропускаются - после
+перезапуска они создаются заново. Таймеры тестов не сохраняются: время
+окончания хранится в test_end_time, и отсчет продолжается со следующего
+вопроса.
+"""
+import asyncio
+import enum
+import importlib
+import json
+import logging
+import os
+import time
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+import database_async as db
+from utils.metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Не реже какого интервала записывать изменения (в секундах) и после скольких измененных записей писать сразу
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv("PERSISTENCE_FLUSH_INTERVAL", "0.5"))
+PERSISTENCE_FLUSH_CHANGES = int(os.getenv("PERSISTENCE_FLUSH_CHANGES", "50"))
+
+# Флаг обработки ответа после перезапуска заблокировал бы кандидата, клавиатура - объект Telegram
+_TRANSIENT_KEYS = frozenset({"processing_answer", "current_question_keyboard"})
+
+persisted_changes = Counter("persistence_changes_total", "Changed user_data and conversation states written by kind")
+skipped_values = Counter("persistence_skipped_values_total", "user_data values not persisted because they are not JSON")
+flush_sizes = Histogram("persistence_flush_size", "Changes written per persistence flush", buckets=(1, 5, 10, 25, 50, 100, 250))
+flush_seconds = Histogram("persistence_flush_seconds", "Time to write one persistence flush")
+
+# Ключи user_data, о пропуске которых уже написано в лог
+_reported_keys = set()
+
+def _str_keys(value):
+    """Convert dict keys to strings the way JSON does, so that dicts with int and str keys can be sorted"""
+    if isinstance(value, dict):
+        return {key if isinstance(key, str) else json.dumps(key): _str_keys(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_str_keys(item) for item in value]
+    return value
+
+def _dump_user_data(data):
+    """Serialize user_data to JSON text, leaving out transient and non-JSON values"""
+    parts = []
+    for key in sorted(data, key=str):
+        if key in _TRANSIENT_KEYS:
+            continue
+        try:
+            parts.append(f"{json.dumps(str(key), ensure_ascii=False)}: {json.dumps(_str_keys(data[key]), ensure_ascii=False, sort_keys=True)}")
+        except (TypeError, ValueError) as e:
+            skipped_values.inc(label=str(key))
+            if key not in _reported_keys:
+                # Значение теряется при перезапуске - сообщаем один раз для каждого ключа
+                _reported_keys.add(key)
+                logger.warning(f"user_data['{key}'] is not persisted: {e}")
+    return "{" + ", ".join(parts) + "}"
+
+def _encode_state(state):
+    # Состояния диалогов бывают числами, строками и членами Enum (RecruiterStates)
+    if isinstance(state, enum.Enum):
+        return {"enum": f"{type(state).__module__}:{type(state).__qualname__}", "name": state.name}
+    return state
+
+def _decode_state(value):
+    if isinstance(value, dict) and "enum" in value:
+        module_name, _, class_name = value["enum"].partition(":")
+        enum_class = importlib.import_module(module_name)
+        for part in class_name.split("."):
+            enum_class = getattr(enum_class, part)
+        return enum_class[value["name"]]
+    return value
+
+class PostgresPersistence(BasePersistence):
+    """BasePersistence storing user_data and conversation states of one bot in Postgres
+
+    chat_data, bot_data and callback_data are not used by the bots and are not stored.
+    """
+
+    def __init__(self, namespace, flush_interval=PERSISTENCE_FLUSH_INTERVAL, flush_changes=PERSISTENCE_FLUSH_CHANGES):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=flush_interval
+        )
+        self.namespace = namespace
+        self.flush_interval = flush_interval
+        self.flush_changes = flush_changes
+        # Последняя записанная версия: user_id -> JSON, (name, key) -> JSON состояния
+        self._saved_users = {}
+        self._saved_conversations = {}
+        # Буфер изменений: user_id -> JSON или None (удалить), (name, key) -> JSON или None
+        self._dirty_users = {}
+        self._dirty_conversations = {}
+        self._timer = None
+        self._flush_lock = None
+        # Задачи записи, чтобы их не собрал сборщик мусора
+        self._tasks = set()
+
+    # --- загрузка при старте приложения ---
+
+    async def get_user_data(self):
+        rows = await db.load_persisted_user_data(self.namespace)
+        self._saved_users = {user_id: _dump_user_data(data) for user_id, data in rows.items()}
+        logger.info(f"Loaded persisted user_data of {len(rows)} users ({self.namespace})")
+        return rows
+
+    async def get_conversations(self, name):
+        conversations = {}
+        for key_text, state in await db.load_persisted_conversations(self.namespace, name):
+            try:
+                conversations[tuple(json.loads(key_text))] = _decode_state(state)
+            except (AttributeError, ImportError, KeyError, ValueError) as e:
+                logger.warning(f"Skipping persisted state of conversation {name} {key_text}: {e}")
+                continue
+            self._saved_conversations[(name, key_text)] = json.dumps(state, ensure_ascii=False, sort_keys=True)
+        return conversations
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    # --- изменения (копятся в буфере) ---
+
+    async def update_user_data(self, user_id, data):
+        text = _dump_user_data(data)
+        if self._dirty_users.get(user_id, self._saved_users.get(user_id)) == text:
+            return
+        self._dirty_users[user_id] = text
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id):
+        self._dirty_users[user_id] = None
+        self._schedule_flush()
+
+    async def update_conversation(self, name, key, new_state):
+        conversation_key = (name, json.dumps(list(key)))
+        text = None if new_state is None else json.dumps(_encode_state(new_state), ensure_ascii=False, sort_keys=True)
+        if self._dirty_conversations.get(conversation_key, self._saved_conversations.get(conversation_key)) == text:
+            return
+        self._dirty_conversations[conversation_key] = text
+        self._schedule_flush()
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    # --- запись ---
+
+    def _start_flush(self):
+        self._timer = None
+        task = asyncio.create_task(self._flush_safely())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _schedule_flush(self):
+        if len(self._dirty_users) + len(self._dirty_conversations) >= self.flush_changes:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._start_flush)
+
+    async def _flush_safely(self):
+        try:
+            await self._write()
+        except Exception as e:
+            logger.error(f"Error writing persisted state ({self.namespace}): {e}")
+
+    async def _write(self):
+        """Write buffered changes in one batch; on failure they stay buffered for the next flush"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            users, self._dirty_users = self._dirty_users, {}
+            conversations, self._dirty_conversations = self._dirty_conversations, {}
+            if not users and not conversations:
+                return
+            started = time.monotonic()
+            try:
+                if users:
+                    await db.save_persisted_user_data(self.namespace, list(users.items()))
+                if conversations:
+                    await db.save_persisted_conversations(
+                        self.namespace, [(name, key, state) for (name, key), state in conversations.items()]
+                    )
+            except Exception:
+                # Изменения, пришедшие во время записи, новее - их не перезаписываем
+                self._dirty_users = {**users, **self._dirty_users}
+                self._dirty_conversations = {**conversations, **self._dirty_conversations}
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._start_flush)
+                raise
+            for user_id, text in users.items():
+                if text is None:
+                    self._saved_users.pop(user_id, None)
+                else:
+                    self._saved_users[user_id] = text
+            for conversation_key, text in conversations.items():
+                if text is None:
+                    self._saved_conversations.pop(conversation_key, None)
+                else:
+                    self._saved_conversations[conversation_key] = text
+            flush_sizes.observe(len(users) + len(conversations))
+            flush_seconds.observe(time.monotonic() - started)
+            if users:
+                persisted_changes.inc(len(users), label="user_data")
+            if conversations:
+                persisted_changes.inc(len(conversations), label="conversation")
+
+    async def flush(self):
+        """Write everything still buffered (called by PTB when the application shuts down)"""
+        await self._flush_safely()
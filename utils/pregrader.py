@@ -0,0 +1,132 @@
+"""
+Локальная предварительная проверка ответов теста стоп-слов.
+
+Очевидные ошибки решаются без AI: ответ совпадает с исходным предложением или
+все еще содержит стоп-слово (с учетом регистра, ё и форм слова). Все остальные
+ответы (нужно оценить смысл и грамматику) отправляются на проверку AI.
+Локально ответ может быть только отклонен, засчитывает ответ всегда AI.
+
+Формы слова распознаются через pymorphy3: слово в ответе совпадает со
+стоп-словом, если у их наиболее вероятных разборов одна начальная форма
+("сделаю" - "сделать", но не "конечный" - "конечно"). Без pymorphy3 локально
+находятся только точные совпадения слов, остальные формы оценивает AI.
+"""
+import logging
+import os
+import re
+from functools import lru_cache
+
+from utils.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pymorphy3
+except ImportError:
+    pymorphy3 = None
+
+# Метка: local:<правило> - решено локально, ai - отправлено на проверку AI
+decisions = Counter("stopword_pregrader_total", "Stopword answers decided locally vs sent to AI")
+avoided_ratio = Gauge("stopword_pregrader_avoided_ratio", "Share of stopword answers decided without AI")
+
+# Слова короче этого сравниваются только целиком, иначе "как" совпадет с "каких"
+MIN_LEMMA_LENGTH = 4
+
+# Стоп-слова-категории ("Прилагательные") обозначают класс слов, а не слово - их оценивает только AI.
+# Дополнительные категории можно перечислить через запятую в STOPWORD_CATEGORIES
+_CATEGORIES = frozenset({
+    "прилагательные", "наречия", "глаголы", "существительные", "местоимения", "числительные",
+    "причастия", "деепричастия", "междометия", "частицы", "союзы", "предлоги",
+    "вводные слова", "слова-паразиты", "канцеляризмы", "англицизмы", "уменьшительно-ласкательные",
+}) | frozenset(
+    category.strip().lower().replace("ё", "е")
+    for category in os.getenv("STOPWORD_CATEGORIES", "").split(",") if category.strip()
+)
+
+_WORD_RE = re.compile(r"[a-zа-я0-9]+(?:-[a-zа-я0-9]+)*")
+
+_morph = None
+
+def _get_morph():
+    global _morph
+    if _morph is None and pymorphy3 is not None:
+        _morph = pymorphy3.MorphAnalyzer()
+    return _morph
+
+def tokenize(text):
+    """Lowercase the text, replace ё with е and split it into words without punctuation"""
+    return _WORD_RE.findall((text or "").lower().replace("ё", "е"))
+
+@lru_cache(maxsize=10000)
+def _lemma(word):
+    """Normal form of the most probable parse of a word"""
+    return _get_morph().parse(word)[0].normal_form.replace("ё", "е")
+
+def _same_word(token, word):
+    if token == word:
+        return True
+    # Без морфологии формы не сравниваются: ошибочное совпадение отклонило бы верный ответ без AI
+    if _get_morph() is None or len(token) < MIN_LEMMA_LENGTH or len(word) < MIN_LEMMA_LENGTH:
+        return False
+    return _lemma(token) == _lemma(word)
+
+def is_category(stopword_text):
+    """Check whether the stopword names a class of words ("Прилагательные") rather than words to avoid"""
+    return " ".join(tokenize(stopword_text)) in _CATEGORIES
+
+def _stopword_variants(stopword_text):
+    """Split a stopword into alternatives ("вероятно/наверное"), each a list of words"""
+    return [words for words in (tokenize(part) for part in stopword_text.split("/")) if words]
+
+def contains_stopword(text, stopword_text):
+    """Check whether any form of the stopword (or of any of its alternatives) occurs in the text"""
+    tokens = tokenize(text)
+    for words in _stopword_variants(stopword_text):
+        for start in range(len(tokens) - len(words) + 1):
+            if all(_same_word(tokens[start + i], word) for i, word in enumerate(words)):
+                return True
+    return False
+
+def grade(original_sentence, rephrased_sentence, stopword):
+    """Decide an obvious answer locally
+
+    Returns (passed, feedback) like verify_stopword_rephrasing_ai, or None
+    when the answer has to be checked by the AI.
+    """
+    word = (stopword.get("word", "") or "").strip()
+    verdict = None
+
+    if tokenize(rephrased_sentence) == tokenize(original_sentence):
+        verdict = "identical", (
+            False,
+            "Ваш ответ совпадает с исходным предложением. "
+            f"Перефразируйте его так, чтобы в нем не было стоп-слова \"{word.lower()}\"."
+        )
+    # Категории вроде "Прилагательные" словом в тексте не проверить - их оценивает AI
+    elif word and not is_category(word) and contains_stopword(rephrased_sentence, word):
+        verdict = "contains_stopword", (
+            False,
+            f"В вашем ответе осталось стоп-слово \"{word.lower()}\" или одна из его форм. "
+            "Перефразируйте предложение, полностью избегая этого слова."
+        )
+
+    if verdict is None:
+        decisions.inc(label="ai")
+        _update_avoided_ratio()
+        return None
+
+    rule, result = verdict
+    decisions.inc(label=f"local:{rule}")
+    _update_avoided_ratio()
+    logger.info(f"Ответ на стоп-слово '{word}' отклонен без AI ({rule})")
+    return result
+
+def avoided_fraction():
+    """Share of graded answers that did not need an AI call"""
+    ai = decisions.value("ai")
+    local = decisions.value("local:identical") + decisions.value("local:contains_stopword")
+    total = ai + local
+    return local / total if total else None
+
+def _update_avoided_ratio():
+    avoided_ratio.set(round(avoided_fraction(), 3))
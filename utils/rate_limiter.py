@@ -0,0 +1,195 @@
+"""
+Ограничение частоты исходящих запросов к Telegram для обоих ботов.
+
+OutboundRateLimiter подключается к приложению через ApplicationBuilder().rate_limiter(),
+поэтому через него проходят все отправки и правки сообщений бота, включая
+context.bot в обработчиках и задачах.
+
+- Общий лимит бота и лимит каждого чата - корзины токенов (token bucket);
+  групповые чаты ограничены строже, как того требует Telegram.
+- Приоритеты: ответы кандидатам (ANSWER) идут раньше уведомлений
+  (NOTIFICATION), обновления таймеров (COUNTDOWN) - в последнюю очередь.
+  Приоритет передается через rate_limit_args={"priority": ...}.
+- Правка сообщения, ожидающая отправки, отменяется, если пришла более новая
+  правка того же сообщения: отправляется только последний текст.
+- При RetryAfter (429) отправка в этот чат приостанавливается на указанное
+  Telegram время, и запрос повторяется.
+
+Лимиты Telegram действуют на токен бота, поэтому у каждого бота свой экземпляр.
+
+Ограничение: корзины токенов хранятся в памяти процесса. Процесс кандидатов
+отправляет уведомления рекрутерам через отдельный клиент бота рекрутеров
+(utils/notifier.py) со своим экземпляром, и наоборот. Поэтому в худшем случае
+по одному токену отправляют два процесса, и общий темп может достигать
+удвоенного TELEGRAM_GLOBAL_RATE; лимит одного чата тоже не делится между
+процессами. Уведомления редки по сравнению с ответами кандидатам, а на
+превышение Telegram отвечает RetryAfter, который обрабатывается здесь. Если
+этого станет мало, TELEGRAM_GLOBAL_RATE нужно уменьшить вдвое.
+"""
+import asyncio
+import logging
+import os
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from utils.metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Общий лимит бота (сообщений в секунду) и лимиты одного чата
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_CHAT_BURST = float(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+TELEGRAM_GROUP_RATE = float(os.getenv("TELEGRAM_GROUP_RATE", str(20 / 60)))
+# Сколько раз повторять запрос после RetryAfter и максимальная пауза, которую стоит ждать (в секундах)
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "3"))
+TELEGRAM_MAX_RETRY_AFTER = float(os.getenv("TELEGRAM_MAX_RETRY_AFTER", "60"))
+
+ANSWER = 0
+NOTIFICATION = 1
+COUNTDOWN = 2
+PRIORITY_NAMES = {ANSWER: "answer", NOTIFICATION: "notification", COUNTDOWN: "countdown"}
+
+# Лимиты применяются только к методам, которые отправляют или меняют сообщения
+_LIMITED_PREFIXES = ("send", "edit", "copyMessage", "forwardMessage")
+# Корзины чатов, которые давно полны, удаляются, когда их становится больше этого числа
+_MAX_CHAT_BUCKETS = 10000
+
+send_wait = Histogram("telegram_send_wait_seconds", "Time outgoing Telegram requests waited for rate limits by priority")
+coalesced_edits = Counter("telegram_coalesced_edits_total", "Message edits dropped because a newer edit superseded them")
+retry_after_total = Counter("telegram_retry_after_total", "RetryAfter (429) responses from Telegram by endpoint")
+
+class TokenBucket:
+    """Token bucket refilled continuously at rate tokens per second"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = None
+        # До этого момента (loop.time()) запросы не отправляются - пауза после RetryAfter
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        if self.updated is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Seconds until a token is available"""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.paused_until - now)
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_idle(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity and self.paused_until <= now
+
+class OutboundRateLimiter(BaseRateLimiter):
+    """Rate limiter with per-chat and global token buckets, priorities and edit coalescing"""
+
+    def __init__(self):
+        self._global = TokenBucket(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_RATE)
+        self._chats = {}
+        # Сколько запросов каждого приоритета ждут общего лимита
+        self._global_waiting = [0] * len(PRIORITY_NAMES)
+        # (endpoint, chat_id, message_id) -> номер последней правки
+        self._latest_edit = {}
+        self._edit_counter = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _chat_bucket(self, chat_id, now):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= _MAX_CHAT_BUCKETS:
+                for idle in [key for key, value in self._chats.items() if value.is_idle(now)]:
+                    del self._chats[idle]
+            # Отрицательный chat_id - группа или канал
+            if isinstance(chat_id, int) and chat_id < 0:
+                bucket = TokenBucket(TELEGRAM_GROUP_RATE, 1)
+            else:
+                bucket = TokenBucket(TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _acquire(self, chat_bucket, priority, superseded):
+        """Wait until the chat and global limits allow a request; returns False if it was superseded"""
+        loop = asyncio.get_running_loop()
+        queued = False
+        try:
+            while True:
+                if superseded():
+                    return False
+                now = loop.time()
+                delay = max(chat_bucket.delay(now) if chat_bucket else 0.0, self._global.paused_until - now)
+                if delay <= 0:
+                    # Общий лимит достается сначала запросам с более высоким приоритетом
+                    higher_waiting = any(self._global_waiting[:priority])
+                    delay = self._global.delay(now)
+                    if delay <= 0 and not higher_waiting:
+                        self._global.take(now)
+                        if chat_bucket:
+                            chat_bucket.take(now)
+                        return True
+                    if not queued:
+                        self._global_waiting[priority] += 1
+                        queued = True
+                    delay = max(delay, 0.01)
+                await asyncio.sleep(delay)
+        finally:
+            if queued:
+                self._global_waiting[priority] -= 1
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if not endpoint.startswith(_LIMITED_PREFIXES):
+            return await callback(*args, **kwargs)
+
+        priority = ANSWER
+        if isinstance(rate_limit_args, dict):
+            priority = rate_limit_args.get("priority", ANSWER)
+        chat_id = data.get("chat_id")
+
+        edit_key = None
+        if endpoint.startswith("edit") and chat_id is not None and data.get("message_id") is not None:
+            edit_key = (endpoint, chat_id, data["message_id"])
+            self._edit_counter += 1
+            edit_number = self._latest_edit[edit_key] = self._edit_counter
+
+        def superseded():
+            return edit_key is not None and self._latest_edit.get(edit_key) != edit_number
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            for attempt in range(TELEGRAM_MAX_RETRIES + 1):
+                chat_bucket = self._chat_bucket(chat_id, loop.time()) if chat_id is not None else None
+                if not await self._acquire(chat_bucket, priority, superseded):
+                    # Более новая правка того же сообщения отправит актуальный текст
+                    coalesced_edits.inc()
+                    return True
+                if attempt == 0:
+                    send_wait.observe(loop.time() - started, label=PRIORITY_NAMES.get(priority, str(priority)))
+                try:
+                    return await callback(*args, **kwargs)
+                except RetryAfter as e:
+                    retry_after_total.inc(label=endpoint)
+                    retry_after = float(e.retry_after)
+                    if attempt >= TELEGRAM_MAX_RETRIES or retry_after > TELEGRAM_MAX_RETRY_AFTER:
+                        raise
+                    logger.warning(f"Telegram RetryAfter {retry_after}s for {endpoint} (chat {chat_id}), retrying")
+                    # Без chat_id неизвестно, какой лимит превышен, поэтому ждут все запросы
+                    bucket = chat_bucket or self._global
+                    bucket.paused_until = max(bucket.paused_until, loop.time() + retry_after)
+        finally:
+            if edit_key is not None and not superseded():
+                del self._latest_edit[edit_key]
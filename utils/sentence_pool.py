@@ -0,0 +1,204 @@
+"""
+Пул заранее сгенерированных предложений для теста стоп-слов.
+
+Фоновая задача держит для каждого стоп-слова STOPWORD_POOL_SIZE проверенных
+предложений в базе. Вопрос теста берет готовое предложение из пула одним
+запросом; генерация через AI во время теста нужна, только если пул пуст.
+Пока кандидат отвечает на вопрос, предложения для следующих вопросов
+готовятся заранее (prefetch) и отменяются, если тест закончен или брошен.
+"""
+import asyncio
+import logging
+import os
+import time
+
+import database_async as db
+from utils import ai_client, ai_queue, pregrader
+from utils.chatgpt_helpers import generate_ai_stopword_sentence
+from utils.helpers import get_stopwords_data
+from utils.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+# Сколько предложений держать в пуле для каждого стоп-слова
+STOPWORD_POOL_SIZE = int(os.getenv("STOPWORD_POOL_SIZE", "5"))
+# Как часто проверять и пополнять пул (в секундах)
+STOPWORD_POOL_REFILL_INTERVAL = float(os.getenv("STOPWORD_POOL_REFILL_INTERVAL", "600"))
+# Сколько запросов генерации выполнять одновременно при пополнении
+STOPWORD_POOL_CONCURRENCY = int(os.getenv("STOPWORD_POOL_CONCURRENCY", "2"))
+
+MIN_SENTENCE_LENGTH = 10
+MAX_SENTENCE_LENGTH = 300
+
+sentences_served = Counter("stopword_sentences_total", "Stopword test sentences by source (pool/live)")
+
+_refill_running = False
+
+# Сколько следующих вопросов теста готовить заранее и сколько генераций выполнять одновременно на все тесты
+STOPWORD_PREFETCH_AHEAD = int(os.getenv("STOPWORD_PREFETCH_AHEAD", "2"))
+STOPWORD_PREFETCH_CONCURRENCY = int(os.getenv("STOPWORD_PREFETCH_CONCURRENCY", "4"))
+
+# user_id -> {"deadline": время окончания теста, "tasks": {номер вопроса: asyncio.Task}}
+# Задачи хранятся здесь, а не в user_data: они не сериализуются и не должны попадать в persistence
+_prefetch = {}
+_prefetch_semaphore = None
+
+def is_valid_sentence(stopword, sentence):
+    """Check that a generated sentence is usable as a test question"""
+    if not sentence:
+        return False
+    sentence = sentence.strip()
+    if not MIN_SENTENCE_LENGTH <= len(sentence) <= MAX_SENTENCE_LENGTH:
+        return False
+    # Ответ с пояснениями, несколькими вариантами или JSON вместо одного предложения
+    if "\n" in sentence or sentence.startswith(("{", "[")):
+        return False
+    # Для обычных стоп-слов проверяем, что слово (с учетом изменения окончаний) есть в предложении;
+    # из вариантов через "/" достаточно одного. Категории вроде "Прилагательные" так не проверить
+    word = stopword.strip()
+    if word and not pregrader.is_category(word):
+        lowered = sentence.lower().replace("ё", "е")
+        variants = [part.lower().replace("ё", "е").split() for part in word.split("/")]
+        return any(
+            all(stem in lowered for stem in (
+                token.strip("!?.,\"'")[:max(3, len(token) - 2)] for token in tokens
+            ) if stem)
+            for tokens in variants if tokens
+        )
+    return True
+
+async def take_sentence(stopword):
+    """Return a pooled sentence for the stopword or None if the pool is empty"""
+    try:
+        sentence = await db.take_stopword_sentence(stopword)
+    except Exception as e:
+        logger.error(f"Ошибка при получении предложения из пула для '{stopword}': {e}")
+        return None
+    if sentence is not None:
+        sentences_served.inc(label="pool")
+    return sentence
+
+async def generate_sentence(stopword_data, user_id=None):
+    """Generate a sentence live (pool is empty) and keep it in the pool if it is valid; None if the API failed"""
+    sentence = await generate_ai_stopword_sentence(stopword_data, ai_queue.INTERACTIVE, user_id)
+    if sentence is None:
+        return None
+    sentences_served.inc(label="live")
+    word = stopword_data.get("word", "")
+    if is_valid_sentence(word, sentence):
+        try:
+            await db.add_stopword_sentences(word, [sentence.strip()])
+        except Exception as e:
+            logger.error(f"Не удалось сохранить предложение в пул для '{word}': {e}")
+    return sentence
+
+async def _generate_for_pool(stopword_data, count, semaphore):
+    """Generate up to count new valid sentences for one stopword"""
+    word = stopword_data.get("word", "")
+    sentences = set()
+    # Дубликаты и неудачные ответы отбрасываются, поэтому попыток немного больше, чем нужно
+    for _ in range(count * 2):
+        if len(sentences) >= count:
+            break
+        async with semaphore:
+            try:
+                sentence = await generate_ai_stopword_sentence(stopword_data, ai_queue.BACKGROUND)
+            except Exception as e:
+                logger.warning(f"Ошибка генерации предложения для пула '{word}': {e}")
+                break
+        if sentence is None:
+            # API вернул ошибку - остальные попытки для этого слова сейчас тоже не удадутся
+            break
+        if is_valid_sentence(word, sentence):
+            sentences.add(sentence.strip())
+    return await db.add_stopword_sentences(word, list(sentences))
+
+async def refill_pool():
+    """Top up the pool of every stopword to STOPWORD_POOL_SIZE sentences"""
+    global _refill_running
+    if _refill_running:
+        return
+    _refill_running = True
+    try:
+        # Пока AI API недоступен, фоновая генерация только добавила бы ошибок
+        api_url = os.getenv("CHATGPT_API_KEY")
+        if api_url and not ai_client.is_available(api_url):
+            logger.info("AI API недоступен, пополнение пула предложений отложено")
+            return
+        stopwords_data = await asyncio.to_thread(get_stopwords_data)
+        sizes = await db.get_stopword_pool_sizes()
+        semaphore = asyncio.Semaphore(STOPWORD_POOL_CONCURRENCY)
+        tasks = []
+        for stopword_data in stopwords_data:
+            missing = STOPWORD_POOL_SIZE - sizes.get(stopword_data.get("word", ""), 0)
+            if missing > 0:
+                tasks.append(_generate_for_pool(stopword_data, missing, semaphore))
+        if not tasks:
+            return
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        added = sum(result for result in results if isinstance(result, int))
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Ошибка при пополнении пула предложений: {result}")
+        logger.info(f"Пул предложений стоп-слов пополнен на {added} шт. ({len(tasks)} стоп-слов)")
+    finally:
+        _refill_running = False
+
+async def refill_pool_job(context):
+    """Job queue callback that refills the sentence pool"""
+    await refill_pool()
+
+async def _prefetch_sentence(stopword_data, user_id):
+    """Resolve a sentence for an upcoming question: pool first, live generation otherwise"""
+    global _prefetch_semaphore
+    if _prefetch_semaphore is None:
+        _prefetch_semaphore = asyncio.Semaphore(STOPWORD_PREFETCH_CONCURRENCY)
+    async with _prefetch_semaphore:
+        sentence = await take_sentence(stopword_data.get("word", ""))
+        if sentence is None:
+            sentence = await generate_sentence(stopword_data, user_id)
+        return sentence
+
+def _drop_expired_prefetch():
+    """Cancel prefetches of tests whose time is over (abandoned without completion)"""
+    now = time.time()
+    for user_id in [user_id for user_id, entry in _prefetch.items() if entry["deadline"] < now]:
+        cancel_prefetch(user_id)
+
+def prefetch(user_id, stopwords, start_idx, deadline):
+    """Start preparing sentences for the questions after the one currently shown"""
+    _drop_expired_prefetch()
+    entry = _prefetch.setdefault(user_id, {"deadline": deadline, "tasks": {}})
+    entry["deadline"] = deadline
+    for idx in range(start_idx, min(start_idx + STOPWORD_PREFETCH_AHEAD, len(stopwords))):
+        if idx not in entry["tasks"]:
+            entry["tasks"][idx] = asyncio.create_task(_prefetch_sentence(stopwords[idx], user_id))
+
+async def get_prefetched(user_id, idx):
+    """Return the prefetched sentence for a question, or None if there is none"""
+    entry = _prefetch.get(user_id)
+    task = entry["tasks"].pop(idx, None) if entry else None
+    if task is None:
+        return None
+    try:
+        # shield: отмена обработчика не отменяет задачу, поэтому ее можно отличить от отмены предзагрузки
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if not task.done():
+            # Отменен сам обработчик - предзагрузка больше никому не нужна
+            task.cancel()
+            raise
+        # Отменена сама предзагрузка (например, новым тестом), а не обработчик
+        if not task.cancelled():
+            raise
+        return None
+    except Exception as e:
+        logger.warning(f"Предзагрузка предложения для вопроса {idx + 1} не удалась: {e}")
+        return None
+
+def cancel_prefetch(user_id):
+    """Cancel all outstanding prefetches of a user's test"""
+    entry = _prefetch.pop(user_id, None)
+    if entry:
+        for task in entry["tasks"].values():
+            task.cancel()
@@ -0,0 +1,146 @@
+"""
+Общий планировщик таймеров тестов.
+
+Вместо отдельной ежесекундной задачи job_queue на каждого кандидата один цикл
+держит кучу (heapq) ближайших срабатываний всех таймеров. Сообщение с
+обратным отсчетом обновляется с адаптивным интервалом: редко, пока времени
+много, и чаще ближе к концу (от TIMER_MAX_INTERVAL до TIMER_MIN_INTERVAL
+секунд), поэтому число правок сообщений в Telegram не растет с каждой
+секундой теста. В момент окончания времени on_expire вызывается ровно один раз.
+
+Таймер идентифицируется ключом (например, "test:<chat_id>"); повторный
+schedule с тем же ключом заменяет прежний таймер, cancel удаляет его.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+
+from utils.metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Интервал обновления отсчета: примерно 1/20 оставшегося времени в этих пределах (в секундах)
+TIMER_MAX_INTERVAL = float(os.getenv("TIMER_MAX_INTERVAL", "30"))
+TIMER_MIN_INTERVAL = float(os.getenv("TIMER_MIN_INTERVAL", "5"))
+
+active_timers = Gauge("timers_active", "Countdown timers currently scheduled")
+timer_events = Counter("timer_events_total", "Countdown timer ticks and expirations")
+expire_lag = Histogram("timer_expire_lag_seconds", "Delay between a timer deadline and its on_expire call")
+
+# key -> {"deadline", "on_tick", "on_expire", "generation"}
+_timers = {}
+# (время срабатывания, порядковый номер, key, generation); устаревшие записи пропускаются по generation
+_heap = []
+_counter = itertools.count()
+_wakeup = None
+_task = None
+# Выполняющиеся обработчики, чтобы их задачи не собрал сборщик мусора
+_callbacks = set()
+
+def _interval(remaining):
+    return min(TIMER_MAX_INTERVAL, max(TIMER_MIN_INTERVAL, remaining / 20))
+
+def _push(when, key, generation):
+    seq = next(_counter)
+    heapq.heappush(_heap, (when, seq, key, generation))
+    # Цикл спит до ближайшего срабатывания - будим его, если новое раньше
+    if _wakeup is not None and _heap[0][1] == seq:
+        _wakeup.set()
+
+def _ensure_running():
+    global _task, _wakeup
+    if _task is None or _task.done():
+        _wakeup = asyncio.Event()
+        _task = asyncio.create_task(_run())
+
+def schedule(key, deadline, on_tick=None, on_expire=None):
+    """Start (or replace) a timer that ends at deadline (time.time())
+
+    on_tick(remaining) is awaited at an adaptive cadence to update the countdown;
+    on_expire() is awaited once when the deadline is reached.
+    """
+    _ensure_running()
+    # Номер поколения уникален, поэтому срабатывания замененного или отмененного таймера игнорируются
+    generation = next(_counter)
+    _timers[key] = {
+        "deadline": deadline,
+        "on_tick": on_tick,
+        "on_expire": on_expire,
+        "generation": generation,
+    }
+    active_timers.set(len(_timers))
+    remaining = deadline - time.time()
+    _push(time.monotonic() + min(_interval(remaining), max(remaining, 0)), key, generation)
+
+def cancel(key):
+    """Stop a timer; it will neither tick nor expire"""
+    if _timers.pop(key, None) is not None:
+        active_timers.set(len(_timers))
+
+def is_scheduled(key):
+    return key in _timers
+
+def _spawn(coro, key, kind):
+    async def runner():
+        try:
+            await coro
+        except Exception as e:
+            logger.error(f"Ошибка в обработчике таймера {key} ({kind}): {e}")
+    task = asyncio.create_task(runner())
+    _callbacks.add(task)
+    task.add_done_callback(_callbacks.discard)
+
+def _fire(key, generation):
+    entry = _timers.get(key)
+    if entry is None or entry["generation"] != generation:
+        return
+    remaining = entry["deadline"] - time.time()
+    if remaining <= 0:
+        # Удаляем таймер до вызова обработчика, поэтому он срабатывает только один раз
+        del _timers[key]
+        active_timers.set(len(_timers))
+        timer_events.inc(label="expire")
+        expire_lag.observe(-remaining)
+        if entry["on_expire"] is not None:
+            _spawn(entry["on_expire"](), key, "expire")
+        return
+
+    if entry["on_tick"] is not None:
+        timer_events.inc(label="tick")
+        _spawn(entry["on_tick"](remaining), key, "tick")
+    # Последнее срабатывание приходится точно на окончание времени
+    _push(time.monotonic() + min(_interval(remaining), remaining), key, generation)
+
+async def _run():
+    while True:
+        _wakeup.clear()
+        now = time.monotonic()
+        while _heap and _heap[0][0] <= now:
+            _, _, key, generation = heapq.heappop(_heap)
+            _fire(key, generation)
+        # Отмененные таймеры не удаляются из кучи сразу; чистим ее, когда их становится много
+        if len(_heap) > 2 * len(_timers) + 100:
+            _heap[:] = [item for item in _heap if item[2] in _timers and _timers[item[2]]["generation"] == item[3]]
+            heapq.heapify(_heap)
+        timeout = _heap[0][0] - now if _heap else None
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+async def stop():
+    """Stop the scheduler loop (called from the application's post_shutdown)"""
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+    _timers.clear()
+    _heap.clear()
+    active_timers.set(0)
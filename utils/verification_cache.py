@@ -0,0 +1,92 @@
+"""
+Кэш результатов AI-проверки ответов кандидатов.
+
+Ключ - sha256 от вида проверки, версии промпта и нормализованных входных
+данных, поэтому одинаковый ответ на то же задание проверяется через API один
+раз. Результаты хранятся в памяти процесса (LRU) и в базе, откуда удаляются
+записи, к которым давно не обращались. Результаты, полученные после ошибки
+API, не кэшируются.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import unicodedata
+
+import database_async as db
+from utils.cache import TTLCache
+from utils.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+# Размер и время жизни кэша в памяти, срок хранения в базе без обращений (в днях)
+VERIFICATION_CACHE_SIZE = int(os.getenv("VERIFICATION_CACHE_SIZE", "1000"))
+VERIFICATION_CACHE_TTL = float(os.getenv("VERIFICATION_CACHE_TTL", "3600"))
+VERIFICATION_CACHE_MAX_AGE_DAYS = int(os.getenv("VERIFICATION_CACHE_MAX_AGE_DAYS", "30"))
+# Как часто удалять устаревшие записи из базы (в секундах)
+VERIFICATION_CACHE_PURGE_INTERVAL = float(os.getenv("VERIFICATION_CACHE_PURGE_INTERVAL", "86400"))
+
+# Метка: memory_hit, db_hit или miss, через двоеточие - вид проверки
+lookups = Counter("ai_verification_cache_total", "AI verification cache lookups by result")
+
+_memory = TTLCache(VERIFICATION_CACHE_SIZE, VERIFICATION_CACHE_TTL)
+
+def normalize_text(text):
+    """Normalize an answer so that trivially different copies share a cache entry"""
+    text = unicodedata.normalize("NFC", text or "")
+    # Пробелы и переводы строк не влияют на оценку, регистр и пунктуацию оставляем
+    return re.sub(r"\s+", " ", text).strip()
+
+def make_key(kind, prompt_version, *parts):
+    """Build the content-addressed cache key for a verification request"""
+    payload = json.dumps([kind, prompt_version, *parts], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+async def get(kind, key):
+    """Return a cached result or None"""
+    result = _memory.get(key)
+    if result is not None:
+        lookups.inc(label=f"memory_hit:{kind}")
+        return result
+
+    try:
+        result = await db.get_verification_result(key)
+    except Exception as e:
+        logger.error(f"Ошибка чтения кэша проверок: {e}")
+        result = None
+
+    if result is None:
+        lookups.inc(label=f"miss:{kind}")
+        return None
+
+    lookups.inc(label=f"db_hit:{kind}")
+    _memory.set(key, result)
+    return result
+
+async def put(kind, key, result):
+    """Store a verification result (must be JSON-serializable)"""
+    _memory.set(key, result)
+    try:
+        await db.save_verification_result(key, kind, result)
+    except Exception as e:
+        logger.error(f"Ошибка записи в кэш проверок: {e}")
+
+def hit_rate(kind):
+    """Share of lookups of the given kind answered from the cache"""
+    hits = lookups.value(f"memory_hit:{kind}") + lookups.value(f"db_hit:{kind}")
+    total = hits + lookups.value(f"miss:{kind}")
+    return hits / total if total else None
+
+async def purge_job(context):
+    """Job queue callback that removes entries not used for VERIFICATION_CACHE_MAX_AGE_DAYS"""
+    try:
+        removed = await db.purge_verification_results(VERIFICATION_CACHE_MAX_AGE_DAYS)
+        if removed:
+            logger.info(f"Удалено {removed} устаревших записей кэша проверок")
+    except Exception as e:
+        logger.error(f"Ошибка очистки кэша проверок: {e}")
+    for kind in ("stopword_verify", "poem_verify"):
+        rate = hit_rate(kind)
+        if rate is not None:
+            logger.info(f"Доля ответов из кэша проверок ({kind}): {rate:.1%}")